@@ -1,46 +1,545 @@
 import pandas as pd
+import numpy as np
+import io
 import os
 
-def aggregate_timeseries_data(csv_path, output_path, resample_freq='1H'):
+from columnar import ColumnarWriter
+import journal
+import telemetry
+
+# Bytes of CSV parsed per step; bounds peak memory regardless of input size
+BLOCK_SIZE = 4 * 1024 * 1024
+
+DEFAULT_AGG_RULES = {
+    'temperature': 'mean',
+    'pressure': 'mean',
+    'event_count': 'sum'
+}
+
+# Fixed 'YYYY-MM-DD HH:MM:SS' layout: positions of the digits and separators
+_TS_DIGITS = np.array([0, 1, 2, 3, 5, 6, 8, 9, 11, 12, 14, 15, 17, 18])
+_TS_SEPARATORS = np.array([4, 7, 13, 16, 19])
+_TS_SEPARATOR_BYTES = np.frombuffer(b'--::,', dtype=np.uint8)
+_TS_WIDTH = 19
+
+
+def _iter_blocks(f, block_size):
+    """
+    Yields blocks of whole lines from a binary file. Each block is cut from
+    the block_size bytes after the previous one (more for a longer line),
+    so the blocks from a line start on don't depend on where reading began.
+    """
+    carry = b''
+    while True:
+        data = f.read(block_size - len(carry) if len(carry) < block_size else block_size)
+        if not data:
+            if carry.strip():
+                yield carry if carry.endswith(b'\n') else carry + b'\n'
+            return
+        buf = carry + data
+        cut = buf.rfind(b'\n') + 1
+        if cut:
+            yield buf[:cut]
+        carry = buf[cut:]
+
+
+def parse_fixed_timestamps(block):
+    """
+    Parses the leading 'YYYY-MM-DD HH:MM:SS' field of every line in a block of
+    CSV bytes straight to int64 epoch seconds, without creating a Python
+    string or datetime per row. Returns None if any line does not match the
+    fixed layout, so the caller can fall back to pd.to_datetime.
+    """
+    a = np.frombuffer(block, dtype=np.uint8)
+    ends = np.flatnonzero(a == ord('\n'))
+    starts = np.concatenate(([0], ends[:-1] + 1))
+    if len(starts) == 0 or (ends - starts).min() <= _TS_WIDTH:
+        return None
+    # Copy the first 20 bytes of every line into an (n, 20) array: indexing an
+    # overlapping strided view copies whole rows, far cheaper than gathering
+    # each byte position separately.
+    lines = np.lib.stride_tricks.as_strided(a, shape=(len(a) - _TS_WIDTH, _TS_WIDTH + 1),
+                                            strides=(1, 1), writeable=False)
+    prefix = lines[starts]
+    if not (prefix[:, _TS_SEPARATORS] == _TS_SEPARATOR_BYTES).all():
+        return None
+    if not np.isin(prefix[:, 10], (ord(' '), ord('T'))).all():
+        return None
+    d = prefix[:, _TS_DIGITS].astype(np.int32) - ord('0')
+    if d.min() < 0 or d.max() > 9:
+        return None
+
+    year = d[:, 0] * 1000 + d[:, 1] * 100 + d[:, 2] * 10 + d[:, 3]
+    month = d[:, 4] * 10 + d[:, 5]
+    day = d[:, 6] * 10 + d[:, 7]
+    seconds = (d[:, 8] * 10 + d[:, 9]) * 3600 + (d[:, 10] * 10 + d[:, 11]) * 60 + d[:, 12] * 10 + d[:, 13]
+
+    # Days since 1970-01-01 for a proleptic Gregorian date (H. Hinnant's days_from_civil)
+    year = year - (month <= 2)
+    era = year // 400
+    yoe = year - era * 400
+    doy = (153 * ((month + 9) % 12) + 2) // 5 + day - 1
+    doe = yoe * 365 + yoe // 4 - yoe // 100 + doy
+    days = era * 146097 + doe - 719468
+    return days.astype(np.int64) * 86400 + seconds
+
+
+def freq_to_seconds(resample_freq):
+    """'1H', '15min', '1D', ... as a whole number of seconds."""
+    step = pd.Timedelta(resample_freq.replace('H', 'h')).total_seconds()
+    if step < 1 or step != int(step):
+        raise ValueError(f"Resample frequency must be a whole number of seconds: {resample_freq}")
+    return int(step)
+
+
+def group_stats(keys, stats):
+    """
+    Combines (sum, count, min, max) partials that share a bucket key.
+
+    keys is an int64 array and stats a dict of column -> tuple of four arrays
+    aligned with it. Returns the sorted unique keys and the combined stats.
+    """
+    if len(keys) and not (keys[1:] >= keys[:-1]).all():
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        stats = {col: tuple(arr[order] for arr in s) for col, s in stats.items()}
+    if not len(keys):
+        return keys, stats
+    starts = np.concatenate(([0], np.flatnonzero(keys[1:] != keys[:-1]) + 1))
+    combined = {
+        col: (np.add.reduceat(s, starts), np.add.reduceat(c, starts),
+              np.minimum.reduceat(mn, starts), np.maximum.reduceat(mx, starts))
+        for col, (s, c, mn, mx) in stats.items()
+    }
+    return keys[starts], combined
+
+
+def raw_stats(values):
+    """Per-row (sum, count, min, max) partials for one column; NaNs are skipped like pandas does."""
+    values = np.asarray(values, dtype=np.float64)
+    missing = np.isnan(values)
+    if not missing.any():
+        return values, np.ones(len(values)), values, values
+    return (np.where(missing, 0.0, values), (~missing).astype(np.float64),
+            np.where(missing, np.inf, values), np.where(missing, -np.inf, values))
+
+
+class BucketAccumulator:
+    """
+    Exact running sum/count/min/max per time bucket.
+
+    Buckets stay open until a later bucket has been seen `lateness` steps
+    past them; closed buckets are handed back by add() so they can be written
+    out immediately, so memory holds only the open buckets. Rows that arrive
+    for a bucket that was already closed are counted in late_rows and
+    dropped, for the caller to notice. With lateness=None every bucket stays
+    open until flush(), which is exact for rows in any order.
+    """
+
+    def __init__(self, step, columns, lateness=1):
+        self.step = step
+        self.columns = columns
+        self.lateness = lateness
+        self.late_rows = 0
+        self._keys = np.empty(0, dtype=np.int64)
+        self._stats = {col: tuple(np.empty(0) for _ in range(4)) for col in columns}
+        self._closed_before = None
+
+    def add(self, keys, stats):
+        """
+        Merges partials (already bucketed keys) in; returns (keys, stats) of buckets that closed.
+        """
+        if self._closed_before is not None:
+            late = keys < self._closed_before
+            if late.any():
+                self.late_rows += int(next(iter(stats.values()))[1][late].sum())
+                keys = keys[~late]
+                stats = {col: tuple(arr[~late] for arr in s) for col, s in stats.items()}
+
+        keys = np.concatenate((self._keys, keys))
+        stats = {col: tuple(np.concatenate((old, new)) for old, new in zip(self._stats[col], stats[col]))
+                 for col in self.columns}
+        keys, stats = group_stats(keys, stats)
+        if not len(keys) or self.lateness is None:
+            self._keys, self._stats = keys, stats
+            return keys[:0], {col: tuple(arr[:0] for arr in s) for col, s in stats.items()}
+
+        watermark = keys[-1] - self.lateness * self.step
+        n_closed = int(np.searchsorted(keys, watermark, side='left'))
+        self._keys = keys[n_closed:]
+        self._stats = {col: tuple(arr[n_closed:] for arr in s) for col, s in stats.items()}
+        if n_closed:
+            self._closed_before = int(keys[n_closed - 1]) + 1
+        return keys[:n_closed], {col: tuple(arr[:n_closed] for arr in s) for col, s in stats.items()}
+
+    def flush(self):
+        """Closes and returns every remaining bucket."""
+        keys, stats = self._keys, self._stats
+        self._keys = np.empty(0, dtype=np.int64)
+        self._stats = {col: tuple(np.empty(0) for _ in range(4)) for col in self.columns}
+        if len(keys):
+            self._closed_before = int(keys[-1]) + 1
+        return keys, stats
+
+    def state(self):
+        """The open buckets and watermark as plain lists, for a checkpoint."""
+        return {'keys': self._keys.tolist(),
+                'stats': {col: [arr.tolist() for arr in s] for col, s in self._stats.items()},
+                'closed_before': self._closed_before, 'late_rows': self.late_rows}
+
+    def restore(self, state):
+        """Continues from a state()."""
+        self._keys = np.array(state['keys'], dtype=np.int64)
+        self._stats = {col: tuple(np.array(arr, dtype=np.float64) for arr in state['stats'][col])
+                       for col in self.columns}
+        self._closed_before = state['closed_before']
+        self.late_rows = state['late_rows']
+
+
+def read_bucket_partials(csv_path, step, columns, block_size=BLOCK_SIZE, timestamp_col='timestamp', start=None):
+    """
+    Streams a time-series CSV block by block and yields (keys, stats,
+    int_columns, offset) per block: bucket start times in epoch seconds,
+    their partials, which columns hold integers, and the file offset the
+    block ends at. start resumes reading at such an offset.
+    """
+    with open(csv_path, 'rb') as f:
+        header = f.readline().decode().strip().split(',')
+        missing = [c for c in [timestamp_col] + list(columns) if c not in header]
+        if missing:
+            raise ValueError(f"{csv_path} has no column(s): {', '.join(missing)}")
+        fast_path = header[0] == timestamp_col
+        usecols = [header.index(c) for c in columns]
+        offset = f.tell()
+        if start is not None:
+            offset = start
+            f.seek(start)
+
+        int_columns = None
+        for block in telemetry.timed(_iter_blocks(f, block_size), 'aggregate_read'):
+            offset += len(block)
+            with telemetry.stage('aggregate_parse'):
+                df = pd.read_csv(io.BytesIO(block), header=None, names=header,
+                                 usecols=usecols if fast_path else None)
+                secs = parse_fixed_timestamps(block) if fast_path else None
+                if secs is None or len(secs) != len(df):
+                    if fast_path:
+                        df = pd.read_csv(io.BytesIO(block), header=None, names=header)
+                    parsed = pd.to_datetime(df[timestamp_col], format='mixed')
+                    secs = parsed.to_numpy(dtype='datetime64[s]').astype(np.int64)
+
+            if int_columns is None:
+                int_columns = {c for c in columns if pd.api.types.is_integer_dtype(df[c])}
+
+            with telemetry.stage('aggregate_group'):
+                keys, stats = group_stats(secs - secs % step, {c: raw_stats(df[c].to_numpy()) for c in columns})
+            telemetry.count('rows_total', len(df), stage='aggregate')
+            yield keys, stats, int_columns, offset
+
+
+def bucket_values(stats, agg_rules, int_columns):
+    """Final value of every rule's column for a batch of closed buckets."""
+    out = {}
+    for col, how in agg_rules.items():
+        s, c, mn, mx = stats[col]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if how == 'mean':
+                values = np.where(c > 0, s / c, np.nan)
+            elif how == 'sum':
+                values = s
+            elif how == 'count':
+                values = c.astype(np.int64)
+            elif how == 'min':
+                values = np.where(c > 0, mn, np.nan)
+            elif how == 'max':
+                values = np.where(c > 0, mx, np.nan)
+            else:
+                raise ValueError(f"Unsupported aggregation '{how}' for column {col}")
+        if col in int_columns and how in ('sum', 'min', 'max') and (c > 0).all():
+            values = values.astype(np.int64)
+        out[col] = values
+    return out
+
+
+def format_buckets(keys, stats, agg_rules, int_columns):
+    """Turns closed buckets into an output DataFrame with one column per rule."""
+    timestamps = np.datetime_as_string(keys.astype('datetime64[s]'), unit='s')
+    out = {'timestamp': np.char.replace(timestamps, 'T', ' ')}
+    out.update(bucket_values(stats, agg_rules, int_columns))
+    return pd.DataFrame(out)
+
+
+class CsvOutput:
+    """
+    Appends closed buckets to a CSV file, written as <path>.part and
+    renamed into place by close(). sync() makes the rows so far durable and
+    returns a state to resume from.
+    """
+
+    def __init__(self, path, columns, state=None):
+        self.path = path
+        self.columns = list(columns)
+        self.rows = 0
+        self.parts = [journal.part_path(path)]
+        if state:
+            os.truncate(self.parts[0], state['size'])
+            self.rows = state['rows']
+        self._file = open(self.parts[0], 'a' if state else 'w', newline='')
+
+    def append(self, keys, stats, agg_rules, int_columns):
+        format_buckets(keys, stats, agg_rules, int_columns).to_csv(self._file, header=self.rows == 0, index=False)
+        self.rows += len(keys)
+
+    def sync(self):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        return {'rows': self.rows, 'size': self._file.tell()}
+
+    def close(self, publish=True):
+        if publish and self.rows == 0:
+            self._file.write(','.join(['timestamp'] + self.columns) + '\n')
+        self._file.close()
+        if publish:
+            journal.publish(self.parts[0], self.path)
+
+
+class ColumnarOutput:
     """
-    Reads a large time-series CSV in chunks, aggregates it to a lower
-    frequency, and saves the result.
+    Appends closed buckets to a columnar (.col) file. The writer holds the
+    rows until close(), so sync() also spills them to <path>.rows.part,
+    where a resumed run reads them back.
+    """
+
+    def __init__(self, path, columns, state=None):
+        self.path = path
+        self.columns = list(columns)
+        self._writer = ColumnarWriter(path, columns)
+        self.parts = [journal.part_path(path + '.rows')]
+        self._unsynced = []
+        self._spilled = 0
+        if state:
+            self._writer.dtypes = state['dtypes']
+            dtype = self._row_dtype()
+            rows = np.fromfile(self.parts[0], dtype=dtype, count=state['rows'])
+            if len(rows) != state['rows']:
+                raise ValueError(f"Spilled rows of {path} are incomplete")
+            self._writer.append(rows['timestamp'], {name: rows[name] for name in self.columns})
+            self._spilled = state['rows']
+
+    def _row_dtype(self):
+        return np.dtype([('timestamp', '<i8')] + [(name, self._writer.dtypes[name]) for name in self.columns])
+
+    def append(self, keys, stats, agg_rules, int_columns):
+        values = bucket_values(stats, agg_rules, int_columns)
+        self._writer.append(keys, values)
+        self._unsynced.append((keys, values))
+
+    def sync(self):
+        if self._writer.dtypes is None:
+            return None
+        rows = np.zeros(self._writer.rows - self._spilled, dtype=self._row_dtype())
+        at = 0
+        for keys, values in self._unsynced:
+            rows['timestamp'][at:at + len(keys)] = keys
+            for name in self.columns:
+                rows[name][at:at + len(keys)] = values[name]
+            at += len(keys)
+        with open(self.parts[0], 'r+b' if self._spilled else 'wb') as f:
+            f.seek(self._spilled * rows.dtype.itemsize)
+            f.write(rows.tobytes())
+            f.truncate()
+            os.fsync(f.fileno())
+        self._spilled = self._writer.rows
+        self._unsynced = []
+        return {'rows': self._spilled, 'dtypes': self._writer.dtypes}
+
+    def close(self, publish=True):
+        if publish:
+            self._writer.close()
+            if os.path.exists(self.parts[0]):
+                os.remove(self.parts[0])
+
+
+OUTPUT_FORMATS = {
+    'csv': ('csv', CsvOutput),
+    'columnar': ('col', ColumnarOutput),
+}
+
+
+def rollup_path(csv_path, resample_freq, output_dir=None, output_format='csv'):
+    """Output path of one rollup level, e.g. sensor.csv at '1h' -> sensor_1h_agg.csv."""
+    base = os.path.splitext(os.path.basename(csv_path))[0]
+    extension = OUTPUT_FORMATS[output_format][0]
+    return os.path.join(output_dir or os.path.dirname(csv_path), f"{base}_{resample_freq.lower()}_agg.{extension}")
+
+
+def _aggregate_levels(csv_path, levels, agg_rules, block_size, output_format='csv', checkpoint=None):
+    """
+    Aggregates csv_path to several resolutions in one pass over it.
+
+    levels is a list of (resample_freq, output_path), finest first, where
+    every step is a whole multiple of the one before it. Only the finest
+    level is built from the raw rows; each bucket it closes is re-bucketed
+    into the next level, and so on up the chain, so the sums/counts/min/max
+    of the coarse levels are exact without reading the data again. Returns
+    the list of (output_path, final_size).
+
+    A bucket is written once a row two buckets past it has been read, so
+    rows are expected roughly in time order. If a row turns up for a bucket
+    already written, the pass is abandoned and the file is read again with
+    every bucket held open until the end, which is exact for any row order.
+
+    With checkpoint (a journal.Checkpoint) the open buckets and the rows
+    written so far are saved between blocks, and a later run resumes after
+    the last saved block. The second pass over an unordered file saves no
+    checkpoints.
+    """
+    steps = [freq_to_seconds(freq) for freq, _ in levels]
+    for (freq, _), fine, coarse in zip(levels[1:], steps, steps[1:]):
+        if coarse % fine:
+            raise ValueError(f"Rollup resolution {freq} is not a multiple of the finer resolution ({fine}s)")
+
+    if not _scan_levels(csv_path, levels, steps, agg_rules, block_size, output_format, checkpoint, lateness=1):
+        print(f"Warning: {csv_path} has rows out of time order; aggregating it again with every bucket in memory")
+        telemetry.count('aggregate_unordered_total', 1)
+        _scan_levels(csv_path, levels, steps, agg_rules, block_size, output_format, None, lateness=None)
+    if checkpoint is not None:
+        checkpoint.clear()
+    # The rollups keep the source's mtime, so they age (and expire) like the source
+    st = os.stat(csv_path)
+    for _, path in levels:
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+
+    results = [(path, os.path.getsize(path)) for _, path in levels]
+    telemetry.count('bytes_in_total', os.path.getsize(csv_path), stage='aggregate')
+    telemetry.count('bytes_out_total', sum(size for _, size in results), stage='aggregate')
+    return results
+
+
+def _scan_levels(csv_path, levels, steps, agg_rules, block_size, output_format, checkpoint, lateness):
+    """
+    One pass of _aggregate_levels with the given bucket lateness. Returns
+    False, leaving no outputs, parts or checkpoint behind, as soon as a row
+    arrives for a bucket that was already written.
+    """
+    columns = list(agg_rules)
+    output_class = OUTPUT_FORMATS[output_format][1]
+    accumulators = [BucketAccumulator(step, columns, lateness) for step in steps]
+    int_columns = set()
+    state = checkpoint.state if checkpoint is not None else None
+    if state and (state.get('levels') != [freq for freq, _ in levels] or state.get('format') != output_format
+                  or state.get('block_size') != block_size):
+        state = None
+    if state:
+        for accumulator, saved in zip(accumulators, state['accumulators']):
+            accumulator.restore(saved)
+        int_columns = set(state['int_columns'])
+        print(f"Resuming aggregation of {csv_path} at byte {state['offset']}")
+    outputs = [output_class(path, columns, state['outputs'][level] if state else None)
+               for level, (_, path) in enumerate(levels)]
+    if checkpoint is not None:
+        for output in outputs:
+            for part in output.parts:
+                checkpoint.track(part)
+
+    def write(level, keys, stats):
+        if len(keys):
+            outputs[level].append(keys, stats, agg_rules, int_columns)
+
+    def feed(level, keys, stats):
+        closed_keys, closed_stats = accumulators[level].add(keys, stats)
+        write(level, closed_keys, closed_stats)
+        if level + 1 < len(levels) and len(closed_keys):
+            feed(level + 1, closed_keys - closed_keys % steps[level + 1], closed_stats)
+
+    complete = False
+    try:
+        partials = read_bucket_partials(csv_path, steps[0], columns, block_size, start=state and state['offset'])
+        for keys, stats, int_columns, offset in partials:
+            with telemetry.stage('aggregate_rollup'):
+                feed(0, keys, stats)
+            # Closed buckets only ever feed the coarser levels in order, so
+            # late rows can only reach the finest one
+            if accumulators[0].late_rows:
+                partials.close()
+                break
+            if checkpoint is not None and checkpoint.due():
+                checkpoint.save({'levels': [freq for freq, _ in levels], 'format': output_format,
+                                 'block_size': block_size, 'offset': offset, 'int_columns': sorted(int_columns),
+                                 'outputs': [output.sync() for output in outputs],
+                                 'accumulators': [accumulator.state() for accumulator in accumulators]})
+        else:
+            for level, accumulator in enumerate(accumulators):
+                keys, stats = accumulator.flush()
+                write(level, keys, stats)
+                if level + 1 < len(levels) and len(keys):
+                    feed(level + 1, keys - keys % steps[level + 1], stats)
+            complete = True
+    finally:
+        # An incomplete output stays a part file for the next run to resume
+        # (or discard), unless this pass is given up on
+        late = accumulators[0].late_rows > 0
+        for output in outputs:
+            output.close(publish=complete)
+            if not complete and (checkpoint is None or late):
+                for part in output.parts:
+                    if os.path.exists(part):
+                        os.remove(part)
+        if late and checkpoint is not None:
+            checkpoint.clear()
+    return complete
+
+
+def aggregate_timeseries_data(csv_path, output_path, resample_freq='1H', agg_rules=None,
+                              block_size=BLOCK_SIZE, output_format='csv', checkpoint=None):
+    """
+    Reads a large time-series CSV in one streaming pass, aggregates it to a
+    lower frequency, and saves the result.
+
+    Keeps exact running sum/count/min/max per bucket, so means are true
+    means even when a bucket spans a block boundary, and writes buckets out
+    as soon as they close. Only non-empty buckets are written, as CSV or, with
+    output_format='columnar', as a memory-mappable columnar file (see
+    columnar.py). checkpoint makes it resumable, see _aggregate_levels.
+    Returns the output path and its size.
     """
-    chunk_iterator = pd.read_csv(
-        csv_path,
-        parse_dates=['timestamp'],
-        index_col='timestamp',
-        chunksize=100000  # Process 100,000 rows at a time
-    )
-    
-    aggregated_chunks = []
-    
     print(f"Starting aggregation of {csv_path} to {resample_freq} frequency...")
-    
-    for chunk in chunk_iterator:
-        agg_rules = {
-            'temperature': 'mean',
-            'pressure': 'mean',
-            'event_count': 'sum'
-        }
-        resampled_chunk = chunk.resample(resample_freq).agg(agg_rules)
-        aggregated_chunks.append(resampled_chunk)
-        
-    # Concatenate & properly aggregate across chunks
-    full_aggregated_df = pd.concat(aggregated_chunks)
-    final_df = full_aggregated_df.groupby(full_aggregated_df.index).agg({
-        'temperature': 'mean',
-        'pressure': 'mean',
-        'event_count': 'sum'
-    })
-    
+
+    [(output_path, final_size)] = _aggregate_levels(
+        csv_path, [(resample_freq, output_path)], agg_rules or DEFAULT_AGG_RULES, block_size, output_format,
+        checkpoint)
     original_size = os.path.getsize(csv_path)
-    final_df.to_csv(output_path)
-    final_size = os.path.getsize(output_path)
-    
+
     print("Aggregation complete.")
     print(f"Original size: {original_size} bytes")
     print(f"Aggregated size: {final_size} bytes")
     print(f"Reduction ratio: {original_size / final_size:.2f}x")
-    
-    return output_path
+
+    return output_path, final_size
+
+
+def build_rollups(csv_path, resolutions, agg_rules=None, output_dir=None, block_size=BLOCK_SIZE,
+                  output_format='csv', checkpoint=None):
+    """
+    Builds a pyramid of rollups (e.g. ['1min', '1h', '1D']) from one scan of
+    a time-series CSV, each coarser level derived from the finer one.
+
+    Writes one <name>_<freq>_agg.csv (or .col for output_format='columnar')
+    per resolution next to the input (or in output_dir) and returns a list
+    of (output_path, size), finest first. checkpoint makes it resumable,
+    see _aggregate_levels.
+    """
+    resolutions = sorted(resolutions, key=freq_to_seconds)
+    levels = [(freq, rollup_path(csv_path, freq, output_dir, output_format)) for freq in resolutions]
+
+    print(f"Building {', '.join(resolutions)} rollups of {csv_path} in one pass...")
+
+    results = _aggregate_levels(csv_path, levels, agg_rules or DEFAULT_AGG_RULES, block_size, output_format,
+                                checkpoint)
+    original_size = os.path.getsize(csv_path)
+
+    print("Rollups complete.")
+    for (freq, _), (path, size) in zip(levels, results):
+        print(f"  {freq:>6}: {path} ({size} bytes, {original_size / size:.2f}x)")
+
+    return results
@@ -1,48 +1,169 @@
+import contextlib
+import functools
 import hashlib
 import os
-import json
 import time
+import shutil
+import struct
+from concurrent.futures import ThreadPoolExecutor
+from chunk_gc import GarbageCollector, MIN_DEAD_RATIO
+from chunk_store import ChunkStore
+from chunking import iter_chunk_batches
+from recipe import Recipe, RecipeWriter
+from dedup_reader import DedupFileReader, rehydrate
+from fingerprint_index import RECORD as INDEX_RECORD
+import journal
+import telemetry
 
 CHUNK_SIZE = 4096
-hash_index = {}
 chunk_store_dir = 'chunk_store'
-os.makedirs(chunk_store_dir, exist_ok=True)
+# Opened by get_store() on first use, so importing this module (e.g. for a
+# dry run) creates nothing on disk
+store = None
 
-def deduplicate_file(file_path):
+# Chunk fingerprint functions, selected per rule with chunking["fingerprint"].
+# Which is faster depends on the CPU: SHA-256 wins where it has SHA
+# extensions, BLAKE2b elsewhere.
+FINGERPRINTS = {
+    'sha256': hashlib.sha256,
+    'blake2b': functools.partial(hashlib.blake2b, digest_size=32),
+}
+# Threads hashing chunks; hashlib releases the GIL for chunks over 2 KB
+HASH_WORKERS = min(4, os.cpu_count() or 1)
+# Chunks hashed per thread-pool task
+HASH_TASK_CHUNKS = 512
+# (digest, length) of each chunk deduplicated before a checkpoint, in <file>.meta.chunks.part
+CHUNK_ENTRY = struct.Struct('<32sI')
+
+def get_store():
+    """The chunk store, opened (and created if missing) on first use."""
+    global store
+    if store is None:
+        store = ChunkStore(chunk_store_dir)
+    return store
+
+def reset_store():
+    """Deletes every stored chunk and starts over with an empty store."""
+    global store
+    if store is not None:
+        store.close()
+    shutil.rmtree(chunk_store_dir, ignore_errors=True)
+    store = ChunkStore(chunk_store_dir)
+
+def _digests(fingerprint, chunks):
+    with telemetry.stage('dedup_hash'):
+        return [fingerprint(chunk).digest() for chunk in chunks]
+
+def _hashed_batches(batches, fingerprint, workers):
+    """
+    Yields (chunks, digests) for each batch of chunks. Each batch is hashed
+    on a thread pool while the caller stores the one before it and the
+    next one is read.
+    """
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        pending = None
+        for chunks in batches:
+            futures = [pool.submit(_digests, fingerprint, chunks[i:i + HASH_TASK_CHUNKS])
+                       for i in range(0, len(chunks), HASH_TASK_CHUNKS)]
+            if pending:
+                yield pending[0], [d for future in pending[1] for d in future.result()]
+            pending = chunks, futures
+        if pending:
+            yield pending[0], [d for future in pending[1] for d in future.result()]
+
+def deduplicate_file(file_path, chunking=None, workers=None, checkpoint=None):
     """
     Performs block-level deduplication on a file.
+    chunking selects fixed-size (default) or content-defined chunks, see
+    chunking.iter_chunks, and the fingerprint ("sha256" by default or
+    "blake2b").
+    The file is read in large buffers and cut into memoryview chunks
+    without copying; chunks are hashed on `workers` threads and stored a
+    buffer at a time.
+    The chunk list is written as a binary recipe (see recipe.py) to <file>.meta.
+    With checkpoint (a journal.Checkpoint) the chunks deduplicated so far
+    are saved between buffers, and a later run resumes after them.
     Returns a metadata file path and the space saved.
     """
-    original_size = os.path.getsize(file_path)
-    metadata = {'chunks': []}
+    st = os.stat(file_path)
+    original_size = st.st_size
+    hash_name = (chunking or {}).get('fingerprint', 'sha256')
+    recipe = RecipeWriter(hash_name)
     space_saved = 0
     new_chunks_size = 0
+    chunk_count = new_chunks = 0
+    metadata_path = file_path + '.meta'
+    spill_path = journal.part_path(metadata_path + '.chunks')
+    # Every distinct chunk the file uses gets one reference, handed to the recipe once it is written
+    store = get_store()
+    refs = store.open_refs()
+    state = None
+    if checkpoint is not None:
+        checkpoint.track(spill_path)
+        checkpoint.track(journal.part_path(metadata_path))
+        if checkpoint.interrupted or checkpoint.state:
+            # The lost run may have died holding references
+            store.suspect_refs()
+        state = _resume_chunks(checkpoint.state, hash_name, spill_path, recipe, refs)
+        if state:
+            space_saved, new_chunks_size, chunk_count, new_chunks = \
+                state['saved'], state['new_size'], state['chunks'], state['new']
+            print(f"Resuming deduplication of {file_path} at byte {recipe.file_size}")
+    unsaved = bytearray()  # chunk entries since the last checkpoint
 
-    with open(file_path, 'rb') as f:
-        while True:
-            chunk = f.read(CHUNK_SIZE)
-            if not chunk:
-                break
-            
-            chunk_hash = hashlib.sha256(chunk).hexdigest()
-            metadata['chunks'].append(chunk_hash)
-
-            if chunk_hash not in hash_index:
-                chunk_file_path = os.path.join(chunk_store_dir, chunk_hash)
-                with open(chunk_file_path, 'wb') as chunk_file:
-                    chunk_file.write(chunk)
-                hash_index[chunk_hash] = chunk_file_path
-                new_chunks_size += len(chunk)
-            else:
-                space_saved += len(chunk)
+    try:
+        spill_file = open(spill_path, 'r+b' if state else 'wb') if checkpoint is not None else contextlib.nullcontext()
+        with open(file_path, 'rb') as f, spill_file as spill:
+            if state:
+                f.seek(recipe.file_size)
+                spill.truncate(state['chunks'] * CHUNK_ENTRY.size)
+                spill.seek(0, os.SEEK_END)
+            batches = telemetry.timed(iter_chunk_batches(f, chunking), 'dedup_read')
+            for chunks, digests in _hashed_batches(batches, FINGERPRINTS[hash_name], workers or HASH_WORKERS):
+                chunk_count += len(chunks)
+                with telemetry.stage('dedup_store'):
+                    for digest, chunk, new in zip(digests, chunks, store.put_many(zip(digests, chunks), refs)):
+                        recipe.add(digest, len(chunk))
+                        if checkpoint is not None:
+                            unsaved += CHUNK_ENTRY.pack(digest, len(chunk))
+                        if new:
+                            new_chunks += 1
+                            new_chunks_size += len(chunk) + INDEX_RECORD.size
+                        else:
+                            space_saved += len(chunk)
+                if checkpoint is not None and checkpoint.due():
+                    # The chunks, then their entries, must be durable before the checkpoint points past them
+                    store.flush()
+                    spill.write(unsaved)
+                    spill.flush()
+                    os.fsync(spill.fileno())
+                    unsaved = bytearray()
+                    checkpoint.save({'hash': hash_name, 'chunks': chunk_count, 'saved': space_saved,
+                                     'new_size': new_chunks_size, 'new': new_chunks})
 
-    metadata_path = file_path + '.meta'
-    with open(metadata_path, 'w') as meta_file:
-        json.dump(metadata, meta_file)
+        store.flush()
+        # A recipe this one overwrites gives up its references
+        previous = _recipe_digests(metadata_path) if os.path.exists(metadata_path) else ()
+        metadata_size = recipe.write(journal.part_path(metadata_path))
+        journal.publish(journal.part_path(metadata_path), metadata_path)
+    except BaseException:
+        store.abort_refs(refs)
+        raise
+    store.commit_refs(metadata_path, refs, previous)
+    if checkpoint is not None:
+        os.remove(spill_path)
+        checkpoint.clear()
+    # The recipe keeps the file's mtime, so it ages (and expires) like the file
+    os.utime(metadata_path, ns=(st.st_atime_ns, st.st_mtime_ns))
 
-    # Calculate final size on disk (metadata file + new chunks)
+    # Calculate final size on disk (metadata file + new chunks and their index entries)
     # This is a more accurate measure for the summary table
-    final_size = os.path.getsize(metadata_path) + new_chunks_size
+    final_size = metadata_size + new_chunks_size
+    telemetry.count('chunks_hashed_total', chunk_count, fingerprint=hash_name)
+    telemetry.count('dedup_chunks_total', new_chunks, result='new')
+    telemetry.count('dedup_chunks_total', chunk_count - new_chunks, result='duplicate')
+    telemetry.count('bytes_in_total', original_size, stage='deduplicate')
+    telemetry.count('bytes_out_total', final_size, stage='deduplicate')
     
     os.remove(file_path)
     print(f"Deduplicated {file_path}. Original: {original_size}, Final: {final_size}, Saved: {space_saved}")
@@ -50,25 +171,95 @@ def deduplicate_file(file_path):
     # Return the final size, not just space saved, for easier reporting
     return metadata_path, final_size
 
-def measure_read_latency(metadata_path, chunk_store='chunk_store'):
+def _resume_chunks(state, hash_name, spill_path, recipe, refs):
+    """
+    Replays the chunk entries a checkpoint state covers into recipe and
+    takes references on their chunks. Returns the state, or None if it
+    can't be resumed (other fingerprint, short spill file, chunks gone).
+    """
+    if not state or state.get('hash') != hash_name or not os.path.exists(spill_path):
+        return None
+    with open(spill_path, 'rb') as f:
+        data = f.read(state['chunks'] * CHUNK_ENTRY.size)
+    if len(data) != state['chunks'] * CHUNK_ENTRY.size:
+        return None
+    entries = list(CHUNK_ENTRY.iter_unpack(data))
+    # The lost run's references may be gone since (a recount), so the chunks are referenced again
+    if not get_store().adopt_refs(refs, [digest for digest, _ in entries]):
+        return None
+    for digest, length in entries:
+        recipe.add(digest, length)
+    return state
+
+def _recipe_digests(metadata_path):
+    with Recipe(metadata_path) as recipe:
+        return recipe.unique_digests()
+
+def delete_file(metadata_path):
     """
-    Measures the latency of reading the first chunk of a deduplicated file.
+    Deletes a deduplicated file: removes its recipe and releases its chunk
+    references. Chunks no other file uses become garbage for
+    collect_garbage() to reclaim. Returns the recipe's size.
+    """
+    size = os.path.getsize(metadata_path)
+    get_store().release_recipe(metadata_path, _recipe_digests(metadata_path))
+    os.remove(metadata_path)
+    print(f"Deleted deduplicated file {metadata_path}")
+    return size
+
+def reload_store():
+    """
+    Re-opens the chunk store from disk. For a process whose store went
+    stale while worker processes wrote to the same directory; the stale
+    copy is dropped without being flushed.
+    """
+    global store
+    store = ChunkStore(chunk_store_dir)
+
+def collect_garbage(time_budget=None, min_dead_ratio=MIN_DEAD_RATIO, full_mark=False):
+    """
+    Runs an incremental garbage collection cycle on the chunk store (see
+    chunk_gc.py) for up to time_budget seconds and returns its stats;
+    'complete' says whether the cycle finished.
+    """
+    store = get_store()
+    collector = GarbageCollector(store, min_dead_ratio=min_dead_ratio, full_mark=full_mark)
+    with telemetry.stage('chunk_gc'):
+        complete = collector.run(time_budget)
+        store.flush()
+    stats = dict(collector.stats, complete=complete)
+    for name in ('packs_compacted', 'bytes_copied', 'bytes_reclaimed'):
+        telemetry.count(f'gc_{name}_total', stats[name])
+    telemetry.observe('gc_longest_slice_seconds', stats['longest_slice'])
+    print(f"Chunk store GC: {stats['dead_chunks']} dead chunks, {stats['packs_compacted']} packs compacted, "
+          f"{stats['bytes_reclaimed']} bytes reclaimed in {stats['elapsed']:.2f}s"
+          + ("" if complete else " (time budget reached, cycle incomplete)"))
+    return stats
+
+def restore_file(metadata_path, output_path=None):
+    """
+    Rebuilds the original file from its recipe and the chunk store.
+    Defaults to the path the file was deduplicated from.
+    """
+    if output_path is None:
+        output_path = metadata_path[:-len('.meta')]
+    size = rehydrate(metadata_path, output_path, get_store())
+    print(f"Restored {metadata_path} → {output_path} ({size} bytes)")
+    return output_path
+
+def measure_read_latency(metadata_path):
+    """
+    Measures the latency of reading the first 4KB of a deduplicated file.
     This simulates the read penalty described in the paper.
     """
-    start_time = time.time()
+    start_time = time.perf_counter()
     try:
-        with open(metadata_path, 'r') as f:
-            metadata = json.load(f)
-        
-        first_chunk_hash = metadata['chunks'][0]
-        chunk_path = os.path.join(chunk_store, first_chunk_hash)
-        
-        with open(chunk_path, 'rb') as f_chunk:
-            f_chunk.read(CHUNK_SIZE)
+        with DedupFileReader(metadata_path, get_store(), readahead=0) as reader:
+            reader.read(4096)
             
     except Exception as e:
         print(f"Error measuring dedupe latency: {e}")
         return 0.0
         
-    end_time = time.time()
+    end_time = time.perf_counter()
     return (end_time - start_time) * 1000 # Return in ms
\ No newline at end of file
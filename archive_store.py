@@ -0,0 +1,303 @@
+import json
+import lzma
+import os
+import struct
+import time
+import zlib
+
+import journal
+
+# Archive volume (vol-NNNNNN.arc) layout:
+#
+#   header   magic, version
+#   blocks   solid blocks, each an independent .xz stream (or the raw bytes
+#            when lzma doesn't shrink them) holding the concatenated
+#            contents of files of one type
+#   index    lzma-compressed JSON: every block's offset, lengths, codec and
+#            type, and every member's path, size, mtime, mode, CRC-32 and
+#            extents (block, offset in the uncompressed block, length)
+#   trailer  index offset and length, magic
+#
+# Volumes are written once, in one sequential pass, and never modified. A
+# member is read back by decompressing only the blocks its extents fall in.
+MAGIC = b'DARC'
+VERSION = 1
+HEADER = struct.Struct('<4sI')
+TRAILER = struct.Struct('<QQ4s')
+
+ARCHIVE_DIR = 'archive_store'
+# Uncompressed bytes per solid block: larger blocks compress better, smaller
+# ones make single-file extraction cheaper
+SOLID_BLOCK_SIZE = 16 * 1024 * 1024
+# Start a new volume once the current one reaches this size
+VOLUME_SIZE = 1024 ** 3
+# lzma preset; 6 uses an 8 MB dictionary, which covers most of a block
+PRESET = 6
+READ_SIZE = 1024 * 1024
+
+
+def file_type(path):
+    """Grouping key for solid blocks: the lower-case extension."""
+    return os.path.splitext(path)[1].lower()
+
+
+class _VolumeWriter:
+    """
+    Writes one volume. Members are streamed into the open block of their
+    type; a block is buffered in memory and written with one write when it
+    is full or the type changes.
+    """
+
+    def __init__(self, path, preset, block_size):
+        self.path = path
+        self.preset = preset
+        self.block_size = block_size
+        self.blocks = []
+        self.members = []
+        self._tmp_path = path + '.tmp'
+        self._f = open(self._tmp_path, 'wb')
+        self._f.write(HEADER.pack(MAGIC, VERSION))
+        self._block = None
+
+    @property
+    def size(self):
+        return self._f.tell()
+
+    def _open_block(self, kind):
+        self._block = {'kind': kind, 'raw': [], 'raw_size': 0, 'packed': [],
+                       'compressor': lzma.LZMACompressor(preset=self.preset)}
+
+    def _close_block(self):
+        """Writes the open block in one go, uncompressed if lzma didn't make it smaller."""
+        block = self._block
+        if block is None:
+            return
+        packed = b''.join(block['packed']) + block['compressor'].flush()
+        codec = 'xz'
+        if len(packed) >= block['raw_size']:
+            packed, codec = b''.join(block['raw']), 'raw'
+        self.blocks.append([self._f.tell(), len(packed), block['raw_size'], codec, block['kind']])
+        self._f.write(packed)
+        self._block = None
+
+    def _write(self, data):
+        """Appends data to the open block, cutting blocks at block_size; returns extents."""
+        extents = []
+        while data:
+            if self._block['raw_size'] >= self.block_size:
+                kind = self._block['kind']
+                self._close_block()
+                self._open_block(kind)
+            piece = data[:self.block_size - self._block['raw_size']]
+            data = data[len(piece):]
+            self._block['raw'].append(piece)
+            self._block['packed'].append(self._block['compressor'].compress(piece))
+            extents.append([len(self.blocks), self._block['raw_size'], len(piece)])
+            self._block['raw_size'] += len(piece)
+        return extents
+
+    def add(self, path, kind):
+        if self._block is None or self._block['kind'] != kind:
+            self._close_block()
+            self._open_block(kind)
+        st = os.stat(path)
+        extents = []
+        crc = 0
+        with open(path, 'rb') as f:
+            for data in iter(lambda: f.read(READ_SIZE), b''):
+                crc = zlib.crc32(data, crc)
+                for extent in self._write(data):
+                    # Merge with the previous extent when it continues in the same block
+                    if extents and extents[-1][0] == extent[0] and sum(extents[-1][1:]) == extent[1]:
+                        extents[-1][2] += extent[2]
+                    else:
+                        extents.append(extent)
+        member = {'path': path, 'size': st.st_size, 'mtime': st.st_mtime, 'mode': st.st_mode & 0o7777,
+                  'crc32': crc, 'type': kind, 'extents': extents}
+        self.members.append(member)
+        return member
+
+    def close(self):
+        """Writes the index and trailer, makes the volume durable and renames it into place."""
+        self._close_block()
+        index = lzma.compress(json.dumps({'blocks': self.blocks, 'members': self.members}).encode())
+        index_offset = self._f.tell()
+        self._f.write(index)
+        self._f.write(TRAILER.pack(index_offset, len(index), MAGIC))
+        self._f.close()
+        # Durable, rename included, before archive() deletes the originals
+        journal.publish(self._tmp_path, self.path)
+        return os.path.getsize(self.path)
+
+
+def read_volume_index(path):
+    """The (blocks, members) index of a volume."""
+    with open(path, 'rb') as f:
+        magic, version = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Not an archive volume: {path}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported archive volume version {version}: {path}")
+        f.seek(-TRAILER.size, os.SEEK_END)
+        index_offset, index_length, magic = TRAILER.unpack(f.read(TRAILER.size))
+        if magic != MAGIC:
+            raise ValueError(f"Truncated archive volume: {path}")
+        f.seek(index_offset)
+        index = json.loads(lzma.decompress(f.read(index_length)))
+    return index['blocks'], index['members']
+
+
+class ArchiveStore:
+    """
+    Cold-tier archive: many files packed into a few large lzma volumes.
+
+    archive() writes a whole batch of files into new volumes in one
+    sequential pass. Files are grouped by type so each solid block holds
+    similar data (logs with logs, CSVs with CSVs), which lets lzma find
+    redundancy across files; blocks lzma can't shrink (already compressed
+    or random data) are stored as they are. Every volume ends
+    with an index of its members, read on open, so a single file is
+    extracted by decompressing only its own blocks.
+    """
+
+    def __init__(self, root=ARCHIVE_DIR, preset=PRESET, block_size=SOLID_BLOCK_SIZE, volume_size=VOLUME_SIZE):
+        self.root = root
+        self.preset = preset
+        self.block_size = block_size
+        self.volume_size = volume_size
+        os.makedirs(root, exist_ok=True)
+        # path -> (volume path, blocks of that volume, member)
+        self._members = {}
+        for volume_id in sorted(self._volume_ids()):
+            volume = self._volume_path(volume_id)
+            blocks, members = read_volume_index(volume)
+            for member in members:
+                self._members[member['path']] = (volume, blocks, member)
+
+    def _volume_path(self, volume_id):
+        return os.path.join(self.root, f'vol-{volume_id:06d}.arc')
+
+    def _volume_ids(self):
+        for name in os.listdir(self.root):
+            if name.startswith('vol-') and name.endswith('.arc'):
+                yield int(name[4:-4])
+
+    def __contains__(self, path):
+        return os.path.normpath(path) in self._members
+
+    def __len__(self):
+        return len(self._members)
+
+    def volume_of(self, path):
+        """Path of the volume holding an archived file."""
+        return self._members[os.path.normpath(path)][0]
+
+    def members(self):
+        """Archived paths, in archive order."""
+        return list(self._members)
+
+    # --- writing --------------------------------------------------------
+
+    def archive(self, paths, delete_originals=True):
+        """
+        Packs the files into new volumes and returns {path: bytes stored}.
+
+        A file's stored size is its share of the compressed blocks it went
+        into. Originals are deleted only once every volume of the batch is
+        on disk.
+        """
+        groups = {}
+        for path in paths:
+            groups.setdefault(file_type(path), []).append(os.path.normpath(path))
+
+        next_id = max(self._volume_ids(), default=-1) + 1
+        writer = None
+        written = []
+        for kind, group in sorted(groups.items()):
+            for path in sorted(group):
+                if writer is None:
+                    writer = _VolumeWriter(self._volume_path(next_id), self.preset, self.block_size)
+                    next_id += 1
+                writer.add(path, kind)
+                if writer.size >= self.volume_size:
+                    writer.close()
+                    written.append(writer)
+                    writer = None
+        if writer is not None:
+            writer.close()
+            written.append(writer)
+
+        stored = {}
+        for writer in written:
+            for member in writer.members:
+                self._members[member['path']] = (writer.path, writer.blocks, member)
+                stored[member['path']] = sum(length * writer.blocks[block][1] / max(writer.blocks[block][2], 1)
+                                             for block, _, length in member['extents'])
+            print(f"Archived {len(writer.members)} files into {writer.path} "
+                  f"({sum(m['size'] for m in writer.members)} → {os.path.getsize(writer.path)} bytes)")
+        if delete_originals:
+            for path in stored:
+                os.remove(path)
+        return stored
+
+    # --- reading --------------------------------------------------------
+
+    def _iter_range(self, path, offset, end):
+        volume, blocks, member = self._members[path]
+        pos = 0
+        with open(volume, 'rb') as f:
+            for block_no, block_offset, length in member['extents']:
+                lo, hi = max(offset, pos), min(end, pos + length)
+                if lo < hi:
+                    data = self._read_block(f, blocks[block_no], block_offset + hi - pos)
+                    yield data[block_offset + lo - pos:]
+                pos += length
+                if pos >= end:
+                    break
+
+    def read(self, path, offset=0, n=-1):
+        """Bytes [offset, offset + n) of an archived file (to its end if n < 0)."""
+        path = os.path.normpath(path)
+        size = self._members[path][2]['size']
+        return b''.join(self._iter_range(path, offset, size if n < 0 else min(size, offset + n)))
+
+    @staticmethod
+    def _read_block(f, block, raw_end):
+        """The first raw_end uncompressed bytes of a block; decompression stops there."""
+        offset, length, _, codec, _ = block
+        if codec == 'raw':
+            return os.pread(f.fileno(), raw_end, offset)
+        decompressor = lzma.LZMADecompressor()
+        data = bytearray()
+        pos = 0
+        while len(data) < raw_end and not decompressor.eof and pos < length:
+            chunk = os.pread(f.fileno(), min(READ_SIZE, length - pos), offset + pos)
+            pos += len(chunk)
+            data += decompressor.decompress(chunk, raw_end - len(data))
+            while len(data) < raw_end and not decompressor.needs_input and not decompressor.eof:
+                data += decompressor.decompress(b'', raw_end - len(data))
+        return bytes(data)
+
+    def extract(self, path, output_path=None):
+        """Restores an archived file (with its mtime and mode) and returns the output path."""
+        path = os.path.normpath(path)
+        _, _, member = self._members[path]
+        output_path = output_path or path
+        crc = 0
+        with open(output_path, 'wb') as f:
+            for data in self._iter_range(path, 0, member['size']):
+                crc = zlib.crc32(data, crc)
+                f.write(data)
+        if crc != member['crc32']:
+            os.remove(output_path)
+            raise ValueError(f"Archived copy of {path} is corrupt (CRC mismatch)")
+        os.chmod(output_path, member['mode'])
+        os.utime(output_path, (member['mtime'], member['mtime']))
+        return output_path
+
+
+def measure_read_latency(store, path):
+    """Milliseconds to read the first 4KB of an archived file."""
+    start = time.perf_counter()
+    store.read(path, 0, 4096)
+    return (time.perf_counter() - start) * 1000
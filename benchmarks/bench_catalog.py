@@ -0,0 +1,79 @@
+"""
+Cost of a repeated scan with the file catalog vs a full walk.
+
+Builds a tree of empty files, records it in a scratch catalog, changes a
+few directories, and times a catalog rescan against re-walking and
+re-stat'ing the whole tree.
+
+    python -m benchmarks.bench_catalog --dirs 500 --files-per-dir 100
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import catalog
+from catalog import FileCatalog
+
+
+def walk_and_stat(root):
+    count = 0
+    for directory, _, files in os.walk(root):
+        for name in files:
+            os.stat(os.path.join(directory, name))
+            count += 1
+    return count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--dirs', type=int, default=200)
+    parser.add_argument('--files-per-dir', type=int, default=100)
+    parser.add_argument('--changed-dirs', type=int, default=2)
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(dir=args.dir)
+    data = os.path.join(root, 'data')
+    try:
+        for d in range(args.dirs):
+            directory = os.path.join(data, f'd{d // 20}', f'd{d}')
+            os.makedirs(directory)
+            for f in range(args.files_per_dir):
+                open(os.path.join(directory, f'f{f}.log'), 'wb').close()
+        # Directories written just now would be rescanned as "racy"
+        catalog.RACY_WINDOW_NS = 0
+        time.sleep(0.01)
+
+        with FileCatalog(data, path=os.path.join(root, 'catalog.db')) as cat:
+            start = time.perf_counter()
+            total = len(cat.scan())
+            first_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            walk_and_stat(data)
+            walk_s = time.perf_counter() - start
+
+            for d in range(args.changed_dirs):
+                open(os.path.join(data, f'd{d // 20}', f'd{d}', 'new.log'), 'wb').close()
+            start = time.perf_counter()
+            changed = len(cat.scan())
+            rescan_s = time.perf_counter() - start
+
+            start = time.perf_counter()
+            cat.scan(full=True)
+            full_s = time.perf_counter() - start
+    finally:
+        shutil.rmtree(root)
+
+    print(f"{total} files in {args.dirs} directories, {changed} new files in {args.changed_dirs} of them\n")
+    print(f"{'Scan':<32} {'Time (ms)':>10}")
+    print(f"{'First catalog scan':<32} {first_s * 1e3:>10.1f}")
+    print(f"{'os.walk + stat every file':<32} {walk_s * 1e3:>10.1f}")
+    print(f"{'Catalog rescan (full=True)':<32} {full_s * 1e3:>10.1f}")
+    print(f"{'Catalog rescan (incremental)':<32} {rescan_s * 1e3:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+"""
+Chunk store garbage collection: reclaimed bytes, GC throughput and its effect on ingest.
+
+Deduplicates a set of files that share part of their blocks, deletes a
+fraction of them with Deduplication.delete_file (and one recipe behind
+the store's back, which forces a mark pass), then runs a GC cycle twice:
+alone, and on a background thread while more files are deduplicated.
+Reports the bytes reclaimed, GC throughput (pack bytes processed per
+second), the longest time a GC slice ran, and ingest throughput with and
+without the collector running. Every surviving file is restored and
+checked at the end.
+
+    python -m benchmarks.bench_chunk_gc --files 12 --file-mb 64 --delete 0.5
+"""
+import argparse
+import hashlib
+import os
+import shutil
+import tempfile
+import threading
+import time
+
+import generate_test_data_10gb
+
+PACK_MB = 64
+
+
+def pack_bytes(root):
+    return sum(os.path.getsize(os.path.join(root, n)) for n in os.listdir(root) if n.endswith('.pack'))
+
+
+def md5(path):
+    digest = hashlib.md5()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def make_files(directory, prefix, count, size, duplicate_ratio, first_index=0):
+    paths = []
+    for i in range(count):
+        paths.append(os.path.join(directory, f'{prefix}{i}.bin'))
+        generate_test_data_10gb.write_redundant(paths[-1], size, seed=0, index=first_index + i,
+                                                duplicate_ratio=duplicate_ratio, pool_blocks=16)
+    return paths
+
+
+def ingest(Deduplication, paths):
+    """Deduplicates paths; returns (MB/s, recipe paths)."""
+    size = sum(os.path.getsize(p) for p in paths)
+    start = time.perf_counter()
+    metas = [Deduplication.deduplicate_file(p)[0] for p in paths]
+    return size / 1e6 / (time.perf_counter() - start), metas
+
+
+def run_round(Deduplication, root, name, args, size, with_ingest):
+    """Fills a fresh store, deletes files, collects; returns a result row."""
+    directory = os.path.join(root, name)
+    os.makedirs(directory)
+    Deduplication.reset_store()
+    Deduplication.get_store().pack_size = PACK_MB * 1024 * 1024
+    paths = make_files(directory, 'f', args.files, size, args.duplicate_ratio)
+    checksums = {p + '.meta': md5(p) for p in paths}
+    _, metas = ingest(Deduplication, paths)
+
+    deleted = metas[:int(len(metas) * args.delete)]
+    for meta in deleted[1:]:
+        Deduplication.delete_file(meta)
+    if deleted:
+        os.remove(deleted[0])  # behind the store's back
+    before = pack_bytes(Deduplication.chunk_store_dir)
+
+    from chunk_gc import GarbageCollector
+    collector = GarbageCollector(Deduplication.get_store(), slice_seconds=args.slice_ms / 1e3)
+    ingest_rate = None
+    extra = []
+    if with_ingest:
+        more = make_files(directory, 'g', args.ingest_files, size, args.duplicate_ratio, first_index=args.files)
+        checksums.update({p + '.meta': md5(p) for p in more})
+
+        def collect():
+            while collector.step():
+                time.sleep(0)
+        thread = threading.Thread(target=collect)
+        thread.start()
+        ingest_rate, extra = ingest(Deduplication, more)
+        thread.join()
+    else:
+        collector.run()
+    Deduplication.get_store().flush()
+    # With ingest, the packs also hold the new files
+    after = None if with_ingest else pack_bytes(Deduplication.chunk_store_dir)
+
+    for meta in metas[len(deleted):] + extra:
+        restored = Deduplication.restore_file(meta, meta + '.check')
+        if md5(restored) != checksums[meta]:
+            raise AssertionError(f"{meta} restored incorrectly after GC")
+        os.remove(restored)
+    stats = collector.stats
+    processed = stats['packs_compacted'] * PACK_MB * 1024 * 1024
+    return (name, before, after, stats['bytes_reclaimed'], stats['bytes_copied'], stats['elapsed'],
+            processed / 1e6 / max(stats['elapsed'], 1e-9), stats['longest_slice'], ingest_rate)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=12)
+    parser.add_argument('--file-mb', type=int, default=64)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.3,
+                        help='share of 1 MB blocks drawn from a pool shared by all files')
+    parser.add_argument('--delete', type=float, default=0.5, help='fraction of files deleted')
+    parser.add_argument('--ingest-files', type=int, default=4, help='files deduplicated while GC runs')
+    parser.add_argument('--slice-ms', type=float, default=50)
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    size = args.file_mb * 1024 * 1024
+    root = tempfile.mkdtemp(dir=args.dir)
+    cwd = os.getcwd()
+    rows = []
+    try:
+        os.chdir(root)
+        import Deduplication
+
+        # Ingest alone, for reference
+        Deduplication.reset_store()
+        directory = os.path.join(root, 'baseline')
+        os.makedirs(directory)
+        baseline, _ = ingest(Deduplication, make_files(directory, 'g', args.ingest_files, size,
+                                                       args.duplicate_ratio, first_index=args.files))
+        shutil.rmtree(directory)
+
+        rows.append(run_round(Deduplication, root, 'GC alone', args, size, with_ingest=False))
+        rows.append(run_round(Deduplication, root, 'GC during ingest', args, size, with_ingest=True))
+        Deduplication.get_store().close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
+
+    print(f"\n{args.files} files x {args.file_mb} MB, {args.duplicate_ratio:.0%} shared blocks, "
+          f"{args.delete:.0%} deleted, {PACK_MB} MB packs, {args.slice_ms:g} ms slices\n")
+    print(f"{'Run':<18} {'Packs before':>13} {'after':>9} {'Reclaimed':>10} {'Copied':>8} {'GC (s)':>7} "
+          f"{'GC MB/s':>8} {'Max slice (ms)':>15} {'Ingest MB/s':>12}")
+    for name, before, after, reclaimed, copied, elapsed, rate, longest, ingest_rate in rows:
+        ingest_rate = f"{ingest_rate:.1f}" if ingest_rate else '-'
+        after = f"{after / 1e6:.1f} MB" if after is not None else '-'
+        print(f"{name:<18} {before / 1e6:>10.1f} MB {after:>9} {reclaimed / 1e6:>7.1f} MB "
+              f"{copied / 1e6:>5.1f} MB {elapsed:>7.2f} {rate:>8.1f} {longest * 1e3:>15.1f} {ingest_rate:>12}")
+    print(f"\nIngest alone: {baseline:.1f} MB/s")
+
+
+if __name__ == '__main__':
+    main()
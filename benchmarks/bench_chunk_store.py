@@ -0,0 +1,83 @@
+"""
+Compares the packed ChunkStore against the old one-file-per-chunk layout.
+
+    python -m benchmarks.bench_chunk_store --chunks 200000
+"""
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks import harness
+from chunk_store import ChunkStore
+
+CHUNK_SIZE = 4096
+
+
+def make_chunks(count):
+    return [os.urandom(CHUNK_SIZE) for _ in range(count)]
+
+
+def bench_file_per_chunk(root, chunks, digests, reads):
+    start = time.perf_counter()
+    for digest, chunk in zip(digests, chunks):
+        with open(os.path.join(root, digest.hex()), 'wb') as f:
+            f.write(chunk)
+    write_s = time.perf_counter() - start
+
+    latencies = []
+    for digest in reads:
+        t0 = time.perf_counter()
+        with open(os.path.join(root, digest.hex()), 'rb') as f:
+            f.read(CHUNK_SIZE)
+        latencies.append(time.perf_counter() - t0)
+    return write_s, latencies
+
+
+def bench_pack_store(root, chunks, digests, reads):
+    start = time.perf_counter()
+    store = ChunkStore(root)
+    for digest, chunk in zip(digests, chunks):
+        store.put(digest, chunk)
+    store.flush()
+    write_s = time.perf_counter() - start
+
+    latencies = []
+    for digest in reads:
+        t0 = time.perf_counter()
+        store.get(digest)
+        latencies.append(time.perf_counter() - t0)
+    store.close()
+    return write_s, latencies
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=100000)
+    parser.add_argument('--reads', type=int, default=20000)
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    chunks = make_chunks(args.chunks)
+    digests = [hashlib.sha256(c).digest() for c in chunks]
+    reads = [random.choice(digests) for _ in range(args.reads)]
+    total_mb = len(chunks) * CHUNK_SIZE / 1e6
+
+    print(f"{'Layout':<16} {'Write MB/s':<12} {'Chunks/s':<12} {'Read p50 (us)':<15} {'Read p99 (us)':<15}")
+    print("-" * 70)
+    for name, bench in (("file-per-chunk", bench_file_per_chunk), ("pack files", bench_pack_store)):
+        root = tempfile.mkdtemp(dir=args.dir)
+        try:
+            write_s, latencies = bench(root, chunks, digests, reads)
+        finally:
+            shutil.rmtree(root)
+        latency = harness.percentiles(latencies)
+        print(f"{name:<16} {total_mb / write_s:<12.1f} {len(chunks) / write_s:<12.0f} "
+              f"{latency['p50_ms'] * 1e3:<15.1f} {latency['p99_ms'] * 1e3:<15.1f}")
+
+
+if __name__ == '__main__':
+    main()
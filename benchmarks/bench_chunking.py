@@ -0,0 +1,76 @@
+"""
+Dedup ratio and throughput of fixed-size vs content-defined chunking.
+
+Builds a base blob plus several "versions" of it with a few bytes inserted
+at random offsets (the versioned-binary / appended-blob case), then counts
+how many bytes each chunker has to store.
+
+    python -m benchmarks.bench_chunking --size-mb 64 --versions 4
+"""
+import argparse
+import hashlib
+import io
+import random
+import time
+
+from chunking import iter_chunks
+
+CHUNKERS = {
+    'fixed 4K': {'method': 'fixed', 'chunk_size': 4096},
+    'fixed 8K': {'method': 'fixed', 'chunk_size': 8192},
+    'cdc 2K/8K/64K': {'method': 'cdc', 'min_size': 2048, 'avg_size': 8192, 'max_size': 65536},
+    'cdc 1K/4K/16K': {'method': 'cdc', 'min_size': 1024, 'avg_size': 4096, 'max_size': 16384},
+}
+
+
+def make_versions(size, versions, edits, rng):
+    base = rng.randbytes(size)
+    blobs = [base]
+    for _ in range(versions):
+        blob = bytearray(blobs[-1])
+        for _ in range(edits):
+            pos = rng.randrange(len(blob))
+            blob[pos:pos] = rng.randbytes(rng.randint(1, 16))
+        blobs.append(bytes(blob))
+    return blobs
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=32)
+    parser.add_argument('--versions', type=int, default=4)
+    parser.add_argument('--edits', type=int, default=20, help='insertions per version')
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    blobs = make_versions(args.size_mb * 1024 * 1024, args.versions, args.edits, random.Random(args.seed))
+    total = sum(len(b) for b in blobs)
+
+    print(f"{'Chunker':<16} {'Dedup Ratio':<13} {'Avg Chunk':<11} {'Chunk MB/s':<12} {'Chunk+SHA256 MB/s':<18}")
+    print("-" * 72)
+    throughput = {}
+    for name, chunking in CHUNKERS.items():
+        start = time.perf_counter()
+        chunks = [c for blob in blobs for c in iter_chunks(io.BytesIO(blob), chunking)]
+        chunk_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        stored = {}
+        for chunk in chunks:
+            stored.setdefault(hashlib.sha256(chunk).digest(), len(chunk))
+        hash_s = time.perf_counter() - start
+
+        ratio = total / sum(stored.values())
+        throughput[name] = total / 1e6 / chunk_s
+        print(f"{name:<16} {ratio:<13.2f} {total / len(chunks):<11.0f} "
+              f"{throughput[name]:<12.1f} {total / 1e6 / (chunk_s + hash_s):<18.1f}")
+
+    # CDC has to keep up with fixed-size chunking (and the disk) to be worth turning on
+    print()
+    for name in CHUNKERS:
+        if name.startswith('cdc'):
+            print(f"{name} chunking speed vs fixed 4K: {throughput[name] / throughput['fixed 4K']:.2f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+"""
+Read latency of columnar (.col) aggregate output vs the CSV output.
+
+Writes a year of 1-minute aggregates in both formats, then times a full
+column read and a one-day time-range query against each, opening the file
+afresh for every repetition.
+
+    python -m benchmarks.bench_columnar --days 365
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from columnar import ColumnarFile, ColumnarWriter, query
+
+
+def best_of(repeat, func):
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - start)
+    return min(times)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    rows = args.days * 24 * 60
+    rng = np.random.default_rng(0)
+    ts = np.datetime64('2024-01-01', 's').astype(np.int64) + 60 * np.arange(rows)
+    values = {
+        'temperature': rng.normal(22, 2, rows),
+        'pressure': rng.normal(1012, 3, rows),
+        'event_count': rng.integers(0, 6000, rows),
+    }
+    day_start = int(ts[rows // 2] // 86400 * 86400)
+    day_end = day_start + 86400
+
+    root = tempfile.mkdtemp(dir=args.dir)
+    try:
+        csv_path = os.path.join(root, 'agg.csv')
+        col_path = os.path.join(root, 'agg.col')
+        frame = pd.DataFrame({'timestamp': ts.astype('datetime64[s]'), **values})
+        frame.to_csv(csv_path, index=False)
+        with ColumnarWriter(col_path, list(values)) as writer:
+            writer.append(ts, values)
+
+        def csv_column():
+            pd.read_csv(csv_path, usecols=['temperature'])['temperature'].to_numpy()
+
+        def csv_day():
+            df = pd.read_csv(csv_path, parse_dates=['timestamp'])
+            df[(df.timestamp >= pd.Timestamp(day_start, unit='s')) & (df.timestamp < pd.Timestamp(day_end, unit='s'))]
+
+        def col_column():
+            ColumnarFile(col_path).column('temperature').sum()
+
+        def col_day():
+            query(col_path, day_start, day_end)['temperature'].sum()
+
+        results = [
+            ('Full column', best_of(args.repeat, csv_column), best_of(args.repeat, col_column)),
+            ('One-day query', best_of(args.repeat, csv_day), best_of(args.repeat, col_day)),
+        ]
+        csv_size, col_size = os.path.getsize(csv_path), os.path.getsize(col_path)
+    finally:
+        shutil.rmtree(root)
+
+    print(f"{rows} rows; CSV {csv_size / 1e6:.1f} MB, columnar {col_size / 1e6:.1f} MB\n")
+    print(f"{'Read':<16} {'CSV (ms)':>10} {'Columnar (ms)':>14} {'Speedup':>9}")
+    for name, csv_s, col_s in results:
+        print(f"{name:<16} {csv_s * 1e3:>10.2f} {col_s * 1e3:>14.3f} {csv_s / col_s:>8.0f}x")
+
+
+if __name__ == '__main__':
+    main()
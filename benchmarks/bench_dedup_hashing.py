@@ -0,0 +1,89 @@
+"""
+Deduplication throughput: per-chunk read/hash/put loop vs the batched, threaded pipeline.
+
+The old loop reads 4 KB at a time, hashes on the calling thread and
+stores one chunk per call. The pipeline reads 16 MB buffers, slices them
+into memoryview chunks, hashes on a thread pool and stores a buffer per
+call. Every run starts from an empty chunk store and a cold page cache.
+
+    python -m benchmarks.bench_dedup_hashing --mb 512 --duplicate-ratio 0.5
+"""
+import argparse
+import contextlib
+import hashlib
+import os
+import shutil
+import tempfile
+import time
+
+import generate_test_data_10gb
+from recipe import RecipeWriter
+from benchmarks import harness
+
+
+def old_loop(path, store):
+    """deduplicate_file's chunk loop before the pipeline."""
+    recipe = RecipeWriter()
+    with open(path, 'rb') as f:
+        while True:
+            chunk = f.read(4096)
+            if not chunk:
+                break
+            digest = hashlib.sha256(chunk).digest()
+            recipe.add(digest, len(chunk))
+            store.put(digest, chunk)
+    store.flush()
+    recipe.write(path + '.meta')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--mb', type=int, default=512)
+    parser.add_argument('--duplicate-ratio', type=float, default=0.5)
+    parser.add_argument('--threads', type=int, nargs='+', default=[1, 2, 4])
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(dir=args.dir)
+    cwd = os.getcwd()
+    results = []
+    try:
+        source = os.path.join(root, 'source.bin')
+        generate_test_data_10gb.write_redundant(source, args.mb * 1024 * 1024, seed=0, index=0,
+                                                duplicate_ratio=args.duplicate_ratio, pool_blocks=64)
+        # The module-level store lives in the cwd
+        os.chdir(root)
+        import Deduplication
+
+        runs = [('Per-chunk loop (sha256)', None, None)]
+        runs += [(f'Pipeline, {fp}, {n} thread(s)', fp, n) for fp in Deduplication.FINGERPRINTS for n in args.threads]
+        for name, fingerprint, threads in runs:
+            Deduplication.reset_store()
+            path = os.path.join(root, 'input.bin')
+            shutil.copyfile(source, path)
+            harness.drop_cache(path)
+            # deduplicate_file reports every file it stores; keep that out of the results
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+                wall, cpu = time.perf_counter(), time.process_time()
+                if fingerprint is None:
+                    old_loop(path, Deduplication.get_store())
+                else:
+                    Deduplication.deduplicate_file(path, {'fingerprint': fingerprint}, workers=threads)
+            wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+            for leftover in (path, path + '.meta'):
+                if os.path.exists(leftover):
+                    os.remove(leftover)
+            results.append((name, wall, cpu))
+        Deduplication.get_store().close()
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
+
+    print(f"\n{args.mb} MB, {args.duplicate_ratio:.0%} duplicate 1 MB blocks, {os.cpu_count()} CPU(s)\n")
+    print(f"{'Mode':<34} {'MB/s':>8} {'Wall (s)':>9} {'CPU (s)':>8}")
+    for name, wall, cpu in results:
+        print(f"{name:<34} {args.mb * 1.048576 / wall:>8.1f} {wall:>9.2f} {cpu:>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
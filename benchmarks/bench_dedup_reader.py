@@ -0,0 +1,81 @@
+"""
+Restore throughput and random-read latency of DedupFileReader.
+
+Deduplicates a generated file into a scratch chunk store, then compares a
+full rehydration against reading the original file, and times random 4 KB
+reads through the reader.
+
+    python -m benchmarks.bench_dedup_reader --size-mb 256
+"""
+import argparse
+import hashlib
+import os
+import random
+import shutil
+import tempfile
+import time
+
+from benchmarks import harness
+from chunk_store import ChunkStore
+from chunking import iter_chunks
+from dedup_reader import DedupFileReader, rehydrate
+from recipe import RecipeWriter
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=128)
+    parser.add_argument('--reads', type=int, default=5000)
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(dir=args.dir)
+    try:
+        source = os.path.join(root, 'source.bin')
+        with open(source, 'wb') as f:
+            for _ in range(args.size_mb):
+                f.write(os.urandom(1024 * 1024))
+
+        store = ChunkStore(os.path.join(root, 'store'))
+        recipe = RecipeWriter()
+        with open(source, 'rb') as f:
+            for chunk in iter_chunks(f):
+                digest = hashlib.sha256(chunk).digest()
+                store.put(digest, chunk)
+                recipe.add(digest, len(chunk))
+        store.flush()
+        meta = source + '.meta'
+        recipe.write(meta)
+
+        size = os.path.getsize(source)
+        start = time.perf_counter()
+        with open(source, 'rb') as f:
+            while f.read(8 * 1024 * 1024):
+                pass
+        raw_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rehydrate(meta, os.path.join(root, 'restored.bin'), store)
+        restore_s = time.perf_counter() - start
+
+        latencies = []
+        with DedupFileReader(meta, store, readahead=0) as reader:
+            for _ in range(args.reads):
+                offset = random.randrange(size - 4096)
+                t0 = time.perf_counter()
+                reader.seek(offset)
+                reader.read(4096)
+                latencies.append(time.perf_counter() - t0)
+        store.close()
+    finally:
+        shutil.rmtree(root)
+
+    print(f"Raw sequential read:   {size / 1e6 / raw_s:.1f} MB/s")
+    print(f"Rehydrate (restore):   {size / 1e6 / restore_s:.1f} MB/s")
+    latency = harness.percentiles(latencies)
+    print(f"Random 4KB read p50:   {latency['p50_ms'] * 1e3:.1f} us")
+    print(f"Random 4KB read p99:   {latency['p99_ms'] * 1e3:.1f} us")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,94 @@
+"""
+Lookup rate and resident memory of the persistent FingerprintIndex.
+
+    python -m benchmarks.bench_fingerprint_index --chunks 2000000
+"""
+import argparse
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from fingerprint_index import FingerprintIndex
+
+
+# Run in a fresh interpreter so the build phase's memory does not skew the result
+RESIDENT_PROBE = """
+import os, sys
+from fingerprint_index import FingerprintIndex
+def rss():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+before = rss()
+index = FingerprintIndex(sys.argv[1])
+print(rss() - before)
+"""
+
+
+def resident_after_reopen(root):
+    """Resident memory (Linux) of a freshly opened index, excluding the interpreter."""
+    out = subprocess.run([sys.executable, '-c', RESIDENT_PROBE, root],
+                         check=True, capture_output=True, text=True)
+    return int(out.stdout)
+
+
+def lookup_rate(index, digests):
+    start = time.perf_counter()
+    for digest in digests:
+        index.get(digest)
+    return len(digests) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--chunks', type=int, default=1000000)
+    parser.add_argument('--lookups', type=int, default=200000)
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(dir=args.dir)
+    try:
+        index = FingerprintIndex(root)
+        sample = []
+        start = time.perf_counter()
+        for i in range(args.chunks):
+            digest = os.urandom(32)
+            index.add(digest, (0, i * 4096, 4096))
+            if len(sample) < args.lookups:
+                sample.append(digest)
+            if i % 65536 == 65535:
+                index.flush()
+        index.flush()
+        index.merge()
+        insert_s = time.perf_counter() - start
+        index.close()
+
+        resident = resident_after_reopen(root)
+        index = FingerprintIndex(root)
+        random.shuffle(sample)
+        misses = [os.urandom(32) for _ in range(args.lookups)]
+        hit_rate = lookup_rate(index, sample)
+        miss_rate = lookup_rate(index, misses)
+        false_positives = sum(digest in index.bloom for digest in misses)
+        bloom_bytes = len(index.bloom.bits)
+        table_bytes = os.path.getsize(os.path.join(root, 'fingerprints.tbl'))
+        index.close()
+    finally:
+        shutil.rmtree(root)
+
+    per_million = 1e6 / args.chunks
+    print(f"Entries:                   {args.chunks}")
+    print(f"Insert rate:               {args.chunks / insert_s:,.0f} /s")
+    print(f"Lookup rate (hits):        {hit_rate:,.0f} /s")
+    print(f"Lookup rate (new chunks):  {miss_rate:,.0f} /s")
+    print(f"Bloom false positives:     {false_positives / len(misses):.2%}")
+    print(f"On-disk table:             {table_bytes * per_million / 1e6:.1f} MB per million chunks")
+    print(f"Bloom filter:              {bloom_bytes * per_million / 1e6:.2f} MB per million chunks")
+    print(f"Resident after reopen:     {resident * per_million / 1e6:.2f} MB per million chunks")
+
+
+if __name__ == '__main__':
+    main()
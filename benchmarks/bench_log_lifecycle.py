@@ -0,0 +1,123 @@
+"""
+Writer stalls while rotated logs are compressed: inline vs LogLifecycleService.
+
+A writer appends and flushes log lines at a steady rate while a set of
+rotated segments is compressed, either inline on the writer's thread (as
+the old manage_logs did) or on the service's background pool with and
+without an I/O rate limit. Reports the writer's throughput, p99 and
+worst-case latency per line, and how long compression took to finish.
+
+    python -m benchmarks.bench_log_lifecycle --segments 4 --segment-mb 32 --io-mb-per-s 16
+"""
+import argparse
+import os
+import shutil
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import compression
+import log_rotation
+
+LINE = b'2025-09-02 12:00:00,123 - INFO - request handled in 12 ms user=42 path=/api/items\n'
+# Rotation time of the first segment; the others follow a second apart
+FIRST_ROTATION = datetime(2025, 9, 2, 12, 0, 0)
+
+
+def make_segments(directory, count, size):
+    """Rotated segments of log lines with random request ids, so they compress like real logs."""
+    os.makedirs(directory)
+    rng = np.random.default_rng(0)
+    for i in range(count):
+        stamp = (FIRST_ROTATION + timedelta(seconds=i)).strftime(log_rotation.STAMP_FORMAT)
+        with open(os.path.join(directory, f'app.log.{stamp}'), 'wb') as f:
+            written = 0
+            while written < size:
+                ids = rng.integers(0, 2**63, 8192)
+                block = b''.join(LINE[:-1] + b' id=%x\n' % x for x in ids.tolist())
+                f.write(block)
+                written += len(block)
+
+
+def write_for(path, seconds, rate, during=None, finished=None):
+    """
+    Appends rate lines per second for the given time, calling during()
+    after the first line. Returns per-line latencies (in seconds, including any time spent
+    in during) and the time at which finished() first returned True.
+    """
+    latencies = []
+    done_at = None
+    with open(path, 'ab') as f:
+        begin = time.perf_counter()
+        while True:
+            start = time.perf_counter()
+            f.write(LINE)
+            f.flush()
+            if during:
+                during()
+                during = None
+            latencies.append(time.perf_counter() - start)
+            if len(latencies) % 100 == 0:
+                if done_at is None and finished and finished():
+                    done_at = time.perf_counter() - begin
+                ahead = begin + len(latencies) / rate - time.perf_counter()
+                if ahead > 0:
+                    time.sleep(ahead)
+            if start - begin > seconds:
+                return np.array(latencies), done_at
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--segments', type=int, default=4)
+    parser.add_argument('--segment-mb', type=int, default=32)
+    parser.add_argument('--seconds', type=float, default=15)
+    parser.add_argument('--lines-per-s', type=int, default=50000)
+    parser.add_argument('--io-mb-per-s', type=float, default=16)
+    parser.add_argument('--level', type=int, default=6)
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    root = tempfile.mkdtemp(dir=args.dir)
+    results = []
+    try:
+        modes = [('Idle (no compression)', None), ('Inline compression', 'inline'),
+                 ('Service, unlimited', None), (f'Service, {args.io_mb_per_s:g} MB/s', args.io_mb_per_s)]
+        for n, (name, mode) in enumerate(modes):
+            directory = os.path.join(root, str(n))
+            make_segments(directory, args.segments if n else 0, args.segment_mb * 1024 * 1024)
+            log_path = os.path.join(directory, 'app.log')
+
+            if mode == 'inline':
+                def during():
+                    for segment in sorted(os.listdir(directory)):
+                        if segment != 'app.log':
+                            compression.compress_file(os.path.join(directory, segment), level=args.level)
+                latencies, _ = write_for(log_path, args.seconds, args.lines_per_s, during)
+                done = latencies.max()
+            elif n == 0:
+                latencies, done = write_for(log_path, args.seconds, args.lines_per_s)
+            else:
+                with log_rotation.LogLifecycleService(
+                        [(directory, 'app.log')], rotate_bytes=float('inf'), rotate_seconds=float('inf'),
+                        retain_seconds=float('inf'), level=args.level, max_backlog=args.segments,
+                        io_rate=mode and mode * 1024 * 1024) as service:
+                    service.run_cycle()
+                    latencies, done = write_for(log_path, args.seconds, args.lines_per_s, finished=lambda: not service.backlog)
+            results.append((name, len(latencies) / args.seconds, np.percentile(latencies, 99),
+                            latencies.max(), done))
+    finally:
+        shutil.rmtree(root)
+
+    print(f"\n{args.segments} segments x {args.segment_mb} MB, gzip level {args.level}, "
+          f"writer runs {args.seconds:g} s\n")
+    print(f"{'Mode':<26} {'Lines/s':>10} {'p99 (us)':>10} {'Max (ms)':>10} {'Compressed in (s)':>18}")
+    for name, rate, p99, worst, done in results:
+        done = f"{done:.1f}" if done is not None else '-'
+        print(f"{name:<26} {rate:>10.0f} {p99 * 1e6:>10.1f} {worst * 1e3:>10.1f} {done:>18}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,189 @@
+"""
+Reproducible end-to-end benchmark of every reduction technique.
+
+Generates a seeded dataset with the paper's layout (raw baseline, logs,
+redundant binaries, a time-series CSV) at a scale factor, then runs each
+technique on it in a fresh process, repeat times. Reports the median wall
+and CPU time, MB/s, CPU s/GB, peak RSS and reduction ratio, plus 4 KB read
+latency percentiles with a warm page cache and with the files evicted
+before every read. Results are written as JSON; --compare flags metrics
+that got worse between two result files.
+
+    python -m benchmarks.bench_pipeline --scale 0.01 --output base.json
+    python -m benchmarks.bench_pipeline --scale 0.01 --output new.json
+    python -m benchmarks.bench_pipeline --compare base.json new.json
+"""
+import argparse
+import contextlib
+import gzip
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+import generate_test_data_10gb
+from benchmarks import harness
+
+READ_SIZE = 4096
+# Generator output kind -> technique that reduces it
+KINDS = {'raw': 'raw', 'log': 'compress', 'bin': 'deduplicate', 'csv': 'aggregate'}
+
+
+def make_dataset(root, scale, seed):
+    """Writes the dataset under root and returns {technique: [paths]}."""
+    dataset = generate_test_data_10gb.generate(root, seed=seed, scale=scale, log_files=1)
+    return {KINDS[kind]: paths for kind, paths in dataset.items()}
+
+
+# Techniques run in a fresh process with the work directory as cwd, so
+# module-level state (the dedup chunk store) starts empty there.
+
+def _run_technique(technique, workdir, paths):
+    os.chdir(workdir)
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        if technique == 'compress':
+            import compression
+            outputs = [compression.compress_file(p, level=9) for p in paths]
+        elif technique == 'deduplicate':
+            import Deduplication
+            outputs = [Deduplication.deduplicate_file(p) for p in paths]
+        elif technique == 'aggregate':
+            import Aggregation
+            outputs = [Aggregation.aggregate_timeseries_data(p, p[:-len('.csv')] + '_agg.csv', '1H')
+                       for p in paths]
+    return [path for path, _ in outputs], sum(size for _, size in outputs)
+
+
+def _reader(technique, workdir, outputs, rng):
+    """
+    (read(i), files to evict) for the technique's output: a random 4 KB of
+    the data for raw, deduplicated and aggregated files, the first 4 KB
+    of decompressed data for gzip (which can't seek).
+    """
+    if technique == 'compress':
+        def read(i):
+            with gzip.open(outputs[0], 'rb') as f:
+                f.read(READ_SIZE)
+        return read, outputs
+
+    if technique == 'deduplicate':
+        from chunk_store import ChunkStore
+        from dedup_reader import DedupFileReader
+        store_dir = os.path.join(workdir, 'chunk_store')
+        store = ChunkStore(store_dir)
+        # No chunk cache, so every sample reads the store
+        readers = [DedupFileReader(p, store, cache_bytes=0, readahead=0) for p in outputs]
+        offsets = [rng.integers(0, max(1, r.recipe.file_size - READ_SIZE), 10_000) for r in readers]
+
+        def read(i):
+            reader = readers[i % len(readers)]
+            reader.seek(int(offsets[i % len(readers)][i // len(readers)]))
+            reader.read(READ_SIZE)
+        packs = [os.path.join(store_dir, n) for n in os.listdir(store_dir) if n.endswith('.pack')]
+        return read, outputs + packs
+
+    fds = [os.open(p, os.O_RDONLY) for p in outputs]
+    sizes = [os.path.getsize(p) for p in outputs]
+    offsets = [rng.integers(0, max(1, s - READ_SIZE), 10_000) for s in sizes]
+
+    def read(i):
+        k = i % len(fds)
+        os.pread(fds[k], READ_SIZE, int(offsets[k][i // len(fds)]))
+    return read, outputs
+
+
+def run(args):
+    root = tempfile.mkdtemp(dir=args.dir)
+    results = {}
+    try:
+        print(f"Generating dataset at scale {args.scale} (seed {args.seed})...")
+        dataset = make_dataset(os.path.join(root, 'data'), args.scale, args.seed)
+        for technique in args.techniques:
+            inputs = dataset[technique]
+            input_bytes = sum(os.path.getsize(p) for p in inputs)
+            runs = []
+            # The baseline has no transform to time, only reads
+            for repeat in range(args.repeat if technique != 'raw' else 0):
+                workdir = os.path.join(root, f'{technique}-{repeat}')
+                os.makedirs(workdir)
+                paths = []
+                for p in inputs:
+                    paths.append(os.path.join(workdir, os.path.basename(p)))
+                    shutil.copyfile(p, paths[-1])
+                (outputs, output_bytes), metrics = harness.run_isolated(_run_technique, technique, workdir, paths)
+                runs.append(metrics)
+                if repeat < args.repeat - 1:
+                    shutil.rmtree(workdir)
+
+            metrics = {}
+            if runs:
+                metrics = {name: float(np.median([m[name] for m in runs])) for name in runs[0]}
+                metrics['peak_rss_mb'] = max(m['peak_rss_mb'] for m in runs)
+                metrics['mb_per_s'] = input_bytes / 1e6 / metrics['wall_s']
+                metrics['cpu_s_per_gb'] = metrics['cpu_s'] / (input_bytes / 1e9)
+                metrics['wall_s_per_gb'] = metrics['wall_s'] / (input_bytes / 1e9)
+            else:
+                workdir, outputs, output_bytes = None, inputs, input_bytes
+            metrics.update(input_bytes=input_bytes, output_bytes=output_bytes, ratio=input_bytes / output_bytes)
+
+            rng = np.random.default_rng(args.seed)
+            read, files = _reader(technique, workdir, outputs, rng)
+            metrics['latency_warm'] = harness.sample_latency(read, args.samples)
+            if harness.drop_cache():
+                metrics['latency_cold'] = harness.sample_latency(read, args.samples, cold_paths=files)
+            results[technique] = metrics
+            if workdir:
+                shutil.rmtree(workdir)
+            print(f"  {technique}: done")
+    finally:
+        shutil.rmtree(root)
+    return {'environment': harness.environment(),
+            'parameters': {'scale': args.scale, 'seed': args.seed, 'repeat': args.repeat, 'samples': args.samples},
+            'results': results}
+
+
+def print_results(results):
+    print(f"\n{'Technique':<12} {'Ratio':>8} {'Wall (s)':>9} {'CPU (s)':>8} {'MB/s':>8} {'CPU s/GB':>9} "
+          f"{'RSS (MB)':>9} {'Warm p50/p99 (ms)':>18} {'Cold p50/p99 (ms)':>18}")
+    for technique, m in results['results'].items():
+        warm = m['latency_warm']
+        cold = m.get('latency_cold')
+        cold = f"{cold['p50_ms']:.3f}/{cold['p99_ms']:.3f}" if cold else '-'
+        print(f"{technique:<12} {m['ratio']:>8.1f} {m.get('wall_s', 0):>9.2f} {m.get('cpu_s', 0):>8.2f} "
+              f"{m.get('mb_per_s', 0):>8.1f} {m.get('cpu_s_per_gb', 0):>9.2f} {m.get('peak_rss_mb', 0):>9.1f} "
+              f"{warm['p50_ms']:.3f}/{warm['p99_ms']:.3f}".rjust(18) + f" {cold:>18}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scale', type=float, default=0.01, help='fraction of the 11 GB paper dataset')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--repeat', type=int, default=3, help='runs per technique; the median is reported')
+    parser.add_argument('--samples', type=int, default=200, help='read latency samples per cache state')
+    parser.add_argument('--techniques', nargs='+', default=['raw', 'compress', 'deduplicate', 'aggregate'],
+                        choices=['raw', 'compress', 'deduplicate', 'aggregate'])
+    parser.add_argument('--output', help='write results to this JSON file')
+    parser.add_argument('--compare', nargs=2, metavar=('BASE', 'NEW'),
+                        help='compare two results files instead of running')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='relative change that counts as a regression (default: 0.1)')
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    if args.compare:
+        rows = harness.compare(harness.load(args.compare[0]), harness.load(args.compare[1]))
+        regressions = harness.print_comparison(rows, args.threshold)
+        print(f"\n{regressions} regression(s) above {args.threshold:.0%}")
+        sys.exit(1 if regressions else 0)
+
+    results = run(args)
+    print_results(results)
+    if args.output:
+        harness.save(args.output, results)
+        print(f"\nResults written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,132 @@
+"""
+Bytes saved within a CPU budget: planner order vs directory order and largest first.
+
+Generates logs, redundant binaries and time-series CSVs whose savings per
+CPU second differ widely, teaches a planner.CostModel on a separate
+training set, and has it estimate every test file. Then every test file
+is actually processed, to measure what each job really saves and costs.
+For a range of budgets (shares of the CPU time all jobs take) each
+strategy runs jobs in its order until the next one no longer fits, and is
+credited with the measured savings of the jobs it ran:
+
+  directory   sorted by path, as run_pipeline did without a budget
+  largest     largest file first (the executor's default order)
+  planner     planner.plan() with that CPU budget
+
+    python -m benchmarks.bench_planner --files 4 --file-mb 24
+"""
+import argparse
+import contextlib
+import os
+import shutil
+import tempfile
+
+import generate_test_data_10gb
+
+COMPRESSION = {'mode': 'adaptive', 'target': 'balanced', 'max_decompress_ms_per_mb': 5, 'seekable': True}
+ROLLUPS = ['1min', '1h']
+BUDGET_SHARES = (0.1, 0.25, 0.5)
+CSV_ROW_BYTES = 37
+
+
+def make_files(directory, prefix, files, size, seed):
+    """Per kind, files whose compressibility / redundancy varies; returns [(path, action, data_type)]."""
+    os.makedirs(directory)
+    made = []
+    for i in range(files):
+        share = i / max(files - 1, 1)
+        path = os.path.join(directory, f'{prefix}log{i}.log')
+        generate_test_data_10gb.write_log(path, size, seed, i, randomness=share)
+        made.append((path, 'compress', 'Log Data'))
+        path = os.path.join(directory, f'{prefix}bin{i}.bin')
+        generate_test_data_10gb.write_redundant(path, size, seed, 100 + i, duplicate_ratio=1 - share, pool_blocks=8)
+        made.append((path, 'deduplicate', 'Redundant Data'))
+        path = os.path.join(directory, f'{prefix}csv{i}.csv')
+        generate_test_data_10gb.write_time_series(path, int(size * (0.25 + share) / CSV_ROW_BYTES), seed, 200 + i)
+        made.append((path, 'aggregate', 'Time-Series Data'))
+    return made
+
+
+def make_job(path, action, data_type):
+    options = {'compression': COMPRESSION, 'rollups': ROLLUPS, 'aggregate_format': 'csv', 'chunking': None}
+    return {'file': os.path.basename(path), 'path': path, 'data_type': data_type, 'size': os.path.getsize(path),
+            'action': action, 'args': (path, action, options),
+            'lane': 'deduplicate' if action == 'deduplicate' else None}
+
+
+def run_jobs(main, jobs):
+    """Processes jobs, yielding (job, result, (saved bytes, CPU seconds)) for each."""
+    with open(os.devnull, 'w') as devnull, contextlib.redirect_stdout(devnull):
+        for job in jobs:
+            result = main.process_file(*job['args'])
+            yield job, result, (job['size'] - result['final_size'], result['cpu'])
+
+
+def credit(order, measured, budget):
+    """Measured savings and CPU of the jobs in order, stopping at the first that doesn't fit."""
+    saved = cpu = done = 0
+    for job in order:
+        job_saved, job_cpu = measured[job['path']]
+        if cpu + job_cpu > budget:
+            break
+        saved += job_saved
+        cpu += job_cpu
+        done += 1
+    return saved, cpu, done
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=4, help='files per kind')
+    parser.add_argument('--file-mb', type=int, default=24)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    size = args.file_mb * 1024 * 1024
+    root = tempfile.mkdtemp(dir=args.dir)
+    cwd = os.getcwd()
+    try:
+        os.chdir(root)
+        import main as pipeline
+        import planner
+
+        model = planner.CostModel(os.path.join(root, 'cost_model.json'))
+        training = [make_job(*made) for made in make_files(os.path.join(root, 'train'), 't', 2, size // 2,
+                                                           args.seed + 1)]
+        for job, result, _ in run_jobs(pipeline, training):
+            model.record(job['data_type'], job['action'], job['size'], result['final_size'], result['cpu'],
+                         result['elapsed'])
+        model.save()
+
+        jobs = [make_job(*made) for made in make_files(os.path.join(root, 'test'), '', args.files, size, args.seed)]
+        estimates = [model.estimate(job) for job in jobs]
+        measured = {}
+        for job, _, result in run_jobs(pipeline, jobs):
+            measured[job['path']] = result
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(root)
+
+    total_cpu = sum(cpu for _, cpu in measured.values())
+    total_saved = sum(saved for saved, _ in measured.values())
+    print(f"\n{len(jobs)} files ({args.files} per kind) x up to {args.file_mb} MB; all jobs together save "
+          f"{total_saved / 1e6:.1f} MB in {total_cpu:.1f} CPU-s\n")
+    print(f"{'Budget':>12} {'Strategy':<10} {'Jobs':>5} {'Saved (MB)':>11} {'CPU used (s)':>13} {'Saved MB/CPU-s':>15}")
+    for share in BUDGET_SHARES:
+        budget = total_cpu * share
+        selected, _ = planner.plan(jobs, estimates, cpu_budget=budget)
+        orders = {
+            'directory': sorted(jobs, key=lambda job: job['path']),
+            'largest': sorted(jobs, key=lambda job: job['size'], reverse=True),
+            'planner': [job for job, _ in selected],
+        }
+        for name, order in orders.items():
+            saved, cpu, done = credit(order, measured, budget)
+            label = f"{share:.0%} ({budget:.1f}s)" if name == 'directory' else ''
+            print(f"{label:>12} {name:<10} {done:>5} {saved / 1e6:>11.1f} {cpu:>13.1f} "
+                  f"{saved / 1e6 / max(cpu, 1e-9):>15.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Files classified per second by the PolicyEngine.
+
+Creates a directory of empty files with spread-out mtimes and a policy with
+many rules, then compares a per-file fnmatch loop (the original
+get_file_status), get_file_status with the compiled matcher, and one
+scandir pass through classify_many. Logging is disabled for all three.
+
+    python -m benchmarks.bench_policy --files 50000 --rules 50
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import tempfile
+import time
+from datetime import datetime
+from fnmatch import fnmatch
+
+from retention_policy_file import PolicyEngine
+
+
+def make_policy(rules):
+    # Filler rules on other extensions first, so real matches come late in the list
+    policy = [{
+        'name': f'filler_{i}', 'path_match': f'*/data/*.x{i:03d}', 'hot_tier_days': 1,
+        'warm_tier_days': 5, 'retention_days': 30, 'warm_tier_action': 'compress',
+        'cold_tier_action': 'archive',
+    } for i in range(rules - 3)]
+    for name, pattern, action in [('logs', '*/data/*.log', 'compress'),
+                                  ('bins', '*/data/*.bin', 'deduplicate'),
+                                  ('csvs', '*/data/*.csv', 'aggregate')]:
+        policy.append({'name': name, 'path_match': pattern, 'hot_tier_days': 1, 'warm_tier_days': 7,
+                       'retention_days': 30, 'warm_tier_action': action, 'cold_tier_action': 'archive'})
+    return {'rules': policy}
+
+
+def legacy_status(rules, path):
+    age = (datetime.now() - datetime.fromtimestamp(os.path.getmtime(path))).total_seconds() / (24 * 3600)
+    for rule in rules:
+        if fnmatch(path, rule['path_match']):
+            if age > rule['retention_days']:
+                return 'expired'
+            if age > rule['hot_tier_days'] + rule['warm_tier_days']:
+                return 'cold'
+            return 'warm' if age > rule['hot_tier_days'] else 'hot'
+    return 'unmatched'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--files', type=int, default=20000)
+    parser.add_argument('--rules', type=int, default=50)
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    logging.disable(logging.CRITICAL)
+    rng = random.Random(0)
+    root = tempfile.mkdtemp(dir=args.dir)
+    try:
+        data = os.path.join(root, 'data')
+        os.mkdir(data)
+        now = time.time()
+        for i in range(args.files):
+            path = os.path.join(data, f'file{i}.{rng.choice(["log", "bin", "csv", "dat"])}')
+            open(path, 'wb').close()
+            mtime = now - rng.uniform(0, 40 * 86400)
+            os.utime(path, (mtime, mtime))
+        policy_path = os.path.join(root, 'policy.json')
+        with open(policy_path, 'w') as f:
+            json.dump(make_policy(args.rules), f)
+        engine = PolicyEngine(policy_path)
+        rules = engine.policy['rules']
+
+        timings = []
+        start = time.perf_counter()
+        for name in os.listdir(data):
+            legacy_status(rules, os.path.join(data, name))
+        timings.append(('fnmatch loop per file', time.perf_counter() - start))
+
+        start = time.perf_counter()
+        for name in os.listdir(data):
+            engine.get_file_status(os.path.join(data, name))
+        timings.append(('get_file_status', time.perf_counter() - start))
+
+        start = time.perf_counter()
+        engine.classify_many(os.scandir(data))
+        timings.append(('scandir + classify_many', time.perf_counter() - start))
+    finally:
+        shutil.rmtree(root)
+
+    print(f"{args.files} files, {args.rules} rules\n")
+    print(f"{'Method':<26} {'files/s':>12} {'Speedup':>8}")
+    for name, seconds in timings:
+        print(f"{name:<26} {args.files / seconds:>12,.0f} {timings[0][1] / seconds:>7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
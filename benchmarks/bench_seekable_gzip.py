@@ -0,0 +1,105 @@
+"""
+Random-access latency into a seekable (framed + indexed) gzip log vs plain gzip.
+
+Generates a time-ordered log, compresses it once as a single gzip stream
+and once as seekable gzip frames, then times random 4 KB reads and
+one-minute time-window greps against both.
+
+    python -m benchmarks.bench_seekable_gzip --size-mb 2048
+"""
+import argparse
+import gzip
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import compression
+from benchmarks import harness
+from seekable_gzip import SeekableGzipReader, line_timestamp
+
+LEVELS = ['INFO', 'INFO', 'INFO', 'WARN', 'ERROR']
+
+
+def write_log(path, size, rng):
+    t = 1700000000
+    written = 0
+    with open(path, 'wb') as f:
+        while written < size:
+            lines = []
+            for i in range(10000):
+                t += rng.random() < 0.1
+                stamp = time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime(t))
+                lines.append(f"{stamp},{i % 1000:03d} - {rng.choice(LEVELS)} - request {rng.randrange(10**6)} "
+                             f"took {rng.random():.4f}s\n")
+            chunk = ''.join(lines).encode()
+            f.write(chunk)
+            written += len(chunk)
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--size-mb', type=int, default=256)
+    parser.add_argument('--reads', type=int, default=1000)
+    parser.add_argument('--plain-reads', type=int, default=10, help='random reads against plain gzip (slow)')
+    parser.add_argument('--level', type=int, default=6)
+    parser.add_argument('--dir', default=None, help='scratch directory (default: system temp)')
+    args = parser.parse_args()
+
+    rng = random.Random(0)
+    root = tempfile.mkdtemp(dir=args.dir)
+    try:
+        log = os.path.join(root, 'app.log')
+        size = write_log(log, args.size_mb * 1024 * 1024, rng)
+        plain = os.path.join(root, 'plain.log')
+        framed = os.path.join(root, 'framed.log')
+        os.link(log, plain)
+        os.link(log, framed)
+        plain_gz, plain_size = compression.compress_file(plain, level=args.level)
+        framed_gz, framed_size = compression.compress_file(framed, level=args.level, seekable=True)
+
+        with open(log, 'rb') as f:
+            first_ts = line_timestamp(f.readline())
+            f.seek(-4096, os.SEEK_END)
+            last_ts = line_timestamp(f.read().splitlines()[-1])
+
+        plain_reads = []
+        for _ in range(args.plain_reads):
+            offset = rng.randrange(size - 4096)
+            start = time.perf_counter()
+            with gzip.open(plain_gz, 'rb') as f:
+                f.seek(offset)
+                f.read(4096)
+            plain_reads.append(time.perf_counter() - start)
+
+        framed_reads = []
+        greps = []
+        with SeekableGzipReader(framed_gz) as reader:
+            frames = len(reader)
+            for _ in range(args.reads):
+                offset = rng.randrange(size - 4096)
+                start = time.perf_counter()
+                reader.read_range(offset, 4096)
+                framed_reads.append(time.perf_counter() - start)
+            for _ in range(max(1, args.reads // 20)):
+                window_start = rng.randrange(first_ts, last_ts - 60)
+                start = time.perf_counter()
+                sum(1 for _ in reader.grep_time_window(window_start, window_start + 60))
+                greps.append(time.perf_counter() - start)
+    finally:
+        shutil.rmtree(root)
+
+    print(f"{size / 1e6:.0f} MB log, gzip level {args.level}; seekable: {frames} frames")
+    print(f"Compressed size: plain {plain_size / 1e6:.2f} MB, seekable {framed_size / 1e6:.2f} MB "
+          f"(+{(framed_size / plain_size - 1) * 100:.1f}%)\n")
+    print(f"{'Operation':<34} {'p50 (ms)':>10} {'p99 (ms)':>10}")
+    plain, framed, grep = (harness.percentiles(samples) for samples in (plain_reads, framed_reads, greps))
+    print(f"{'Random 4KB read, plain gzip':<34} {plain['p50_ms']:>10.1f} {plain['p99_ms']:>10.1f}")
+    print(f"{'Random 4KB read, seekable':<34} {framed['p50_ms']:>10.2f} {framed['p99_ms']:>10.2f}")
+    print(f"{'1-minute grep_time_window':<34} {grep['p50_ms']:>10.2f} {grep['p99_ms']:>10.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,193 @@
+"""
+Measurement helpers shared by the benchmarks: wall vs CPU time, peak RSS
+of an isolated run, cold-cache read latency percentiles, JSON results and
+run-to-run comparison.
+"""
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Metrics where a larger value is better; every other numeric metric is
+# treated as lower-is-better by compare()
+HIGHER_IS_BETTER = ('ratio', 'mb_per_s')
+# Metrics compared by default (MB/s and s/GB follow from wall_s/cpu_s)
+COMPARED = ('wall_s', 'cpu_s', 'peak_rss_mb', 'ratio', 'p50_ms', 'p99_ms')
+# Differences smaller than this are noise whatever the relative change:
+# scheduler jitter on short runs and sub-millisecond reads, allocator noise
+# on RSS
+NOISE_FLOOR = {'wall_s': 0.05, 'cpu_s': 0.05, 'p50_ms': 0.05, 'p99_ms': 0.1, 'peak_rss_mb': 2.0}
+
+
+def drop_cache(*paths):
+    """
+    Evicts files from the page cache (posix_fadvise DONTNEED) so the next
+    read comes from disk. Dirty pages are synced first, since DONTNEED
+    skips them. Returns False where the call is unavailable.
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return False
+    for path in paths:
+        fd = os.open(path, os.O_RDONLY)
+        try:
+            os.fdatasync(fd)
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+        finally:
+            os.close(fd)
+    return True
+
+
+def percentiles(samples):
+    """p50/p95/p99 and mean of latency samples (seconds) in milliseconds."""
+    samples = np.asarray(samples) * 1e3
+    return {'n': len(samples), 'mean_ms': float(samples.mean()), 'p50_ms': float(np.percentile(samples, 50)),
+            'p95_ms': float(np.percentile(samples, 95)), 'p99_ms': float(np.percentile(samples, 99))}
+
+
+def sample_latency(read, samples, cold_paths=None):
+    """
+    Times read(i) for i in range(samples). With cold_paths, those files are
+    dropped from the page cache before every sample.
+    """
+    times = []
+    for i in range(samples):
+        if cold_paths:
+            drop_cache(*cold_paths)
+        start = time.perf_counter()
+        read(i)
+        times.append(time.perf_counter() - start)
+    return percentiles(times)
+
+
+def peak_rss_mb():
+    """
+    Peak resident set size of this process in MB. Prefers VmHWM, since on
+    Linux ru_maxrss survives exec() and would report the parent's peak.
+    """
+    try:
+        with open('/proc/self/status') as f:
+            for line in f:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1]) * 1024 / 1e6
+    except OSError:
+        pass
+    # ru_maxrss is in KB on Linux and bytes on macOS
+    rss_scale = 1 if sys.platform == 'darwin' else 1024
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * rss_scale / 1e6
+
+
+def _measured(func, args):
+    if ROOT not in sys.path:
+        sys.path.insert(0, ROOT)
+    usage = resource.getrusage(resource.RUSAGE_SELF)
+    wall, cpu = time.perf_counter(), time.process_time()
+    result = func(*args)
+    wall, cpu = time.perf_counter() - wall, time.process_time() - cpu
+    after = resource.getrusage(resource.RUSAGE_SELF)
+    return result, {
+        'wall_s': wall,
+        'cpu_s': cpu,
+        'user_s': after.ru_utime - usage.ru_utime,
+        'sys_s': after.ru_stime - usage.ru_stime,
+        'peak_rss_mb': peak_rss_mb(),
+    }
+
+
+def run_isolated(func, *args):
+    """
+    Runs func(*args) in a fresh interpreter and returns (result, metrics):
+    wall and CPU seconds (perf_counter/process_time), user and system
+    seconds (getrusage) and the child's peak RSS, which a fresh process
+    makes attributable to func alone. func must be importable.
+    """
+    context = multiprocessing.get_context('spawn')
+    with context.Pool(1) as pool:
+        return pool.apply(_measured, (func, args))
+
+
+def environment():
+    """Where the results came from, stored with them."""
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True,
+                                text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        'time': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'commit': commit,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpus': os.cpu_count(),
+    }
+
+
+def save(path, results):
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2)
+
+
+def load(path):
+    with open(path) as f:
+        return json.load(f)
+
+
+def _flatten(metrics, prefix=''):
+    for name, value in metrics.items():
+        if isinstance(value, dict):
+            yield from _flatten(value, f"{prefix}{name}.")
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            yield prefix + name, value
+
+
+def compare(base, new, metrics=COMPARED):
+    """
+    Compares the per-technique metrics of two results files.
+
+    Returns (technique, metric, base, new, change) rows for the metrics
+    present in both whose name (or dotted path, e.g. 'latency_cold.p99_ms')
+    is in metrics. change is the relative difference, positive meaning
+    worse.
+    """
+    rows = []
+    for technique, new_metrics in new['results'].items():
+        base_metrics = dict(_flatten(base['results'].get(technique, {})))
+        for metric, value in _flatten(new_metrics):
+            name = metric.rsplit('.', 1)[-1]
+            if metric not in base_metrics or (name not in metrics and metric not in metrics):
+                continue
+            old = base_metrics[metric]
+            if not old:
+                continue
+            change = (value - old) / abs(old)
+            if name in HIGHER_IS_BETTER:
+                change = -change
+            rows.append((technique, metric, old, value, change))
+    return rows
+
+
+def is_noise(metric, old, value):
+    return abs(value - old) < NOISE_FLOOR.get(metric.rsplit('.', 1)[-1], 0)
+
+
+def print_comparison(rows, threshold):
+    """
+    Prints the rows of compare() and returns how many got worse by more
+    than threshold (and by more than the metric's noise floor).
+    """
+    regressions = 0
+    print(f"{'Technique':<12} {'Metric':<24} {'Base':>12} {'New':>12} {'Change':>9}")
+    for technique, metric, old, value, change in rows:
+        flag = ''
+        if abs(change) > threshold and not is_noise(metric, old, value):
+            flag = '  REGRESSION' if change > 0 else '  improved'
+            regressions += change > 0
+        print(f"{technique:<12} {metric:<24} {old:>12.4g} {value:>12.4g} {change:>+8.1%}{flag}")
+    return regressions
@@ -0,0 +1,208 @@
+import json
+import os
+import sqlite3
+import time
+import urllib.parse
+
+import telemetry
+
+# The catalog lives inside the directory it describes and is skipped by scans
+CATALOG_NAME = '.catalog.db'
+
+# A directory whose mtime is this close to the scan time may still be
+# changing within the filesystem's timestamp granularity, so its mtime is
+# not trusted for skipping on the next scan.
+RACY_WINDOW_NS = 2 * 10**9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS files (
+    path            TEXT PRIMARY KEY,
+    dir             TEXT NOT NULL,
+    size            INTEGER NOT NULL,
+    mtime_ns        INTEGER NOT NULL,
+    rule            TEXT,
+    tier            TEXT,
+    last_action     TEXT,
+    last_action_at  REAL,
+    next_transition REAL
+);
+CREATE INDEX IF NOT EXISTS files_dir ON files (dir);
+CREATE INDEX IF NOT EXISTS files_next_transition ON files (next_transition);
+CREATE TABLE IF NOT EXISTS dirs (
+    path     TEXT PRIMARY KEY,
+    parent   TEXT,
+    mtime_ns INTEGER
+);
+CREATE INDEX IF NOT EXISTS dirs_parent ON dirs (parent);
+CREATE TABLE IF NOT EXISTS actions (
+    path    TEXT NOT NULL,
+    action  TEXT NOT NULL,
+    at      REAL NOT NULL,
+    details TEXT
+);
+CREATE INDEX IF NOT EXISTS actions_path ON actions (path);
+"""
+
+
+class FileCatalog:
+    """
+    Persistent record of every file under a data directory.
+
+    For each file the catalog keeps size, mtime, the matching rule, current
+    tier, the last action applied and the time the file next crosses a tier
+    boundary. scan() lists only directories whose mtime changed since the
+    last scan (files were added, removed or renamed in them), so a nightly
+    run costs one stat per directory plus work for what actually changed.
+    Files rewritten in place do not touch their directory's mtime; pass
+    full=True to re-list and re-stat everything.
+
+    With dry_run=True the catalog is copied into memory and every change
+    stays there; the file is only read.
+    """
+
+    def __init__(self, root, path=None, dry_run=False):
+        self.root = root
+        self.path = path or os.path.join(root, CATALOG_NAME)
+        self._skip = {os.path.basename(self.path) + suffix for suffix in ('', '-journal', '-wal', '-shm')}
+        if dry_run:
+            self._db = sqlite3.connect(':memory:')
+            if os.path.exists(self.path):
+                disk = sqlite3.connect(f"file:{urllib.parse.quote(os.path.abspath(self.path))}?mode=ro", uri=True)
+                disk.backup(self._db)
+                disk.close()
+        else:
+            self._db = sqlite3.connect(self.path)
+        self._db.executescript(SCHEMA)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._db.close()
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    # --- scanning -----------------------------------------------------
+
+    @telemetry.staged('catalog_scan')
+    def scan(self, full=False):
+        """
+        Walks root, records new and changed files and forgets removed ones.
+
+        Returns (path, os.stat_result) pairs for the files that are new or
+        whose size or mtime changed since they were last recorded.
+        """
+        changed = []
+        scan_start_ns = time.time_ns()
+        stack = [self.root]
+        with self._db:
+            while stack:
+                directory = stack.pop()
+                try:
+                    dir_mtime = os.stat(directory).st_mtime_ns
+                except FileNotFoundError:
+                    self._forget_dir(directory)
+                    continue
+                row = self._db.execute("SELECT mtime_ns FROM dirs WHERE path = ?", (directory,)).fetchone()
+                if not full and row is not None and row[0] == dir_mtime:
+                    stack.extend(r[0] for r in self._db.execute("SELECT path FROM dirs WHERE parent = ?", (directory,)))
+                    continue
+                subdirs = self._scan_dir(directory, changed)
+                stack.extend(subdirs)
+                trusted = dir_mtime if scan_start_ns - dir_mtime > RACY_WINDOW_NS else None
+                self._db.execute("INSERT OR REPLACE INTO dirs (path, parent, mtime_ns) VALUES (?, ?, ?)",
+                                 (directory, None if directory == self.root else os.path.dirname(directory), trusted))
+        return changed
+
+    def _scan_dir(self, directory, changed):
+        known = {path: (size, mtime) for path, size, mtime in
+                 self._db.execute("SELECT path, size, mtime_ns FROM files WHERE dir = ?", (directory,))}
+        known_dirs = {r[0] for r in self._db.execute("SELECT path FROM dirs WHERE parent = ?", (directory,))}
+        subdirs = []
+        updates = []
+        stats = 0
+        with os.scandir(directory) as it:
+            for entry in it:
+                if entry.is_dir(follow_symlinks=False):
+                    subdirs.append(entry.path)
+                    continue
+                if entry.name in self._skip or not entry.is_file():
+                    continue
+                st = entry.stat()
+                stats += 1
+                if known.pop(entry.path, None) != (st.st_size, st.st_mtime_ns):
+                    changed.append((entry.path, st))
+                    updates.append((entry.path, directory, st.st_size, st.st_mtime_ns))
+
+        telemetry.count('syscalls_total', call='scandir')
+        telemetry.count('syscalls_total', stats, call='stat')
+        self._db.executemany(
+            "INSERT INTO files (path, dir, size, mtime_ns) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT (path) DO UPDATE SET size = excluded.size, mtime_ns = excluded.mtime_ns",
+            updates)
+        self._db.executemany("DELETE FROM files WHERE path = ?", ((path,) for path in known))
+        for gone in known_dirs.difference(subdirs):
+            self._forget_dir(gone)
+        return subdirs
+
+    def _forget_dir(self, directory):
+        like = directory.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + os.sep + '%'
+        self._db.execute("DELETE FROM files WHERE dir = ? OR dir LIKE ? ESCAPE '\\'", (directory, like))
+        self._db.execute("DELETE FROM dirs WHERE path = ? OR path LIKE ? ESCAPE '\\'", (directory, like))
+
+    # --- transitions and actions ----------------------------------------
+
+    def due(self, now=None, exclude=()):
+        """
+        (path, os.stat_result) pairs of recorded files whose next tier
+        transition is at or before now. Files that no longer exist are
+        forgotten; paths in exclude are skipped.
+        """
+        now = time.time() if now is None else now
+        exclude = set(exclude)
+        due = []
+        with self._db:
+            rows = self._db.execute("SELECT path FROM files WHERE next_transition <= ?", (now,)).fetchall()
+            for (path,) in rows:
+                if path in exclude:
+                    continue
+                try:
+                    due.append((path, os.stat(path)))
+                except FileNotFoundError:
+                    self._db.execute("DELETE FROM files WHERE path = ?", (path,))
+        return due
+
+    def update_status(self, items):
+        """Records rule, tier and next transition for (path, status) pairs from PolicyEngine.classify_many."""
+        with self._db:
+            self._db.executemany(
+                "UPDATE files SET rule = ?, tier = ?, next_transition = ? WHERE path = ?",
+                ((status['rule'], status['tier'], status.get('next_transition'), path) for path, status in items),
+            )
+
+    def record_action(self, path, action, when=None, details=None):
+        """
+        Records the action applied to a file. details (e.g. the codec chosen
+        by adaptive compression) is kept as JSON in the action history.
+        """
+        when = time.time() if when is None else when
+        with self._db:
+            self._db.execute("UPDATE files SET last_action = ?, last_action_at = ? WHERE path = ?",
+                             (action, when, path))
+            self._db.execute("INSERT INTO actions (path, action, at, details) VALUES (?, ?, ?, ?)",
+                             (path, action, when, None if details is None else json.dumps(details)))
+
+    def history(self, path):
+        """Every action recorded for a path, oldest first, as (action, at, details) tuples."""
+        return [(action, at, json.loads(details) if details else None) for action, at, details in
+                self._db.execute("SELECT action, at, details FROM actions WHERE path = ? ORDER BY at", (path,))]
+
+    def get(self, path):
+        """The catalog row of a file as a dict, or None."""
+        cursor = self._db.execute("SELECT * FROM files WHERE path = ?", (path,))
+        row = cursor.fetchone()
+        return dict(zip([c[0] for c in cursor.description], row)) if row else None
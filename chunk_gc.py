@@ -0,0 +1,217 @@
+import os
+import time
+
+from recipe import Recipe
+
+# Longest a single step() works before returning (seconds)
+SLICE_SECONDS = 0.05
+# A pack is compacted once at least this share of its bytes is dead
+MIN_DEAD_RATIO = 0.3
+# Chunk data copied per locked relocation
+COPY_BYTES = 4 * 1024 * 1024
+# Digests located / recipes checked per locked unit of work
+LOCATE_BATCH = 4096
+CHECK_BATCH = 256
+# Index entries read per locked unit of the scan
+SCAN_BATCH = 4096
+
+
+class _Mark:
+    """
+    Reference counts rebuilt from the registered recipes. The store reports
+    recipes committed and released while the mark runs, so the result is
+    current when it replaces the live counts.
+    """
+
+    def __init__(self, recipes):
+        self.todo = sorted(recipes)
+        self.counted = set()
+        self.counts = {}
+
+    def _add(self, digests, delta):
+        counts = self.counts
+        for digest in digests:
+            counts[digest] = counts.get(digest, 0) + delta
+
+    def committed(self, path, digests):
+        self.counted.add(path)
+        self._add(digests, 1)
+
+    def released(self, path, digests):
+        if path in self.counted:
+            self.counted.discard(path)
+            self._add(digests, -1)
+
+
+class GarbageCollector:
+    """
+    Incremental garbage collector for a ChunkStore.
+
+    A cycle goes through these phases, each split into small units of work
+    that hold the store's lock only briefly, so deduplication can keep
+    writing in between:
+
+      check    stat every registered recipe; one deleted without
+               Deduplication.delete_file leaves its references unknown
+      mark     only after a failed check, with full_mark or when the counts
+               are suspect: recount the references of every remaining
+               recipe, one recipe per unit
+      select   locate dead chunks (count 0) and pick the packs whose dead
+               share is at least min_dead_ratio; the active pack is rolled
+               over if it qualifies
+      scan     list the live chunks of those packs from the index
+      copy     append the live chunks to the active pack
+      sweep    drop the dead chunks from the index and the counts, and
+               delete the packs
+
+    step() runs units until slice_seconds have passed (a slice can overrun
+    by the unit in progress) and returns False once the cycle is complete;
+    run() steps until then or a time budget runs out. stats counts what
+    the cycle did.
+    """
+
+    def __init__(self, store, min_dead_ratio=MIN_DEAD_RATIO, slice_seconds=SLICE_SECONDS, full_mark=False):
+        self.store = store
+        self.min_dead_ratio = min_dead_ratio
+        self.slice_seconds = slice_seconds
+        self.full_mark = full_mark
+        self.phase = 'check'
+        self.stats = {'recipes_checked': 0, 'recipes_missing': 0, 'recipes_marked': 0, 'dead_chunks': 0,
+                      'dead_bytes': 0, 'packs_compacted': 0, 'bytes_copied': 0, 'bytes_reclaimed': 0,
+                      'elapsed': 0.0, 'longest_slice': 0.0}
+        self._recipes = sorted(store.refs.recipes)
+        self._missing = []
+        self._mark = None
+        self._dead = None
+        self._dead_by_pack = {}
+        self._victims = set()
+        self._entries = None
+        self._live = {}
+        self._copy = []
+        self._copied = 0
+        self._freed = 0
+
+    @property
+    def done(self):
+        return self.phase == 'done'
+
+    def step(self):
+        """Does up to slice_seconds of work; returns False once the cycle is complete."""
+        start = time.perf_counter()
+        deadline = start + self.slice_seconds
+        while not self.done and time.perf_counter() < deadline:
+            getattr(self, f'_{self.phase}_step')()
+        elapsed = time.perf_counter() - start
+        self.stats['elapsed'] += elapsed
+        self.stats['longest_slice'] = max(self.stats['longest_slice'], elapsed)
+        return not self.done
+
+    def run(self, time_budget=None):
+        """Steps until the cycle completes or time_budget seconds pass; returns True if it completed."""
+        deadline = None if time_budget is None else time.perf_counter() + time_budget
+        while self.step():
+            if deadline is not None and time.perf_counter() >= deadline:
+                return False
+        return True
+
+    # --- phases ---------------------------------------------------------
+
+    def _check_step(self):
+        batch, self._recipes = self._recipes[:CHECK_BATCH], self._recipes[CHECK_BATCH:]
+        self._missing += [path for path in batch if not os.path.exists(path)]
+        self.stats['recipes_checked'] += len(batch)
+        if self._recipes:
+            return
+        self.stats['recipes_missing'] = len(self._missing)
+        if not self._missing and not self.full_mark and not self.store.refs.suspect:
+            self.phase = 'select'
+            return
+        store = self.store
+        with store._lock:
+            # Their references can't be released without their digests, so
+            # the mark recounts everything instead
+            for path in self._missing:
+                store.refs.remove_recipe(path)
+            self._mark = store.mark = _Mark(store.refs.recipes)
+        self.phase = 'mark'
+
+    def _mark_step(self):
+        store = self.store
+        mark = self._mark
+        if not mark.todo:
+            store.recount(mark.counts)
+            store.mark = self._mark = None
+            self.phase = 'select'
+            return
+        path = mark.todo.pop()
+        try:
+            with Recipe(path) as recipe:
+                digests = recipe.unique_digests()
+        except (OSError, ValueError):
+            digests = None
+        with store._lock:
+            if path in store.refs.recipes and path not in mark.counted:
+                if digests is None:
+                    store.refs.remove_recipe(path)
+                else:
+                    mark.committed(path, digests)
+        self.stats['recipes_marked'] += 1
+
+    def _select_step(self):
+        store = self.store
+        if self._dead is None:
+            with store._lock:
+                self._dead = list(store.refs.zero)
+            self.stats['dead_chunks'] = len(self._dead)
+        batch, self._dead = self._dead[:LOCATE_BATCH], self._dead[LOCATE_BATCH:]
+        for digest, location in zip(batch, store.locate_many(batch)):
+            if location is not None:
+                self._dead_by_pack.setdefault(location[0], []).append((digest, location))
+                self.stats['dead_bytes'] += location[2]
+        if self._dead:
+            return
+
+        sizes, active_id = store.pack_sizes()
+        for pack_id, dead in self._dead_by_pack.items():
+            size = sizes.get(pack_id)
+            if size and sum(location[2] for _, location in dead) >= self.min_dead_ratio * size:
+                self._victims.add(pack_id)
+        if active_id in self._victims:
+            store.roll_over()
+        self._victims = sorted(self._victims)
+        self.phase = 'scan' if self._victims else 'done'
+
+    def _scan_step(self):
+        if self._entries is None:
+            self._entries = self.store.iter_pack_entries(set(self._victims), SCAN_BATCH)
+        entries = next(self._entries, None)
+        if entries is not None:
+            self._live.update(entries)
+            return
+        for pack_id in self._victims:
+            for digest, _ in self._dead_by_pack.get(pack_id, ()):
+                self._live.pop(digest, None)
+        # In pack order, so the victims are read sequentially
+        self._copy = sorted(self._live.items(), key=lambda entry: entry[1])
+        self._live = {}
+        self.phase = 'copy'
+
+    def _copy_step(self):
+        end = self._copied
+        size = 0
+        while end < len(self._copy) and size < COPY_BYTES:
+            size += self._copy[end][1][2]
+            end += 1
+        self.stats['bytes_copied'] += self.store.relocate(self._copy[self._copied:end])
+        self._copied = end
+        if end == len(self._copy):
+            self.phase = 'sweep'
+
+    def _sweep_step(self):
+        # One pack per unit
+        pack_id = self._victims[self.stats['packs_compacted']]
+        self._freed += self.store.sweep([pack_id], self._dead_by_pack.get(pack_id, []))
+        self.stats['packs_compacted'] += 1
+        if self.stats['packs_compacted'] == len(self._victims):
+            self.stats['bytes_reclaimed'] = self._freed - self.stats['bytes_copied']
+            self.phase = 'done'
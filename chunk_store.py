@@ -0,0 +1,399 @@
+import os
+import threading
+
+from fingerprint_index import FingerprintIndex
+from refcounts import RefCounts
+import telemetry
+
+# Roll over to a new pack file once the active one reaches this size
+PACK_SIZE = 1024 ** 3
+# Bytes of chunk data buffered in memory before being written to the pack
+WRITE_BUFFER_SIZE = 8 * 1024 * 1024
+# Upper bound on a single pread() when get_many() merges adjacent chunks
+MAX_COALESCED_READ = 4 * 1024 * 1024
+
+
+class ChunkStore:
+    """
+    Append-only, pack-file based chunk store.
+
+    Chunks are appended to large ``pack-NNNNNN.pack`` files instead of being
+    written as one file per chunk, and their location is recorded in a
+    persistent FingerprintIndex. Writes are buffered and only made durable on
+    flush() (one fsync for the pack, one for the index log), and every read
+    is a single pread() at a known offset.
+
+    Chunks are reference counted per recipe (see refcounts.py), so chunks
+    no recipe uses any more can be reclaimed by chunk_gc.GarbageCollector,
+    which copies the live chunks out of mostly-dead packs and deletes them.
+    """
+
+    def __init__(self, root, pack_size=PACK_SIZE):
+        self.root = root
+        self.pack_size = pack_size
+        os.makedirs(root, exist_ok=True)
+
+        self.index = FingerprintIndex(root)  # digest -> (pack_id, offset, length)
+        self.refs = RefCounts(root)
+        self._lock = threading.Lock()
+        self._read_fds = {}
+        # Read fds of deleted packs, closed on close() in case a reader still uses one
+        self._retired_fds = []
+        self._dirty = False
+        # Reference sets of files being deduplicated (see open_refs)
+        self._inflight = []
+        # Set by the garbage collector while it recounts references
+        self.mark = None
+
+        packs = sorted(self._pack_ids())
+        self._open_active_pack(packs[-1] if packs else 0)
+
+    def _pack_path(self, pack_id):
+        return os.path.join(self.root, f'pack-{pack_id:06d}.pack')
+
+    def _pack_ids(self):
+        for name in os.listdir(self.root):
+            if name.startswith('pack-') and name.endswith('.pack'):
+                yield int(name[5:-5])
+
+    def _open_active_pack(self, pack_id):
+        self._active_id = pack_id
+        self._active = open(self._pack_path(pack_id), 'ab', buffering=WRITE_BUFFER_SIZE)
+        self._active_size = self._active.tell()
+        self._durable_size = self._active_size
+
+    def __contains__(self, digest):
+        return digest in self.index
+
+    def __len__(self):
+        return len(self.index)
+
+    def _roll_over_locked(self):
+        self._dirty = True
+        self._flush_locked()
+        self._active.close()
+        self._open_active_pack(self._active_id + 1)
+
+    def _append_locked(self, chunks):
+        """Appends (digest, data) chunks to the active pack with one write per pack and indexes them."""
+        entries = []
+        pending = []
+        for digest, data in chunks:
+            if self._active_size and self._active_size + len(data) > self.pack_size:
+                self._active.write(b''.join(pending))
+                self.index.add_many(entries)
+                pending, entries = [], []
+                self._roll_over_locked()
+            entries.append((digest, (self._active_id, self._active_size, len(data))))
+            pending.append(data)
+            self._active_size += len(data)
+            self._dirty = True
+        self._active.write(b''.join(pending))
+        self.index.add_many(entries)
+        telemetry.count('syscalls_total', call='write')
+
+    def put(self, digest, data):
+        """Stores a chunk under its digest. Returns False if it was already stored."""
+        with self._lock:
+            if digest in self.index:
+                return False
+            if self._active_size and self._active_size + len(data) > self.pack_size:
+                self._roll_over_locked()
+
+            offset = self._active_size
+            self._active.write(data)
+            self._active_size += len(data)
+            self.index.add(digest, (self._active_id, offset, len(data)))
+            self._dirty = True
+            return True
+
+    def put_many(self, chunks, refs=None):
+        """
+        Stores (digest, data) pairs and returns a list of flags, False for
+        chunks that were already stored (including repeats earlier in the
+        same batch). data may be a memoryview. The batch takes the lock
+        once, is looked up in the index in one go and added to it in one go.
+
+        refs is a set from open_refs(): chunks not in it yet are added and
+        their reference counts incremented.
+        """
+        chunks = list(chunks)
+        with self._lock:
+            stored = self.index.contains_many([digest for digest, _ in chunks])
+            flags = []
+            new = []
+            added = set()
+            for (digest, data), known in zip(chunks, stored):
+                is_new = not known and digest not in added
+                if is_new:
+                    added.add(digest)
+                    new.append((digest, data))
+                flags.append(is_new)
+            self._append_locked(new)
+
+            if refs is not None:
+                referenced = []
+                for digest, _ in chunks:
+                    if digest not in refs:
+                        refs.add(digest)
+                        referenced.append(digest)
+                if referenced:
+                    self.refs.add(referenced)
+                    self._dirty = True
+            return flags
+
+    def _locate_locked(self, digest):
+        pack_id, offset, length = self.index.get(digest)
+        if pack_id == self._active_id and offset + length > self._durable_size:
+            # Still sitting in the write buffer
+            self._active.flush()
+            self._durable_size = self._active_size
+        fd = self._read_fds.get(pack_id)
+        if fd is None:
+            fd = os.open(self._pack_path(pack_id), os.O_RDONLY)
+            self._read_fds[pack_id] = fd
+        return fd, pack_id, offset, length
+
+    def get(self, digest):
+        """Reads a chunk back with a single pread()."""
+        with self._lock:
+            fd, _, offset, length = self._locate_locked(digest)
+        return os.pread(fd, length, offset)
+
+    def get_many(self, digests, max_read=MAX_COALESCED_READ):
+        """
+        Reads several chunks, returned as a dict keyed by digest.
+        Chunks stored back to back in a pack (the common case for a file that
+        was deduplicated in one go) are fetched with one pread per run.
+        """
+        with self._lock:
+            located = sorted((pack_id, offset, length, fd, digest)
+                             for digest in set(digests)
+                             for fd, pack_id, offset, length in [self._locate_locked(digest)])
+        chunks = {}
+        i = 0
+        while i < len(located):
+            pack_id, start, length, fd, _ = located[i]
+            end = start + length
+            j = i + 1
+            while (j < len(located) and located[j][0] == pack_id and located[j][1] == end
+                   and located[j][1] + located[j][2] - start <= max_read):
+                end += located[j][2]
+                j += 1
+            data = os.pread(fd, end - start, start)
+            for _, offset, length, _, digest in located[i:j]:
+                chunks[digest] = data[offset - start:offset - start + length]
+            i = j
+        return chunks
+
+    def _flush_locked(self):
+        if not self._dirty:
+            return
+        # Pack data must be durable before the index points at it
+        self._active.flush()
+        os.fsync(self._active.fileno())
+        telemetry.count('syscalls_total', call='fsync')
+        self._durable_size = self._active_size
+        self.index.flush()
+        self.refs.flush()
+        self._dirty = False
+
+    def flush(self):
+        """Makes all chunks stored so far durable."""
+        with self._lock:
+            self._flush_locked()
+
+    # --- references -----------------------------------------------------
+
+    def open_refs(self):
+        """
+        Starts collecting the references of a file being deduplicated. Pass
+        the returned set to put_many(), which counts every distinct chunk
+        once as it is stored, then end with commit_refs() or abort_refs().
+        Counting at put time means a dead chunk the file reuses is revived
+        before the garbage collector could sweep it.
+        """
+        refs = set()
+        with self._lock:
+            self._inflight.append(refs)
+        return refs
+
+    def _end_refs_locked(self, refs):
+        self._inflight = [inflight for inflight in self._inflight if inflight is not refs]
+
+    def commit_refs(self, recipe_path, refs, previous=()):
+        """
+        Hands a file's references to its recipe, now written. previous are
+        the digests of the recipe it replaced at the same path, if any;
+        those references are released.
+        """
+        recipe_path = os.path.abspath(recipe_path)
+        with self._lock:
+            self._end_refs_locked(refs)
+            self._release_locked(recipe_path, previous)
+            self.refs.add_recipe(recipe_path)
+            if self.mark is not None:
+                self.mark.committed(recipe_path, refs)
+            self._dirty = True
+            self._flush_locked()
+
+    def adopt_refs(self, refs, digests):
+        """
+        Adds digests, chunks an earlier, interrupted run of the same file
+        already stored, to refs with a reference each. Returns False,
+        changing nothing, if any of them is no longer stored.
+        """
+        digests = set(digests) - refs
+        with self._lock:
+            if not all(self.index.contains_many(list(digests))):
+                return False
+            refs.update(digests)
+            self.refs.add(digests)
+            self._dirty = True
+            return True
+
+    def suspect_refs(self):
+        """
+        Marks the reference counts as possibly too high (a deduplication was
+        killed holding references), so the next GC cycle recounts them.
+        """
+        with self._lock:
+            self.refs.set_suspect()
+
+    def abort_refs(self, refs):
+        """Drops the references of a file whose deduplication failed."""
+        with self._lock:
+            self._end_refs_locked(refs)
+            self.refs.add(refs, -1)
+            self._dirty = True
+
+    def release_recipe(self, recipe_path, digests):
+        """
+        Drops the references of a recipe being deleted, given its distinct
+        digests. Chunks no other recipe uses become dead.
+        """
+        with self._lock:
+            self._release_locked(os.path.abspath(recipe_path), digests)
+            self._flush_locked()
+
+    def _release_locked(self, recipe_path, digests):
+        # Recipes written before reference counting hold no references
+        if recipe_path not in self.refs.recipes:
+            return
+        self.refs.remove_recipe(recipe_path)
+        self.refs.add(digests, -1)
+        if self.mark is not None:
+            self.mark.released(recipe_path, digests)
+        self._dirty = True
+
+    # --- garbage collection (driven by chunk_gc.GarbageCollector) --------
+
+    def pack_sizes(self):
+        """Returns ({pack_id: size}, active pack id); the active size includes buffered writes."""
+        with self._lock:
+            sizes = {pack_id: os.path.getsize(self._pack_path(pack_id)) for pack_id in self._pack_ids()}
+            sizes[self._active_id] = self._active_size
+            return sizes, self._active_id
+
+    def locate_many(self, digests):
+        """(pack_id, offset, length) or None for each digest."""
+        with self._lock:
+            return [self.index.get(digest) for digest in digests]
+
+    def roll_over(self):
+        """Starts a new active pack, so the current one can be compacted."""
+        with self._lock:
+            self._roll_over_locked()
+
+    def iter_pack_entries(self, pack_ids, batch=65536):
+        """
+        Yields lists of the index entries located in pack_ids, taking the
+        lock for one batch at a time. Starts over when the index is merged
+        in between, so an entry may be yielded more than once.
+        """
+        while True:
+            with self._lock:
+                generation = self.index.generation
+                batches = self.index.iter_entries(batch)
+            while True:
+                with self._lock:
+                    if self.index.generation != generation:
+                        break
+                    entries = next(batches, None)
+                if entries is None:
+                    return
+                yield [(digest, location) for digest, location in entries if location[0] in pack_ids]
+
+    def _relocate_locked(self, entries):
+        moving = []
+        for digest, location in entries:
+            # Skip chunks moved or removed since the entry was read
+            if self.index.get(digest) != location:
+                continue
+            fd, _, offset, length = self._locate_locked(digest)
+            moving.append((digest, os.pread(fd, length, offset)))
+        self._append_locked(moving)
+        return sum(len(data) for _, data in moving)
+
+    def relocate(self, entries):
+        """Copies chunks, given as index entries, to the active pack; returns the bytes copied."""
+        with self._lock:
+            return self._relocate_locked(entries)
+
+    def sweep(self, pack_ids, dead):
+        """
+        Deletes packs whose live chunks have been relocated. dead are the
+        index entries of their dead chunks; any referenced again in the
+        meantime are copied out first. Returns the bytes freed.
+        """
+        with self._lock:
+            self._relocate_locked([(digest, location) for digest, location in dead if self.refs.get(digest)])
+            # Copies must be durable before the originals go
+            self._dirty = True
+            self._flush_locked()
+            gone = [digest for digest, location in dead
+                    if not self.refs.get(digest) and self.index.get(digest) == location]
+            self.index.remove_many(gone)
+            self.refs.discard(gone)
+            self._dirty = True
+            self._flush_locked()
+            freed = 0
+            for pack_id in pack_ids:
+                path = self._pack_path(pack_id)
+                freed += os.path.getsize(path)
+                fd = self._read_fds.pop(pack_id, None)
+                if fd is not None:
+                    self._retired_fds.append(fd)
+                os.remove(path)
+            return freed
+
+    def recount(self, counts):
+        """
+        Replaces every reference count with counts (digest -> recipes using
+        it, from a mark pass) plus the references of files still being
+        deduplicated. Tracked digests missing from counts become dead.
+        """
+        with self._lock:
+            counts = dict(counts)
+            for refs in self._inflight:
+                for digest in refs:
+                    counts[digest] = counts.get(digest, 0) + 1
+            for digest in list(self.refs.counts):
+                if digest not in counts:
+                    self.refs.set(digest, 0)
+            for digest, n in counts.items():
+                self.refs.set(digest, n)
+            self._dirty = True
+            self._flush_locked()
+            self.refs.set_suspect(False)
+
+    def close(self):
+        with self._lock:
+            self._flush_locked()
+            self._active.close()
+            self.index.close()
+            self.refs.close()
+            for fd in list(self._read_fds.values()) + self._retired_fds:
+                os.close(fd)
+            self._read_fds = {}
+            self._retired_fds = []
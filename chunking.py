@@ -0,0 +1,192 @@
+import hashlib
+
+import numpy as np
+
+import telemetry
+
+# Bytes read from the file per boundary-detection pass
+BUFFER_SIZE = 16 * 1024 * 1024
+
+DEFAULT_CDC = {'min_size': 2048, 'avg_size': 8192, 'max_size': 65536}
+
+# Gear table: one pseudo-random 32-bit value per byte value. Derived from
+# SHA-256 rather than a RNG so chunk boundaries (and therefore dedup across
+# runs) never change with the numpy version.
+GEAR = np.array(
+    [int.from_bytes(hashlib.sha256(bytes([b])).digest()[:4], 'little') for b in range(256)],
+    dtype=np.uint32,
+)
+# A gear hash shifts one bit per byte, so a 32-bit hash covers the last 32 bytes
+WINDOW = 32
+# Bytes hashed at a time when looking for boundaries. The hash array is four
+# times this, so it and its temporaries stay in cache across the doubling passes.
+HASH_SLICE = 64 * 1024
+
+
+def gear_hashes(buf):
+    """
+    Gear rolling hash at every byte position of buf, vectorized.
+
+    h[i] = sum(GEAR[buf[i - j]] << j for j in 0..31) (mod 2**32). Instead of
+    rolling byte by byte, windows are doubled log2(32) = 5 times:
+    H_2k[i] = H_k[i] + (H_k[i - k] << k).
+    """
+    h = np.take(GEAR, np.frombuffer(buf, dtype=np.uint8))
+    n = len(h)
+    tmp = np.empty_like(h)
+    k = 1
+    while k < min(WINDOW, n):
+        np.left_shift(h[:-k], np.uint32(k), out=tmp[:n - k])
+        np.add(h[k:], tmp[:n - k], out=h[k:])
+        k *= 2
+    return h
+
+
+def _top_bits_mask(bits):
+    # The high bits of a gear hash depend on the whole window, the low bits
+    # only on the last few bytes, so boundary masks use the top bits.
+    return np.uint32(((1 << bits) - 1) << (32 - bits))
+
+
+def _candidates(buf, bits):
+    """
+    Cut candidates of buf for the loose and strict masks, as end offsets.
+
+    Hashes buf one HASH_SLICE at a time, each slice preceded by the
+    WINDOW - 1 bytes before it, so the hashes are those of the whole buffer.
+    The strict mask's bits include the loose mask's, so strict candidates are
+    a subset of loose ones.
+    """
+    loose_mask = _top_bits_mask(bits - 2)
+    strict_mask = _top_bits_mask(bits + 2)
+    loose, strict = [], []
+    for start in range(0, len(buf), HASH_SLICE):
+        lead = min(start, WINDOW - 1)
+        h = gear_hashes(buf[start - lead:start + HASH_SLICE])[lead:]
+        # Position i is a candidate to cut *after* byte i
+        found = np.flatnonzero((h & loose_mask) == 0)
+        strict.append(found[(h[found] & strict_mask) == 0] + (start + 1))
+        loose.append(found + (start + 1))
+    return np.concatenate(loose), np.concatenate(strict)
+
+
+def cdc_boundaries(buf, min_size, avg_size, max_size, final=True):
+    """
+    FastCDC-style chunk boundaries for buf.
+
+    Uses normalized chunking: a stricter mask before avg_size and a looser
+    one after it, which pulls chunk sizes towards avg_size. Returns the end
+    offsets of the chunks found. Unless final is set, the trailing bytes after
+    the last boundary are left for the caller to prepend to the next buffer.
+    """
+    if not min_size >= WINDOW * 2 or not min_size <= avg_size <= max_size:
+        raise ValueError("CDC sizes must satisfy 64 <= min_size <= avg_size <= max_size")
+    n = len(buf)
+    if n == 0:
+        return []
+
+    bits = max(1, int(avg_size).bit_length() - 1)
+    loose, strict = _candidates(buf, bits)
+
+    cuts = []
+    start = 0
+    while True:
+        if n - start <= min_size:
+            break
+        # First strict candidate in [start + min, start + avg)
+        i = np.searchsorted(strict, start + min_size)
+        if i < len(strict) and strict[i] < start + avg_size:
+            cut = int(strict[i])
+        else:
+            # Then a loose candidate in [start + avg, start + max)
+            j = np.searchsorted(loose, start + avg_size)
+            if j < len(loose) and loose[j] < start + max_size:
+                cut = int(loose[j])
+            elif start + max_size <= n:
+                cut = start + max_size
+            else:
+                break
+        cuts.append(cut)
+        start = cut
+
+    if final and start < n:
+        cuts.append(n)
+    return cuts
+
+
+def _read_full(f, view):
+    """readinto() until view is full or the file ends; returns the bytes read."""
+    filled = calls = 0
+    while filled < len(view):
+        n = f.readinto(view[filled:])
+        calls += 1
+        if not n:
+            break
+        filled += n
+    telemetry.count('syscalls_total', calls, call='read')
+    return filled
+
+
+def iter_chunk_batches(f, chunking=None, buffer_size=BUFFER_SIZE):
+    """
+    Yields the chunks of an open binary file in batches, one list per
+    buffer_size read.
+
+    Each buffer is a fresh bytearray filled with readinto(), and its chunks
+    are memoryview slices of it, so no bytes are copied per chunk. A batch
+    stays valid after the next one is read. chunking is as for iter_chunks.
+    """
+    chunking = chunking or {}
+    method = chunking.get('method', 'fixed')
+
+    if method == 'fixed':
+        chunk_size = chunking.get('chunk_size', 4096)
+        # A whole number of chunks per buffer keeps boundaries at multiples of chunk_size
+        buffer_size = max(1, buffer_size // chunk_size) * chunk_size
+        while True:
+            buf = bytearray(buffer_size)
+            n = _read_full(f, memoryview(buf))
+            if not n:
+                return
+            view = memoryview(buf)[:n]
+            yield [view[i:i + chunk_size] for i in range(0, n, chunk_size)]
+            if n < buffer_size:
+                return
+
+    elif method == 'cdc':
+        min_size = chunking.get('min_size', DEFAULT_CDC['min_size'])
+        avg_size = chunking.get('avg_size', DEFAULT_CDC['avg_size'])
+        max_size = chunking.get('max_size', DEFAULT_CDC['max_size'])
+        carry = b''
+        while True:
+            # The unchunked tail of the previous buffer goes first
+            buf = bytearray(len(carry) + buffer_size)
+            buf[:len(carry)] = carry
+            n = _read_full(f, memoryview(buf)[len(carry):])
+            end = len(carry) + n
+            if not end:
+                return
+            final = n < buffer_size
+            view = memoryview(buf)[:end]
+            cuts = cdc_boundaries(view, min_size, avg_size, max_size, final=final)
+            starts = [0] + cuts[:-1]
+            yield [view[start:cut] for start, cut in zip(starts, cuts)]
+            if final:
+                return
+            carry = bytes(view[cuts[-1] if cuts else 0:])
+
+    else:
+        raise ValueError(f"Unknown chunking method: {method}")
+
+
+def iter_chunks(f, chunking=None):
+    """
+    Yields the chunks of an open binary file as bytes.
+
+    chunking is a policy rule's "chunking" dict: {"method": "fixed",
+    "chunk_size": 4096} (the default) or {"method": "cdc", "min_size": ...,
+    "avg_size": ..., "max_size": ...} for content-defined chunking.
+    """
+    for batch in iter_chunk_batches(f, chunking):
+        for chunk in batch:
+            yield bytes(chunk)
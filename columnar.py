@@ -0,0 +1,221 @@
+import os
+import struct
+
+import numpy as np
+
+# Columnar aggregate file (.col) layout, all little-endian:
+#
+#   header      magic, version, flags, row count, column count, rows per block
+#   columns     one record per column: name, numpy dtype string, data offset
+#   block index (min, max) timestamp of every block of rows, int64 pairs
+#   data        each column's values as one contiguous typed array, 64-byte
+#               aligned so it can be used straight from the memory map
+#
+# The first column is always 'timestamp' (int64 epoch seconds). When the
+# rows are sorted by time (the SORTED flag, always true for aggregator
+# output) a time range is a single contiguous slice of every column.
+MAGIC = b'DCOL'
+VERSION = 1
+HEADER = struct.Struct('<4sHHQII')
+COLUMN = struct.Struct('<32s8sQ')
+FLAG_SORTED = 1
+ALIGNMENT = 64
+
+# Rows covered by one block index entry
+BLOCK_ROWS = 4096
+
+SUPPORTED_DTYPES = ('<i8', '<f8', '<f4')
+
+
+def _align(offset):
+    return (offset + ALIGNMENT - 1) // ALIGNMENT * ALIGNMENT
+
+
+def to_epoch_seconds(value):
+    """Epoch seconds from an int, a datetime64, a datetime/Timestamp or an ISO string."""
+    if value is None or isinstance(value, (int, np.integer)):
+        return value
+    return int(np.datetime64(value, 's').astype(np.int64))
+
+
+class ColumnarWriter:
+    """
+    Writes a columnar file from batches of rows.
+
+    Batches are kept in memory until close(), which writes the file to a
+    temporary path and renames it into place. Aggregated output is small
+    next to its input, so only the output rows are ever held.
+    """
+
+    def __init__(self, path, columns, block_rows=BLOCK_ROWS):
+        self.path = path
+        self.columns = list(columns)
+        self.block_rows = block_rows
+        self.dtypes = None
+        self.rows = 0
+        self._batches = {name: [] for name in ['timestamp'] + self.columns}
+        self._sorted = True
+        self._last_ts = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def append(self, timestamps, values):
+        """Adds rows: an int64 array of epoch seconds and a dict of column -> array."""
+        timestamps = np.asarray(timestamps, dtype='<i8')
+        if not len(timestamps):
+            return
+        if self.dtypes is None:
+            self.dtypes = {name: np.asarray(values[name]).dtype.newbyteorder('<').str for name in self.columns}
+            for name, dtype in self.dtypes.items():
+                if dtype not in SUPPORTED_DTYPES:
+                    raise ValueError(f"Unsupported dtype {dtype} for column {name}")
+        if self._sorted:
+            ordered = (timestamps[1:] >= timestamps[:-1]).all()
+            self._sorted = ordered and (self._last_ts is None or timestamps[0] >= self._last_ts)
+        self._last_ts = int(timestamps[-1])
+
+        self._batches['timestamp'].append(timestamps)
+        for name in self.columns:
+            self._batches[name].append(np.asarray(values[name], dtype=self.dtypes[name]))
+        self.rows += len(timestamps)
+
+    def close(self):
+        """Writes the file and returns its size in bytes."""
+        if self._batches is None:
+            return os.path.getsize(self.path)
+        dtypes = {'timestamp': '<i8'}
+        for name in self.columns:
+            dtypes[name] = (self.dtypes or {}).get(name, '<f8')
+        arrays = {name: np.concatenate(batches) if batches else np.empty(0, dtype=dtypes[name])
+                  for name, batches in self._batches.items()}
+        self._batches = None
+
+        ts = arrays['timestamp']
+        starts = np.arange(0, self.rows, self.block_rows)
+        if self.rows:
+            index = np.column_stack((np.minimum.reduceat(ts, starts), np.maximum.reduceat(ts, starts)))
+        else:
+            index = np.empty((0, 2), dtype='<i8')
+
+        names = list(arrays)
+        offset = _align(HEADER.size + len(names) * COLUMN.size + index.nbytes)
+        directory = []
+        for name in names:
+            directory.append(COLUMN.pack(name.encode(), dtypes[name].encode(), offset))
+            offset = _align(offset + arrays[name].nbytes)
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, FLAG_SORTED if self._sorted else 0,
+                                self.rows, len(names), self.block_rows))
+            f.write(b''.join(directory))
+            f.write(index.astype('<i8').tobytes())
+            for name in names:
+                f.seek(_align(f.tell()))
+                f.write(arrays[name].tobytes())
+            f.truncate(offset)
+        os.replace(tmp_path, self.path)
+        return offset
+
+
+class ColumnarFile:
+    """
+    Memory-mapped, read-only view of a columnar file.
+
+    Columns and query results are numpy views straight into the map, so
+    nothing is parsed or copied; pages are only read when values are touched.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._data = np.memmap(path, dtype=np.uint8, mode='r')
+        magic, version, flags, self.rows, column_count, self.block_rows = HEADER.unpack_from(self._data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a columnar file: {path}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported columnar file version {version}: {path}")
+        self.sorted = bool(flags & FLAG_SORTED)
+
+        self._columns = {}
+        for i in range(column_count):
+            name, dtype, offset = COLUMN.unpack_from(self._data, HEADER.size + i * COLUMN.size)
+            dtype = np.dtype(dtype.rstrip(b'\0').decode())
+            self._columns[name.rstrip(b'\0').decode()] = (dtype, offset)
+
+        index_offset = HEADER.size + column_count * COLUMN.size
+        block_count = -(-self.rows // self.block_rows)
+        self.block_index = self._data[index_offset:index_offset + block_count * 16].view('<i8').reshape(-1, 2)
+
+    @property
+    def columns(self):
+        return list(self._columns)
+
+    def column(self, name):
+        """Whole column as a read-only array backed by the file."""
+        dtype, offset = self._columns[name]
+        return self._data[offset:offset + self.rows * dtype.itemsize].view(dtype)
+
+    def __len__(self):
+        return self.rows
+
+    def _block_rows(self, start, end):
+        """Row range [lo, hi) of the blocks whose time span overlaps [start, end)."""
+        mins, maxs = self.block_index[:, 0], self.block_index[:, 1]
+        lo_block = 0 if start is None else int(np.searchsorted(maxs, start, side='left'))
+        hi_block = len(mins) if end is None else int(np.searchsorted(mins, end, side='left'))
+        return lo_block * self.block_rows, min(self.rows, hi_block * self.block_rows)
+
+    def query(self, start=None, end=None, columns=None):
+        """
+        Rows with start <= timestamp < end, as a dict of column -> array
+        (always including 'timestamp'). Either bound may be None.
+
+        On sorted files the block index narrows the search to the
+        overlapping blocks and the result is a slice of each column, i.e. a
+        view into the map. Unsorted files are filtered block by block and
+        the result is a copy.
+        """
+        start, end = to_epoch_seconds(start), to_epoch_seconds(end)
+        names = ['timestamp'] + [c for c in (columns or self.columns) if c != 'timestamp']
+        ts = self.column('timestamp')
+
+        if self.sorted:
+            lo, hi = self._block_rows(start, end)
+            window = ts[lo:hi]
+            first = lo + (0 if start is None else int(np.searchsorted(window, start, side='left')))
+            last = lo + (len(window) if end is None else int(np.searchsorted(window, end, side='left')))
+            return {name: self.column(name)[first:last] for name in names}
+
+        mins, maxs = self.block_index[:, 0], self.block_index[:, 1]
+        overlap = np.ones(len(mins), dtype=bool)
+        if start is not None:
+            overlap &= maxs >= start
+        if end is not None:
+            overlap &= mins < end
+        rows = []
+        for block in np.flatnonzero(overlap):
+            lo = block * self.block_rows
+            block_ts = ts[lo:lo + self.block_rows]
+            keep = np.ones(len(block_ts), dtype=bool)
+            if start is not None:
+                keep &= block_ts >= start
+            if end is not None:
+                keep &= block_ts < end
+            rows.append(lo + np.flatnonzero(keep))
+        rows = np.concatenate(rows) if rows else np.empty(0, dtype=np.int64)
+        return {name: self.column(name)[rows] for name in names}
+
+
+def query(path, start=None, end=None, columns=None):
+    """
+    Reads the rows of a columnar aggregate file with start <= timestamp < end.
+
+    start and end are epoch seconds, datetimes or ISO strings ('2024-03-01');
+    columns defaults to all of them. Returns a dict of column -> numpy array
+    with 'timestamp' as int64 epoch seconds.
+    """
+    return ColumnarFile(path).query(start, end, columns)
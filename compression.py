@@ -1,42 +1,345 @@
+import bz2
 import gzip
+import lzma
 import shutil
 import os
 import time
+import zlib
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 
-def compress_file(file_path, level=9, delete_original=True):
+import numpy as np
+
+import journal
+import seekable_gzip
+import telemetry
+
+# Uncompressed bytes per gzip member in parallel mode. Large enough that the
+# per-member header and dictionary warm-up cost stays well under 1%.
+BLOCK_SIZE = 4 * 1024 * 1024
+
+# Codec name -> (file extension, one-shot compress(data, level), streaming open)
+CODECS = {
+    'gzip': ('.gz', lambda data, level: zlib.compress(data, level), gzip.open),
+    'bz2': ('.bz2', lambda data, level: bz2.compress(data, level), bz2.open),
+    'lzma': ('.xz', lambda data, level: lzma.compress(data, preset=level), lzma.open),
+}
+DECOMPRESSORS = {
+    'gzip': zlib.decompress,
+    'bz2': bz2.decompress,
+    'lzma': lzma.decompress,
+}
+# (codec, level) pairs tried by adaptive selection
+CANDIDATES = [('gzip', 1), ('gzip', 6), ('gzip', 9), ('bz2', 9), ('lzma', 6)]
+
+# Adaptive sampling: SAMPLE_COUNT blocks of SAMPLE_SIZE bytes spread over the file
+SAMPLE_COUNT = 8
+SAMPLE_SIZE = 64 * 1024
+# Above this many bits per byte the data is treated as already compressed or random
+INCOMPRESSIBLE_ENTROPY = 7.9
+
+def _compress_block(block, level):
+    """Compresses one block into a complete, standalone gzip member."""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # wbits=31: gzip wrapper
+    return compressor.compress(block) + compressor.flush()
+
+def write_gzip_blocks(f_in, f_out, level=9, workers=None, block_size=BLOCK_SIZE, blocks=None, members=None,
+                      on_member=None):
+    """
+    Pigz-style block-parallel gzip.
+
+    Splits f_in into fixed-size blocks (or compresses the given iterable of
+    blocks instead), compresses them on a thread pool (zlib releases the GIL)
+    and writes them to f_out in order as a multi-member gzip stream, which
+    gzip -d and gzip.open read as one file. At most two blocks per worker are
+    held in memory.
+
+    To continue an interrupted stream, pass the members already in f_out
+    (with both files positioned after them). on_member(members) is called
+    after each member is written, e.g. to checkpoint.
+
+    Returns a list of (uncompressed_size, compressed_size) per member.
+    """
+    workers = workers or os.cpu_count() or 1
+    members = [] if members is None else members
+    pending = deque()
+
+    def drain_one():
+        raw_size, future = pending.popleft()
+        member = future.result()
+        f_out.write(member)
+        members.append((raw_size, len(member)))
+        if on_member is not None:
+            on_member(members)
+
+    if blocks is None:
+        blocks = iter(lambda: f_in.read(block_size), b'')
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        for block in blocks:
+            pending.append((len(block), pool.submit(_compress_block, block, level)))
+            telemetry.observe('gzip_blocks_in_flight', len(pending), buckets=telemetry.COUNT_BUCKETS)
+            if len(pending) >= workers * 2:
+                drain_one()
+        while pending:
+            drain_one()
+
+    if not members:
+        # An empty file still needs one (empty) member to be valid gzip
+        member = _compress_block(b'', level)
+        f_out.write(member)
+        members.append((0, len(member)))
+    return members
+
+def compress_file(file_path, level=9, delete_original=True, workers=1, block_size=BLOCK_SIZE, codec='gzip',
+                  seekable=False, checkpoint=None):
     """
-    Compresses a file using gzip with a specified compression level.
+    Compresses a file using gzip (or bz2/lzma) with a specified compression level.
+    With workers > 1 gzip output is compressed block-parallel (see write_gzip_blocks).
+    With seekable=True it is written as indexed gzip frames (see seekable_gzip.py);
+    the returned size then includes the .idx sidecar.
+    Output is written to <output>.part and renamed into place once complete;
+    the original is only deleted after that. Block-parallel and seekable
+    output save their progress to checkpoint (a journal.Checkpoint) after
+    whole members and resume from it.
     """
-    if file_path.endswith(".gz"):
+    extension, _, open_compressed = CODECS[codec]
+    if any(file_path.endswith(ext) for ext, _, _ in CODECS.values()):
         return file_path, os.path.getsize(file_path)
-        
-    compressed_path = file_path + ".gz"
+    if seekable and codec != 'gzip':
+        raise ValueError(f"Seekable output is only supported for gzip, not {codec}")
+
+    compressed_path = file_path + extension
+    tmp_path = journal.part_path(compressed_path)
+    idx_path = seekable_gzip.index_path(compressed_path) if seekable else None
+    if checkpoint is not None:
+        checkpoint.track(tmp_path)
+        if idx_path:
+            checkpoint.track(journal.part_path(idx_path))
+    index_size = 0
 
-    with open(file_path, 'rb') as f_in:
-        with gzip.open(compressed_path, 'wb', compresslevel=level) as f_out:
-            shutil.copyfileobj(f_in, f_out)
+    with telemetry.stage('compress_write', codec=codec):
+        if seekable or (codec == 'gzip' and workers > 1):
+            index_size = _write_gzip_members(file_path, tmp_path, idx_path, level, workers, block_size, checkpoint)
+        else:
+            with open(file_path, 'rb') as f_in:
+                with open_compressed(tmp_path, 'wb', **_level_kwargs(codec, level)) as f_out:
+                    shutil.copyfileobj(f_in, f_out, BLOCK_SIZE)
+    if idx_path:
+        journal.publish(journal.part_path(idx_path), idx_path)
+    journal.publish(tmp_path, compressed_path)
+    if checkpoint is not None:
+        checkpoint.clear()
+    # The output keeps the original's mtime, so it ages (is archived, expires) like the original
+    st = os.stat(file_path)
+    for path in (compressed_path, idx_path) if idx_path else (compressed_path,):
+        os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
 
     original_size = os.path.getsize(file_path)
-    compressed_size = os.path.getsize(compressed_path)
+    compressed_size = os.path.getsize(compressed_path) + index_size
+    telemetry.count('bytes_in_total', original_size, stage='compress')
+    telemetry.count('bytes_out_total', compressed_size, stage='compress')
 
     if delete_original:
         os.remove(file_path)
 
-    print(f"Compressed {file_path} → {compressed_path} [Level {level}]")
+    mode = f", {workers} threads" if codec == 'gzip' and workers > 1 else ""
+    mode += ", seekable" if seekable else ""
+    name = "" if codec == 'gzip' else f"{codec} "
+    print(f"Compressed {file_path} → {compressed_path} [{name}Level {level}{mode}]")
     return compressed_path, compressed_size
 
+def _write_gzip_members(file_path, tmp_path, idx_path, level, workers, block_size, checkpoint):
+    """
+    Block-parallel gzip, or seekable gzip frames with idx_path, of file_path
+    into tmp_path. Resumes after the members recorded in checkpoint's state
+    and saves the state whenever it is due. Returns the index size.
+    """
+    state = checkpoint.state if checkpoint is not None else None
+    if state and (state.get('level') != level or not os.path.exists(tmp_path)
+                  or os.path.getsize(tmp_path) < state['out']):
+        state = None
+    members = [tuple(m) for m in state['members']] if state else []
+    meta = [tuple(m) for m in state['meta']] if state else []
+
+    with open(file_path, 'rb') as f_in, open(tmp_path, 'r+b' if state else 'wb') as f_out:
+        if state:
+            f_in.seek(state['in'])
+            f_out.truncate(state['out'])
+            f_out.seek(state['out'])
+            print(f"Resuming compression of {file_path} at byte {state['in']}")
+
+        def on_member(written, frames=()):
+            if checkpoint is None or not checkpoint.due():
+                return
+            f_out.flush()
+            os.fsync(f_out.fileno())
+            checkpoint.save({'level': level, 'in': sum(m[0] for m in written), 'out': sum(m[1] for m in written),
+                             'members': written, 'meta': frames})
+
+        if idx_path:
+            return seekable_gzip.write_seekable_gzip(f_in, f_out, journal.part_path(idx_path), level=level,
+                                                     workers=workers, members=members, meta=meta,
+                                                     on_frame=on_member)
+        write_gzip_blocks(f_in, f_out, level=level, workers=workers, block_size=block_size, members=members,
+                          on_member=on_member)
+        return 0
+
+def _level_kwargs(codec, level):
+    return {'preset': level} if codec == 'lzma' else {'compresslevel': level}
+
+def sample_file(file_path, count=SAMPLE_COUNT, size=SAMPLE_SIZE):
+    """Reads count blocks of size bytes spread evenly over a file (the whole file if it is small)."""
+    file_size = os.path.getsize(file_path)
+    with open(file_path, 'rb') as f:
+        if file_size <= count * size:
+            return f.read()
+        step = (file_size - size) / (count - 1)
+        samples = []
+        for i in range(count):
+            f.seek(int(i * step))
+            samples.append(f.read(size))
+    return b''.join(samples)
+
+def byte_entropy(data):
+    """Shannon entropy of data in bits per byte (0-8)."""
+    if not data:
+        return 0.0
+    counts = np.bincount(np.frombuffer(data, dtype=np.uint8), minlength=256)
+    p = counts[counts > 0] / len(data)
+    return float(-(p * np.log2(p)).sum())
+
+def trial_compress(sample, candidates=CANDIDATES):
+    """
+    Compresses the sample with every (codec, level) candidate.
+
+    Returns one dict per candidate with its ratio and the CPU seconds per
+    uncompressed MB it took to compress and decompress. Times are CPU time of
+    the calling thread, so they are not inflated by other pipeline workers.
+    """
+    mb = max(len(sample), 1) / 1e6
+    trials = []
+    for codec, level in candidates:
+        start = time.thread_time()
+        packed = CODECS[codec][1](sample, level)
+        compress_s = time.thread_time() - start
+        start = time.thread_time()
+        DECOMPRESSORS[codec](packed)
+        decompress_s = time.thread_time() - start
+        trials.append({
+            'codec': codec,
+            'level': level,
+            'ratio': len(sample) / max(len(packed), 1),
+            'compress_s_per_mb': compress_s / mb,
+            'decompress_ms_per_mb': decompress_s * 1000 / mb,
+        })
+    return trials
+
+def choose_codec(trials, target='balanced', min_ratio=1.1, ratio_tolerance=0.1, max_decompress_ms_per_mb=None):
+    """
+    Picks a trial (or None: store as-is) for a rule's compression target.
+
+    'max_ratio'     - the best ratio
+    'ratio_per_cpu' - the most bytes saved per CPU-second of compression
+    'balanced'      - the cheapest codec within ratio_tolerance of the best ratio
+    Codecs slower to decompress than max_decompress_ms_per_mb are never
+    chosen, and nothing is chosen if no codec reaches min_ratio.
+    """
+    usable = [t for t in trials if t['ratio'] >= min_ratio and
+              (max_decompress_ms_per_mb is None or t['decompress_ms_per_mb'] <= max_decompress_ms_per_mb)]
+    if not usable:
+        return None
+    if target == 'max_ratio':
+        return max(usable, key=lambda t: t['ratio'])
+    if target == 'ratio_per_cpu':
+        return max(usable, key=lambda t: (1 - 1 / t['ratio']) / max(t['compress_s_per_mb'], 1e-9))
+    if target == 'balanced':
+        best = max(t['ratio'] for t in usable)
+        close = [t for t in usable if t['ratio'] >= best * (1 - ratio_tolerance)]
+        return min(close, key=lambda t: t['compress_s_per_mb'])
+    raise ValueError(f"Unknown compression target: {target}")
+
+def choose_for_file(file_path, settings):
+    """
+    The codec compress_adaptive would pick for a file under a rule's
+    "compression" settings. Returns (choice, trials, entropy); choice is the
+    chosen trial or None (store as-is), trials is None if the sample looked
+    incompressible.
+    """
+    candidates = [c for c in CANDIDATES if c[0] == 'gzip'] if settings.get('seekable', False) else CANDIDATES
+    sample = sample_file(file_path)
+    entropy = byte_entropy(sample)
+    if entropy >= INCOMPRESSIBLE_ENTROPY:
+        return None, None, entropy
+    trials = trial_compress(sample, candidates)
+    choice = choose_codec(
+        trials,
+        target=settings.get('target', 'balanced'),
+        min_ratio=settings.get('min_ratio', 1.1),
+        ratio_tolerance=settings.get('ratio_tolerance', 0.1),
+        max_decompress_ms_per_mb=settings.get('max_decompress_ms_per_mb'),
+    )
+    return choice, trials, entropy
+
+def compress_adaptive(file_path, settings=None, delete_original=True, workers=1, checkpoint=None):
+    """
+    Compresses a file with the codec and level that best fit a rule's
+    "compression" settings (target, min_ratio, ratio_tolerance,
+    max_decompress_ms_per_mb), judged from a few sampled blocks. With
+    "seekable" only gzip levels are considered and the output is indexed.
+
+    Data that looks incompressible (high entropy, or no codec reaching
+    min_ratio) is stored as-is. A run resumed from checkpoint keeps the
+    gzip level it had chosen. Returns (final_path, final_size, decision),
+    where decision records the codec and level, the sample entropy and the
+    predicted vs actual ratio.
+    """
+    settings = settings or {}
+    original_size = os.path.getsize(file_path)
+    seekable = settings.get('seekable', False)
+
+    with telemetry.stage('compress_sample'):
+        choice, trials, entropy = choose_for_file(file_path, settings)
+    resumed = checkpoint.state if checkpoint is not None else None
+    if resumed and 'level' in resumed:
+        # Trial timings vary between runs; keep the gzip level the output was started with
+        same = [t for t in trials or () if t['codec'] == 'gzip' and t['level'] == resumed['level']]
+        choice = same[0] if same else {'codec': 'gzip', 'level': resumed['level'], 'ratio': 1.0}
+
+    if choice is None:
+        final_path, final_size = file_path, original_size
+        decision = {'codec': 'store', 'level': None, 'predicted_ratio': 1.0}
+        print(f"Stored {file_path} uncompressed (entropy {entropy:.2f} bits/byte)")
+    else:
+        final_path, final_size = compress_file(file_path, level=choice['level'], delete_original=delete_original,
+                                               workers=workers, codec=choice['codec'], seekable=seekable,
+                                               checkpoint=checkpoint)
+        decision = {'codec': choice['codec'], 'level': choice['level'], 'predicted_ratio': choice['ratio']}
+
+    telemetry.count('adaptive_choices_total', codec=decision['codec'])
+    decision['entropy'] = entropy
+    decision['actual_ratio'] = original_size / max(final_size, 1)
+    print(f"Adaptive compression of {file_path}: {decision['codec']} level {decision['level']}, "
+          f"predicted {decision['predicted_ratio']:.1f}x, actual {decision['actual_ratio']:.1f}x")
+    return final_path, final_size, decision
+
 def measure_decompression_latency(gz_file_path):
     """
     Measures the latency of reading the first 4KB of DECOMPRESSED data.
     This correctly measures the decompression penalty.
     """
-    start_time = time.time()
+    open_compressed = open
+    for extension, _, opener in CODECS.values():
+        if gz_file_path.endswith(extension):
+            open_compressed = opener
+
+    start_time = time.perf_counter()
     try:
-        with gzip.open(gz_file_path, 'rb') as f:
+        with open_compressed(gz_file_path, 'rb') as f:
             f.read(4096)  # Read 4KB of decompressed data
     except Exception as e:
         print(f"Error measuring decompression latency: {e}")
         return 0.0
         
-    end_time = time.time()
+    end_time = time.perf_counter()
     return (end_time - start_time) * 1000 # Return in ms
\ No newline at end of file
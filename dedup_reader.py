@@ -0,0 +1,207 @@
+import io
+import itertools
+import threading
+from collections import OrderedDict, deque
+from concurrent.futures import ThreadPoolExecutor
+
+from recipe import Recipe
+
+# Default byte budget of the per-reader chunk cache
+CACHE_BYTES = 64 * 1024 * 1024
+# Chunks prefetched ahead of a sequential reader
+READAHEAD_CHUNKS = 256
+
+
+class ChunkCache:
+    """Thread-safe LRU cache of chunk data keyed by digest, bounded by total bytes."""
+
+    def __init__(self, max_bytes=CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.size = 0
+        self._chunks = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, digest):
+        with self._lock:
+            data = self._chunks.get(digest)
+            if data is not None:
+                self._chunks.move_to_end(digest)
+            return data
+
+    def put(self, digest, data):
+        if len(data) > self.max_bytes:
+            return
+        with self._lock:
+            if digest in self._chunks:
+                self._chunks.move_to_end(digest)
+                return
+            self._chunks[digest] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, evicted = self._chunks.popitem(last=False)
+                self.size -= len(evicted)
+
+
+class DedupFileReader(io.RawIOBase):
+    """
+    Seekable, read-only file object over a deduplicated file.
+
+    Byte offsets are mapped to chunks through the file's recipe (.meta) and
+    chunks are fetched from the chunk store. Fetched chunks are kept in an
+    LRU cache, which also makes repeated chunks in the same file free. While
+    reads are sequential the recipe is walked forward instead of searched,
+    and batches of upcoming chunks are prefetched on a background thread so
+    store reads overlap with the consumer.
+    """
+
+    def __init__(self, metadata_path, store, cache_bytes=CACHE_BYTES, readahead=READAHEAD_CHUNKS):
+        super().__init__()
+        self.recipe = Recipe(metadata_path)
+        self.store = store
+        self.cache = ChunkCache(cache_bytes)
+        self.readahead = readahead
+        self._pos = 0
+        self._current = None      # (index, digest, offset, length) of the chunk at _pos
+        self._walker = None       # recipe iterator positioned after _upcoming
+        self._next_index = 0      # chunk index the walker yields next
+        self._upcoming = deque()  # chunk descriptors already pulled from the walker
+        self._inflight = {}       # digest -> prefetch batch future
+        self._inflight_lock = threading.Lock()
+        self._prefetcher = ThreadPoolExecutor(max_workers=1) if readahead else None
+
+    # --- io.RawIOBase interface ---------------------------------------
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            pos = offset
+        elif whence == io.SEEK_CUR:
+            pos = self._pos + offset
+        elif whence == io.SEEK_END:
+            pos = self.recipe.file_size + offset
+        else:
+            raise ValueError(f"Invalid whence: {whence}")
+        if pos < 0:
+            raise ValueError(f"Negative seek position {pos}")
+        self._pos = pos
+        return pos
+
+    def readinto(self, b):
+        out = memoryview(b).cast('B')
+        written = 0
+        size = self.recipe.file_size
+        while written < len(out) and self._pos < size:
+            chunk = self._current
+            if chunk is None or not chunk[2] <= self._pos < chunk[2] + chunk[3]:
+                chunk = self._advance()
+            _, digest, offset, length = chunk
+            data = self._get_chunk(digest)
+            start = self._pos - offset
+            n = min(length - start, len(out) - written)
+            out[written:written + n] = data[start:start + n]
+            written += n
+            self._pos += n
+        return written
+
+    def close(self):
+        if not self.closed:
+            if self._prefetcher is not None:
+                self._prefetcher.shutdown(wait=True, cancel_futures=True)
+            self._walker = None
+            self.recipe.close()
+        super().close()
+
+    # --- chunk lookup -------------------------------------------------
+
+    def _advance(self):
+        """Finds the chunk containing _pos: walks forward if sequential, else searches."""
+        current = self._current
+        if current is not None and self._pos == current[2] + current[3]:
+            if not self._upcoming:
+                self._pull(self.readahead or 1)
+            chunk = self._upcoming.popleft()
+        else:
+            k = self.recipe.locate(self._pos)
+            chunk = (k, *self.recipe.chunk(k))
+            self._upcoming.clear()
+            self._walker = None
+            self._next_index = k + 1
+        self._current = chunk
+
+        # Keep a batch in flight ahead of a sequential reader (or one starting at 0)
+        if self._prefetcher is not None and (current is not None or chunk[0] == 0):
+            if len(self._upcoming) <= self.readahead // 2:
+                self._pull(self.readahead)
+        return chunk
+
+    def _pull(self, count):
+        """Moves up to count chunk descriptors from the recipe into _upcoming and prefetches them."""
+        if self._walker is None:
+            self._walker = self.recipe.iter_from(self._next_index)
+        batch = []
+        for digest, offset, length in itertools.islice(self._walker, count):
+            self._upcoming.append((self._next_index, digest, offset, length))
+            self._next_index += 1
+            batch.append(digest)
+        if self._prefetcher is None or not batch:
+            return
+        batch = [d for d in dict.fromkeys(batch) if self.cache.get(d) is None]
+        if not batch:
+            return
+        with self._inflight_lock:
+            batch = [d for d in batch if d not in self._inflight]
+            if batch:
+                future = self._prefetcher.submit(self._prefetch, batch)
+                for digest in batch:
+                    self._inflight[digest] = future
+
+    # --- chunk fetching -----------------------------------------------
+
+    def _fetch(self, digest):
+        data = self.cache.get(digest)
+        if data is None:
+            data = self.store.get(digest)
+            self.cache.put(digest, data)
+        return data
+
+    def _prefetch(self, digests):
+        try:
+            for digest, data in self.store.get_many(digests).items():
+                self.cache.put(digest, data)
+        finally:
+            with self._inflight_lock:
+                for digest in digests:
+                    self._inflight.pop(digest, None)
+
+    def _get_chunk(self, digest):
+        data = self.cache.get(digest)
+        if data is not None:
+            return data
+        with self._inflight_lock:
+            future = self._inflight.get(digest)
+        if future is not None:
+            future.result()
+        return self._fetch(digest)
+
+
+def rehydrate(metadata_path, output_path, store, buffer_size=8 * 1024 * 1024):
+    """Streams a deduplicated file back out to output_path. Returns bytes written."""
+    buf = bytearray(buffer_size)
+    view = memoryview(buf)
+    total = 0
+    with DedupFileReader(metadata_path, store) as reader, open(output_path, 'wb') as out:
+        while True:
+            n = reader.readinto(view)
+            if not n:
+                break
+            out.write(view[:n])
+            total += n
+    return total
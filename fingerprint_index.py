@@ -0,0 +1,361 @@
+import math
+import mmap
+import os
+import struct
+from array import array
+
+import numpy as np
+
+import telemetry
+
+# Entry: raw 32-byte digest, pack id, offset in pack, chunk length
+RECORD = struct.Struct('<32sIQI')
+DIGEST_SIZE = 32
+
+TABLE_MAGIC = b'FPTB'
+TABLE_HEADER = struct.Struct('<4sIQ')  # magic, version, entry count
+FANOUT_BITS = 16
+FANOUT = array('Q', [0]).itemsize * (1 << FANOUT_BITS)
+
+BLOOM_MAGIC = b'FPBL'
+BLOOM_HEADER = struct.Struct('<4sIQQ')  # magic, hash count, bit count, capacity
+BLOOM_FALSE_POSITIVE_RATE = 0.01
+
+# Buffered entries are merged into the sorted table once there are this many
+MERGE_THRESHOLD = 262144
+# Pack id of a tombstone: a removed entry, dropped at the next merge
+TOMBSTONE = 0xFFFFFFFF
+
+
+class BloomFilter:
+    """
+    Fixed-size Bloom filter over digests.
+
+    The keys are already uniformly distributed SHA-256 digests, so the k bit
+    positions are just k 32-bit slices of the digest instead of k extra hashes.
+    """
+
+    def __init__(self, capacity, fp_rate=BLOOM_FALSE_POSITIVE_RATE, bits=None, num_hashes=None):
+        self.capacity = max(1024, capacity)
+        self.num_bits = bits or int(-self.capacity * math.log(fp_rate) / math.log(2) ** 2)
+        self.num_hashes = num_hashes or max(1, min(8, round(self.num_bits / self.capacity * math.log(2))))
+        self.bits = bytearray((self.num_bits + 7) // 8)
+
+    def _positions(self, digest):
+        for i in range(self.num_hashes):
+            yield int.from_bytes(digest[4 * i:4 * i + 4], 'little') % self.num_bits
+
+    def add(self, digest):
+        for pos in self._positions(digest):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, digest):
+        bits = self.bits
+        for pos in self._positions(digest):
+            if not bits[pos >> 3] & (1 << (pos & 7)):
+                return False
+        return True
+
+    def _positions_many(self, digests):
+        # Row i holds the bit positions of digests[i], as _positions() computes them
+        words = np.frombuffer(b''.join(digests), dtype='<u4').reshape(len(digests), DIGEST_SIZE // 4)
+        return words[:, :self.num_hashes].astype(np.uint64) % np.uint64(self.num_bits)
+
+    def add_many(self, digests):
+        """add() for a batch of digests, vectorized."""
+        if not digests:
+            return
+        positions = self._positions_many(digests).ravel()
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        np.bitwise_or.at(bits, positions >> np.uint64(3), np.left_shift(1, positions & np.uint64(7)).astype(np.uint8))
+
+    def contains_many(self, digests):
+        """Membership flags for a batch of digests, vectorized."""
+        if not digests:
+            return []
+        positions = self._positions_many(digests)
+        bits = np.frombuffer(self.bits, dtype=np.uint8)
+        return ((bits[positions >> np.uint64(3)] >> (positions & np.uint64(7)).astype(np.uint8)) & 1).all(axis=1).tolist()
+
+    def save(self, path):
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(BLOOM_HEADER.pack(BLOOM_MAGIC, self.num_hashes, self.num_bits, self.capacity))
+            f.write(self.bits)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'rb') as f:
+            magic, num_hashes, num_bits, capacity = BLOOM_HEADER.unpack(f.read(BLOOM_HEADER.size))
+            if magic != BLOOM_MAGIC:
+                raise ValueError(f"Not a bloom filter file: {path}")
+            bloom = cls(capacity, bits=num_bits, num_hashes=num_hashes)
+            f.readinto(bloom.bits)
+        return bloom
+
+
+class FingerprintIndex:
+    """
+    Persistent digest -> chunk location index.
+
+    Entries live in three places, LSM-style:
+      * fingerprints.tbl   - sorted fixed-size records with a 64K fan-out
+                             table, memory-mapped and binary searched
+      * write buffer       - a dict of entries added since the last merge,
+                             made durable by appending them to fingerprints.log
+      * fingerprints.bloom - Bloom filter over all entries, kept in memory,
+                             so lookups of new chunks never touch the table
+
+    When the buffer reaches merge_threshold entries it is merged into a new
+    table, which atomically replaces the old one, and the log is truncated.
+    """
+
+    def __init__(self, root, merge_threshold=MERGE_THRESHOLD):
+        self.root = root
+        self.merge_threshold = merge_threshold
+        os.makedirs(root, exist_ok=True)
+
+        self._table_path = os.path.join(root, 'fingerprints.tbl')
+        self._log_path = os.path.join(root, 'fingerprints.log')
+        self._bloom_path = os.path.join(root, 'fingerprints.bloom')
+
+        self.buffer = {}
+        self._pending_records = bytearray()
+        # Incremented by every merge, which replaces the table under iter_entries()
+        self.generation = 0
+        self._open_table()
+        self._open_bloom()
+        self._replay_log()
+        self._log = open(self._log_path, 'ab')
+
+    # --- sorted table -------------------------------------------------
+
+    def _open_table(self):
+        self._table_file = None
+        self._mm = None
+        self.table_count = 0
+        self.fanout = array('Q', bytes(FANOUT))
+        if not os.path.exists(self._table_path):
+            return
+        self._table_file = open(self._table_path, 'rb')
+        self._mm = mmap.mmap(self._table_file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, _, count = TABLE_HEADER.unpack_from(self._mm, 0)
+        if magic != TABLE_MAGIC:
+            raise ValueError(f"Not a fingerprint table: {self._table_path}")
+        self.table_count = count
+        self.fanout = array('Q', self._mm[TABLE_HEADER.size:TABLE_HEADER.size + FANOUT])
+
+    def _close_table(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._table_file.close()
+        self._mm = None
+        self._table_file = None
+
+    def _table_lookup(self, digest):
+        if not self.table_count:
+            return None
+        bucket = int.from_bytes(digest[:2], 'big')
+        lo = self.fanout[bucket - 1] if bucket else 0
+        hi = self.fanout[bucket]
+        base = TABLE_HEADER.size + FANOUT
+        mm = self._mm
+        while lo < hi:
+            mid = (lo + hi) // 2
+            offset = base + mid * RECORD.size
+            key = mm[offset:offset + DIGEST_SIZE]
+            if key < digest:
+                lo = mid + 1
+            elif key > digest:
+                hi = mid
+            else:
+                return RECORD.unpack_from(mm, offset)[1:]
+        return None
+
+    def _iter_table_batches(self, batch=65536):
+        base = TABLE_HEADER.size + FANOUT
+        for start in range(0, self.table_count, batch):
+            end = min(self.table_count, start + batch)
+            yield list(RECORD.iter_unpack(self._mm[base + start * RECORD.size:base + end * RECORD.size]))
+
+    def _iter_table(self, batch=65536):
+        for records in self._iter_table_batches(batch):
+            yield from records
+
+    # --- bloom filter ---------------------------------------------------
+
+    def _open_bloom(self):
+        if os.path.exists(self._bloom_path):
+            self.bloom = BloomFilter.load(self._bloom_path)
+            if self.bloom.capacity >= self.table_count:
+                return
+        self._rebuild_bloom(self.table_count + self.merge_threshold)
+
+    def _rebuild_bloom(self, capacity):
+        self.bloom = BloomFilter(capacity)
+        for record in self._iter_table():
+            self.bloom.add(record[0])
+        for digest in self.buffer:
+            self.bloom.add(digest)
+
+    # --- write buffer / log -------------------------------------------
+
+    def _replay_log(self):
+        if not os.path.exists(self._log_path):
+            return
+        with open(self._log_path, 'rb') as f:
+            data = f.read()
+        usable = len(data) - len(data) % RECORD.size
+        if usable != len(data):
+            # Torn trailing record from an interrupted flush; the chunk it
+            # described is simply stored again the next time it is seen.
+            with open(self._log_path, 'r+b') as f:
+                f.truncate(usable)
+        for digest, pack_id, offset, length in RECORD.iter_unpack(data[:usable]):
+            self.buffer[digest] = (pack_id, offset, length)
+            self.bloom.add(digest)
+
+    def add(self, digest, location):
+        """Adds an entry; it is durable after the next flush()."""
+        self.buffer[digest] = location
+        self.bloom.add(digest)
+        self._pending_records += RECORD.pack(digest, *location)
+
+    def add_many(self, entries):
+        """Adds (digest, location) pairs, with one Bloom filter update for the batch."""
+        for digest, location in entries:
+            self.buffer[digest] = location
+            self._pending_records += RECORD.pack(digest, *location)
+        self.bloom.add_many([digest for digest, _ in entries])
+
+    def remove_many(self, digests):
+        """Removes entries (as tombstones in the buffer); durable after the next flush()."""
+        for digest in digests:
+            self.buffer[digest] = (TOMBSTONE, 0, 0)
+            self._pending_records += RECORD.pack(digest, TOMBSTONE, 0, 0)
+
+    def get(self, digest):
+        """Returns (pack_id, offset, length) for a digest, or None."""
+        location = self.buffer.get(digest)
+        if location is not None:
+            return location if location[0] != TOMBSTONE else None
+        if digest not in self.bloom:
+            return None
+        return self._table_lookup(digest)
+
+    def __contains__(self, digest):
+        return self.get(digest) is not None
+
+    def contains_many(self, digests):
+        """
+        Membership flags for a batch of digests. The Bloom filter is probed
+        for the whole batch at once; only its positives are looked up.
+        """
+        buffer = self.buffer
+        flags = []
+        maybes = self.bloom.contains_many(digests)
+        for digest, maybe in zip(digests, maybes):
+            if maybe:
+                location = buffer.get(digest)
+                maybe = location[0] != TOMBSTONE if location else self._table_lookup(digest) is not None
+            flags.append(maybe)
+        if telemetry.enabled:
+            positives, hits = maybes.count(True), flags.count(True)
+            telemetry.count('index_lookups_total', len(flags) - positives, result='bloom_negative')
+            telemetry.count('index_lookups_total', hits, result='hit')
+            telemetry.count('index_lookups_total', positives - hits, result='false_positive')
+        return flags
+
+    def __len__(self):
+        # Log replay after a crash mid-merge can leave a few entries in both
+        return self.table_count + len(self.buffer)
+
+    def iter_entries(self, batch=65536):
+        """
+        Yields lists of up to batch live (digest, location) entries: the
+        table's, except those the buffer overrides, then the buffer's. Each
+        list is read when the generator resumes, so a caller may release its
+        lock between lists, but must start over once generation changes.
+        """
+        for records in self._iter_table_batches(batch):
+            buffer = self.buffer
+            yield [(record[0], record[1:]) for record in records if record[0] not in buffer]
+        entries = [(digest, location) for digest, location in list(self.buffer.items()) if location[0] != TOMBSTONE]
+        for start in range(0, len(entries), batch):
+            yield entries[start:start + batch]
+
+    def flush(self):
+        """Makes buffered entries durable and merges them if the buffer is full."""
+        if self._pending_records:
+            self._log.write(self._pending_records)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            telemetry.count('syscalls_total', call='fsync')
+            self._pending_records = bytearray()
+        if len(self.buffer) >= self.merge_threshold:
+            with telemetry.stage('index_merge'):
+                self.merge()
+
+    def merge(self):
+        """Merges the write buffer into a new sorted table."""
+        if not self.buffer:
+            return
+        buffered = sorted(self.buffer.items())
+        tmp_path = self._table_path + '.tmp'
+        fanout = array('Q', bytes(FANOUT))
+        count = 0
+
+        with open(tmp_path, 'wb') as out:
+            out.write(TABLE_HEADER.pack(TABLE_MAGIC, 1, 0))
+            out.write(bytes(FANOUT))
+            old = self._iter_table()
+            old_record = next(old, None)
+            i = 0
+            while old_record is not None or i < len(buffered):
+                if i < len(buffered) and (old_record is None or buffered[i][0] <= old_record[0]):
+                    digest, location = buffered[i]
+                    i += 1
+                    if old_record is not None and old_record[0] == digest:
+                        old_record = next(old, None)
+                    if location[0] == TOMBSTONE:
+                        continue
+                    record = (digest, *location)
+                else:
+                    record = old_record
+                    old_record = next(old, None)
+                out.write(RECORD.pack(*record))
+                fanout[int.from_bytes(record[0][:2], 'big')] += 1
+                count += 1
+
+            # Turn per-bucket counts into cumulative end positions
+            total = 0
+            for bucket in range(len(fanout)):
+                total += fanout[bucket]
+                fanout[bucket] = total
+            out.seek(0)
+            out.write(TABLE_HEADER.pack(TABLE_MAGIC, 1, count))
+            out.write(fanout.tobytes())
+            out.flush()
+            os.fsync(out.fileno())
+
+        self._close_table()
+        os.replace(tmp_path, self._table_path)
+        self._open_table()
+        self.generation += 1
+
+        self.buffer = {}
+        if self.bloom.capacity < self.table_count + self.merge_threshold:
+            self._rebuild_bloom(2 * (self.table_count + self.merge_threshold))
+        self.bloom.save(self._bloom_path)
+        self._log.truncate(0)
+        self._log.flush()
+        os.fsync(self._log.fileno())
+
+    def close(self):
+        self.flush()
+        self.bloom.save(self._bloom_path)
+        self._log.close()
+        self._close_table()
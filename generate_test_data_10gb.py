@@ -1,90 +1,278 @@
 import os
-import random
-import csv
-import datetime
+import argparse
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+# Paper dataset at scale 1.0 (~11 GB)
+RAW_BYTES = 1 * 1024**3
+LOG_BYTES = 4 * 1024**3
+BIN_BYTES = 4 * 1024**3
+CSV_ROWS = 20_000_000
+
+LOG_TEMPLATES = [
+    b"2025-09-02 12:00:00,123 - INFO - User logged in\n",
+    b"2025-09-02 12:00:01,456 - WARN - Disk space low\n",
+    b"2025-09-02 12:00:02,789 - ERROR - Connection timeout\n",
+    b"2025-09-02 12:00:03,321 - DEBUG - Cache refreshed\n",
+]
+CSV_HEADER = b"timestamp,temperature,pressure,event_count\n"
+CSV_START = np.datetime64('2024-01-01T00:00:00', 's')
+
+BLOCK = 1024 * 1024       # unit of raw and redundant data
+BATCH_ROWS = 1_000_000    # CSV rows / log lines built per vectorized batch
+_HEX = np.frombuffer(b"0123456789abcdef", dtype=np.uint8)
+_DIGITS = np.frombuffer(b"0123456789", dtype=np.uint8)
+
+# How far into a warm or cold tier --age-profile spread places a file's age
+TIER_POSITION = 0.5
+
+
+def _scatter(out, starts, row_bytes):
+    """Writes row_bytes (a (len(starts), width) array, or one row broadcast) at each start offset."""
+    width = row_bytes.shape[-1]
+    out[starts[:, None] + np.arange(width)] = row_bytes
+
+
+def _rng(seed, index):
+    """Independent, reproducible random stream per generated file."""
+    return np.random.default_rng([seed, index])
 
-os.makedirs("test_data", exist_ok=True)
 
 # ===============================
-# 1) Generate ~1GB Raw Baseline File
+# Raw baseline: incompressible bytes
 # ===============================
-def generate_raw_baseline_file():
-    print("[*] Generating ~1GB raw baseline file...")
-    target_size = 1 * 1024**3  # 1 GB
-    chunk_size = 1024 * 1024 # 1 MB
-    chunks = target_size // chunk_size
-    
-    with open("test_data/raw_baseline.dat", "wb") as f:
-        for _ in range(chunks):
-            f.write(os.urandom(chunk_size))
-    print(f"[OK] Raw baseline file generated (~1GB)")
+def write_raw(path, size, seed, index):
+    rng = _rng(seed, index)
+    with open(path, "wb") as f:
+        for offset in range(0, size, BLOCK):
+            f.write(rng.bytes(min(BLOCK, size - offset)))
+
 
 # ===============================
-# 2) Generate ~4GB Log Files
+# Logs
 # ===============================
-def generate_large_logs():
-    print("[*] Generating ~4GB log files...")
-    log_templates = [
-        "2025-09-02 12:00:00,123 - INFO - User logged in\n",
-        "2025-09-02 12:00:01,456 - WARN - Disk space low\n",
-        "2025-09-02 12:00:02,789 - ERROR - Connection timeout\n",
-        "2025-09-02 12:00:03,321 - DEBUG - Cache refreshed\n"
-    ]
-    line_size = len(log_templates[0].encode("utf-8"))
-    target_size = 4 * 1024**3  # 4 GB total
-    lines_needed = target_size // line_size
-
-    with open("test_data/app.log", "w") as f:
-        for i in range(lines_needed // 2):
-            f.write(log_templates[i % len(log_templates)])
-
-    with open("test_data/app2.log", "w") as f:
-        for i in range(lines_needed // 2):
-            f.write(log_templates[i % len(log_templates)])
-    print(f"[OK] Logs generated: app.log + app2.log (~4GB, compressible)")
+def _log_batch(rng, first_line, count, randomness):
+    """
+    count log lines cycling through the templates. A fraction randomness
+    of them get a random 16-hex-digit request id, which is what makes
+    real logs compress worse than the repeated templates.
+    """
+    kind = (first_line + np.arange(count)) % len(LOG_TEMPLATES)
+    tagged = rng.random(count) < randomness if randomness else np.zeros(count, dtype=bool)
+    template_len = np.array([len(t) for t in LOG_TEMPLATES])
+    lengths = template_len[kind] + np.where(tagged, len(b" id=") + 16, 0)
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    out = np.empty(int(ends[-1]), dtype=np.uint8)
+
+    for k, template in enumerate(LOG_TEMPLATES):
+        plain = np.flatnonzero((kind == k) & ~tagged)
+        _scatter(out, starts[plain], np.frombuffer(template, dtype=np.uint8))
+        rows = np.flatnonzero((kind == k) & tagged)
+        if len(rows):
+            prefix = np.frombuffer(template[:-1] + b" id=", dtype=np.uint8)
+            _scatter(out, starts[rows], prefix)
+            _scatter(out, starts[rows] + len(prefix), _HEX[rng.integers(0, 16, (len(rows), 16))])
+            out[starts[rows] + len(prefix) + 16] = ord("\n")
+    return out, ends
+
+
+def write_log(path, size, seed, index, randomness=0.0):
+    rng = _rng(seed, index)
+    written = line = 0
+    with open(path, "wb") as f:
+        while written < size:
+            out, ends = _log_batch(rng, line, BATCH_ROWS, randomness)
+            # Stop on the last whole line that fits
+            lines = int(np.searchsorted(ends, size - written, side="right")) or 1
+            end = int(ends[lines - 1])
+            f.write(out[:end].tobytes())
+            written += end
+            line += lines
+
 
 # ===============================
-# 3) Generate ~4GB Redundant BINs
+# Redundant binaries
 # ===============================
-def generate_redundant_bins():
-    print("[*] Generating ~4GB redundant binary files...")
-    # Generate 1 MB random block
-    chunk = os.urandom(1024 * 1024)  # 1 MB
-    target_size = (4 * 1024**3) // 3
-    repeats = target_size // len(chunk)
-
-    for i in range(1, 4):
-        with open(f"test_data/redundant{i}.bin", "wb") as f:
-            for _ in range(repeats):
-                f.write(chunk)
-    print(f"[OK] Redundant BIN files generated (~4GB, highly duplicate)")
+def write_redundant(path, size, seed, index, duplicate_ratio=1.0, shift_rate=0.0, pool_blocks=1):
+    """
+    1 MB blocks, each a copy of one of pool_blocks blocks shared by every
+    redundant file (with probability duplicate_ratio) or fresh random
+    bytes. With probability shift_rate a block gets 1-64 random bytes
+    inserted at a random point, shifting all later data off fixed chunk
+    boundaries.
+    """
+    pool = np.random.default_rng([seed, 0x5eed]).bytes(pool_blocks * BLOCK)
+    rng = _rng(seed, index)
+    written = 0
+    with open(path, "wb") as f:
+        while written < size:
+            if rng.random() < duplicate_ratio:
+                k = int(rng.integers(pool_blocks))
+                block = pool[k * BLOCK:(k + 1) * BLOCK]
+            else:
+                block = rng.bytes(BLOCK)
+            if shift_rate and rng.random() < shift_rate:
+                at = int(rng.integers(BLOCK))
+                block = block[:at] + rng.bytes(int(rng.integers(1, 65))) + block[at:]
+            block = block[:size - written]
+            f.write(block)
+            written += len(block)
+
 
 # ===============================
-# 4) Generate ~2GB Time-Series CSV
+# Time-series CSV
 # ===============================
-def generate_time_series_csv():
-    print("[*] Generating ~2GB time-series CSV...")
-    start = datetime.datetime(2024, 1, 1, 0, 0, 0)
-    rows = 20_000_000
-    with open("test_data/sensor.csv", "w", newline="") as f:
-        writer = csv.writer(f)
-        writer.writerow(["timestamp", "temperature", "pressure", "event_count"])
-        for i in range(rows):
-            ts = start + datetime.timedelta(seconds=i)
-            writer.writerow([
-                ts.strftime("%Y-%m-%d %H:%M:%S"),
-                round(20 + random.random() * 5, 2),
-                round(1000 + random.random() * 50, 2),
-                random.randint(0, 100)
-            ])
-    print(f"[OK] Time-series CSV generated (~2GB)")
+def _csv_batch(rng, first_row, count, interval):
+    """count CSV rows as bytes, formatted with array arithmetic instead of per-row strftime."""
+    ts = np.datetime_as_string(CSV_START + (first_row + np.arange(count)) * interval, unit="s")
+    ts = np.frombuffer(ts.astype("S19").tobytes(), dtype=np.uint8).reshape(count, 19).copy()
+    ts[:, 10] = ord(" ")
+    temperature = np.round((20 + rng.random(count) * 5) * 100).astype(np.int64)        # dd.dd
+    pressure = np.round((1000 + rng.random(count) * 50) * 100).astype(np.int64)        # dddd.dd
+    events = rng.integers(0, 101, count)
+
+    def digits(values, places):
+        return _DIGITS[(values[:, None] // 10 ** np.arange(places - 1, -1, -1)) % 10]
+
+    comma = np.full((count, 1), ord(","), dtype=np.uint8)
+    dot = np.full((count, 1), ord("."), dtype=np.uint8)
+    fixed = np.hstack([ts, comma,
+                       digits(temperature // 100, 2), dot, digits(temperature % 100, 2), comma,
+                       digits(pressure // 100, 4), dot, digits(pressure % 100, 2), comma])
+
+    places = 1 + (events >= 10) + (events >= 100)
+    lengths = fixed.shape[1] + places + 1
+    ends = np.cumsum(lengths)
+    starts = ends - lengths
+    out = np.empty(int(ends[-1]), dtype=np.uint8)
+    _scatter(out, starts, fixed)
+    tail = starts + fixed.shape[1]
+    for p in (1, 2, 3):
+        rows = np.flatnonzero(places == p)
+        _scatter(out, tail[rows], digits(events[rows], p))
+    out[ends - 1] = ord("\n")
+    return out
+
+
+def write_time_series(path, rows, seed, index, interval=1):
+    rng = _rng(seed, index)
+    with open(path, "wb") as f:
+        f.write(CSV_HEADER)
+        for first in range(0, rows, BATCH_ROWS):
+            f.write(_csv_batch(rng, first, min(BATCH_ROWS, rows - first), interval).tobytes())
+
+
+# ===============================
+# Planning, parallel writing, ages
+# ===============================
+def plan(output_dir, scale=1.0, log_files=2, bin_files=3, log_randomness=0.0, duplicate_ratio=1.0,
+         shift_rate=0.0, dup_pool_mb=1, csv_interval=1):
+    """(kind, path, writer, kwargs) for every file of the dataset."""
+    files = [("raw", os.path.join(output_dir, "raw_baseline.dat"), write_raw,
+              {"size": max(BLOCK, int(RAW_BYTES * scale))})]
+    for i in range(log_files):
+        name = "app.log" if i == 0 else f"app{i + 1}.log"
+        files.append(("log", os.path.join(output_dir, name), write_log,
+                      {"size": int(LOG_BYTES * scale / log_files), "randomness": log_randomness}))
+    for i in range(bin_files):
+        files.append(("bin", os.path.join(output_dir, f"redundant{i + 1}.bin"), write_redundant,
+                      {"size": max(BLOCK, int(BIN_BYTES * scale / bin_files)), "duplicate_ratio": duplicate_ratio,
+                       "shift_rate": shift_rate, "pool_blocks": dup_pool_mb}))
+    files.append(("csv", os.path.join(output_dir, "sensor.csv"), write_time_series,
+                  {"rows": max(3600, int(CSV_ROWS * scale)), "interval": csv_interval}))
+    return files
+
+
+def _write(writer, path, seed, index, kwargs):
+    writer(path, seed=seed, index=index, **kwargs)
+    return path
+
+
+def generate(output_dir="test_data", seed=0, workers=None, **knobs):
+    """
+    Writes the dataset (see plan() for the knobs), one file per worker
+    process, largest first. Returns {kind: [paths]}.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    files = plan(output_dir, **knobs)
+    # Largest files first so the longest write starts immediately
+    order = sorted(range(len(files)), key=lambda i: -files[i][3].get("size", files[i][3].get("rows", 0) * 56))
+    with ProcessPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        for path in pool.map(_write, *zip(*[(files[i][2], files[i][1], seed, i, files[i][3]) for i in order])):
+            print(f"[OK] {path} ({os.path.getsize(path) / 1e6:.1f} MB)")
+    dataset = {}
+    for kind, path, _, _ in files:
+        dataset.setdefault(kind, []).append(path)
+    return dataset
+
+
+def set_ages(paths, profile, policy_path="policy.json", now=None):
+    """
+    Sets file mtimes to simulate ageing:
+      warm    every file but the raw baseline 2 days old (what
+              set_file_ages.ps1 did for the paper's run)
+      spread  files matched by the same policy rule cycle through that
+              rule's warm, cold and hot tiers (hot files are left new)
+    """
+    now = time.time() if now is None else now
+    if profile == "warm":
+        for path in paths:
+            age = 0 if path.endswith(".dat") else 2
+            os.utime(path, (now - age * 86400, now - age * 86400))
+        return
+
+    from retention_policy_file import PolicyEngine
+    engine = PolicyEngine(policy_path)
+    seen = {}
+    for path in paths:
+        index = engine.match_rule(path)
+        if index < 0:
+            continue
+        rule = engine.policy["rules"][index]
+        hot, warm, retention = rule["hot_tier_days"], rule["warm_tier_days"], rule["retention_days"]
+        tiers = [(lo, hi) for lo, hi in ((hot, hot + warm), (hot + warm, retention), (0, hot)) if hi > lo]
+        lo, hi = tiers[seen.get(index, 0) % len(tiers)]
+        seen[index] = seen.get(index, 0) + 1
+        # Hot files are simply new
+        age = lo + (hi - lo) * TIER_POSITION if lo else 0
+        os.utime(path, (now - age * 86400, now - age * 86400))
+
 
 # ===============================
 # Main
 # ===============================
 if __name__ == "__main__":
-    generate_raw_baseline_file() # New
-    generate_large_logs()
-    generate_redundant_bins()
-    generate_time_series_csv()
-    print("\n=== ~11GB Dataset Ready ===")
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Generate the synthetic test dataset (~11 GB at scale 1)")
+    parser.add_argument("--output-dir", default="test_data")
+    parser.add_argument("--scale", type=float, default=1.0, help="fraction of the 11 GB paper layout (default: 1)")
+    parser.add_argument("--seed", type=int, default=0, help="same seed, same bytes (default: 0)")
+    parser.add_argument("--workers", type=int, default=None, help="files written in parallel (default: CPU count)")
+    parser.add_argument("--log-files", type=int, default=2)
+    parser.add_argument("--bin-files", type=int, default=3)
+    parser.add_argument("--log-randomness", type=float, default=0.0,
+                        help="fraction of log lines with a random request id; 0 repeats the templates "
+                             "(most compressible), 1 tags every line (default: 0)")
+    parser.add_argument("--duplicate-ratio", type=float, default=1.0,
+                        help="fraction of 1 MB blocks in the .bin files copied from a shared pool (default: 1)")
+    parser.add_argument("--dup-pool-mb", type=int, default=1, help="size of the shared block pool (default: 1)")
+    parser.add_argument("--shift-rate", type=float, default=0.0,
+                        help="fraction of .bin blocks with a few random bytes inserted (default: 0)")
+    parser.add_argument("--csv-interval", type=int, default=1, help="seconds between CSV rows (default: 1)")
+    parser.add_argument("--age-profile", choices=["none", "warm", "spread"], default="none",
+                        help="set file mtimes: 'warm' ages everything but the raw baseline 2 days, "
+                             "'spread' spreads each rule's files over its tiers (default: none)")
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    dataset = generate(args.output_dir, seed=args.seed, workers=args.workers, scale=args.scale,
+                       log_files=args.log_files, bin_files=args.bin_files, log_randomness=args.log_randomness,
+                       duplicate_ratio=args.duplicate_ratio, shift_rate=args.shift_rate,
+                       dup_pool_mb=args.dup_pool_mb, csv_interval=args.csv_interval)
+    paths = [path for kind_paths in dataset.values() for path in kind_paths]
+    if args.age_profile != "none":
+        set_ages(paths, args.age_profile)
+    total = sum(os.path.getsize(p) for p in paths)
+    print(f"\n=== {total / 1e9:.2f} GB dataset ready in {time.perf_counter() - start:.1f}s ===")
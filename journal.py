@@ -0,0 +1,166 @@
+import json
+import os
+import time
+
+# Seconds between checkpoints of a long job
+CHECKPOINT_SECONDS = 30
+
+# In-progress outputs are written as <output>.part and renamed into place
+PART_SUFFIX = '.part'
+CHECKPOINT_SUFFIX = '.ckpt'
+
+
+def part_path(path):
+    return path + PART_SUFFIX
+
+
+def _fsync_dir(path):
+    if not hasattr(os, 'O_DIRECTORY'):
+        return  # Windows: directories can't be opened for fsync
+    fd = os.open(os.path.dirname(os.path.abspath(path)), os.O_RDONLY | os.O_DIRECTORY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def publish(tmp_path, path):
+    """
+    Moves a finished output into place: the data is made durable first, so
+    after a crash path holds either the old file or the complete new one.
+    """
+    with open(tmp_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+    _fsync_dir(path)
+
+
+class Journal:
+    """
+    Write-ahead log of pipeline jobs (JSON lines).
+
+    begin() is logged before a job is handed to a worker and finish() once
+    its result is back, so after a crash or kill the jobs that were begun
+    but never finished are known (interrupted) and the next run can
+    schedule them again, where their checkpoints let them resume. Only the
+    process that schedules jobs writes the journal; workers record their
+    progress in Checkpoint files. With dry_run=True the journal is only
+    read.
+    """
+
+    def __init__(self, path, dry_run=False):
+        self.path = path
+        self.dry_run = dry_run
+        self.interrupted = {}  # source path -> begin record of an unfinished job
+        if os.path.exists(path):
+            with open(path) as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        break  # torn last line
+                    if record['op'] == 'begin':
+                        self.interrupted[record['path']] = record
+                    else:
+                        self.interrupted.pop(record['path'], None)
+        if dry_run:
+            return
+        self._compact()
+        self._file = open(path, 'a')
+
+    def _compact(self):
+        # Finished jobs are forgotten; only the interrupted ones are carried over
+        tmp_path = part_path(self.path)
+        with open(tmp_path, 'w') as f:
+            f.writelines(json.dumps(record) + '\n' for record in self.interrupted.values())
+        publish(tmp_path, self.path)
+
+    def _append(self, records):
+        if self.dry_run:
+            return
+        self._file.write(''.join(json.dumps(record) + '\n' for record in records))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def begin(self, jobs):
+        """Logs the intent to run jobs: (source path, action) pairs."""
+        now = time.time()
+        self._append({'op': 'begin', 'path': path, 'action': action, 'time': now} for path, action in jobs)
+
+    def finish(self, path, ok=True):
+        """Logs that a job ended; ok=False if it failed (it is not resumed; the catalog keeps it due)."""
+        self._append([{'op': 'done' if ok else 'failed', 'path': path}])
+        self.interrupted.pop(path, None)
+
+    def close(self):
+        if self.dry_run:
+            return
+        self._file.close()
+        self._compact()
+
+
+class Checkpoint:
+    """
+    Saved progress of one long job, kept next to its source file as
+    <source>.ckpt.
+
+    A job reads state (None when starting fresh), calls save() with its
+    current state whenever due() and clear() once its outputs are in
+    place. The state is only trusted while the source file keeps the size
+    and mtime it had when the state was saved. interrupted is set when the
+    journal showed the job was cut short before; the job may then find side
+    effects of the lost run past its last checkpoint.
+
+    Parts (in-progress output files) registered with track() are removed
+    by discard() when the job fails.
+    """
+
+    def __init__(self, source_path, interval=CHECKPOINT_SECONDS, interrupted=False):
+        self.path = source_path + CHECKPOINT_SUFFIX
+        self.interval = interval
+        self.interrupted = interrupted
+        self.parts = []
+        st = os.stat(source_path)
+        self._source = [st.st_size, st.st_mtime_ns]
+        self._last = time.monotonic()
+        self.state = None
+        if os.path.exists(self.path):
+            try:
+                with open(self.path) as f:
+                    saved = json.load(f)
+            except ValueError:
+                saved = None
+            if saved and saved.get('source') == self._source:
+                self.state = saved['state']
+
+    def due(self):
+        return self.interval > 0 and time.monotonic() - self._last >= self.interval
+
+    def save(self, state):
+        """Durably records state; the job must have made its outputs durable up to it first."""
+        tmp_path = part_path(self.path)
+        with open(tmp_path, 'w') as f:
+            json.dump({'source': self._source, 'state': state}, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        self.state = state
+        self._last = time.monotonic()
+
+    def track(self, path):
+        """Registers an in-progress output for discard()."""
+        self.parts.append(path)
+        return path
+
+    def clear(self):
+        """Forgets the saved state once the job has finished."""
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        self.state = None
+
+    def discard(self):
+        """Removes the saved state and every tracked part after a failure."""
+        for path in self.parts + [self.path]:
+            if os.path.exists(path):
+                os.remove(path)
+        self.state = None
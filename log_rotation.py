@@ -1,42 +1,369 @@
+import argparse
+import fnmatch
 import os
-import glob
-import gzip
-import shutil
+import re
+import threading
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-def compress_file(file_path, level=9):
-    """Compress a file with gzip and remove the original."""
-    with open(file_path, 'rb') as f_in:
-        with gzip.open(file_path + '.gz', 'wb', compresslevel=level) as f_out:
-            shutil.copyfileobj(f_in, f_out)
-    os.remove(file_path)
-    print(f"Compressed: {file_path} → {file_path}.gz")
+import compression
+import journal
+import seekable_gzip
+import telemetry
+
+# Rotated segments are named <log>.<stamp>, or <log>.<stamp>-<n> when several
+# rotations fall in the same second; compressed ones add .gz (and .gz.idx
+# when seekable).
+STAMP_FORMAT = '%Y-%m-%d_%H%M%S'
+_SEGMENT = re.compile(r'^(?P<log>.+)\.(?P<stamp>\d{4}-\d\d-\d\d_\d{6})(?:-\d+)?(?P<gz>\.gz)?$')
+
+# Bytes read per call to the rate limiter while compressing
+THROTTLE_CHUNK = 256 * 1024
+# Nice value added to compression threads so active writers keep the CPU
+COMPRESS_NICENESS = 10
+
+class RateLimiter:
+    """
+    Token bucket shared by threads: consume(n) blocks until n bytes fit
+    within rate bytes per second. A rate of None or 0 never blocks.
+    """
+
+    def __init__(self, rate, burst=None):
+        self.rate = rate
+        self.burst = burst or rate
+        self._tokens = self.burst
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+
+    def consume(self, n):
+        if not self.rate:
+            return
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+            self._last = now
+            self._tokens -= n
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0
+        if wait:
+            time.sleep(wait)
+
+
+class _ThrottledReader:
+    """Read-only file wrapper that charges every read to a RateLimiter and drops read pages from the cache."""
+
+    def __init__(self, f, limiter):
+        self._f = f
+        self._limiter = limiter
+        self._done = 0
+
+    def read(self, n=-1):
+        parts = []
+        while n < 0 or n > 0:
+            chunk = self._f.read(THROTTLE_CHUNK if n < 0 else min(n, THROTTLE_CHUNK))
+            if not chunk:
+                break
+            self._limiter.consume(len(chunk))
+            parts.append(chunk)
+            if n > 0:
+                n -= len(chunk)
+        data = b''.join(parts)
+        if hasattr(os, 'posix_fadvise') and data:
+            # A rotated segment is read once; don't push writers' pages out of the cache
+            os.posix_fadvise(self._f.fileno(), self._done, len(data), os.POSIX_FADV_DONTNEED)
+        self._done += len(data)
+        return data
+
+
+def _lower_thread_priority():
+    # On Linux the nice value is per thread, so this only affects the pool
+    try:
+        os.setpriority(os.PRIO_PROCESS, threading.get_native_id(), COMPRESS_NICENESS)
+    except (AttributeError, OSError):
+        pass
+
+
+class LogLifecycleService:
+    """
+    Long-running rotation, compression and retention for log files.
+
+    targets is a list of (directory, pattern) pairs; every file in the
+    directory whose name matches the pattern (e.g. '*.log') is an active
+    log. Each cycle lists every directory once and:
+
+      * rotates an active log (renames it to <log>.<stamp>) once it reaches
+        rotate_bytes or rotate_seconds have passed since its last rotation;
+        writers are expected to reopen their log, as with logrotate
+      * queues rotated segments older than compress_after seconds on a
+        bounded background pool; at most max_backlog segments are queued at
+        once and the rest wait for a later cycle
+      * deletes segments (compressed or not) older than retain_seconds
+
+    Compression reads are limited to io_rate bytes per second and run at a
+    lower CPU priority, so a burst of rotations can't starve the writers.
+    """
+
+    def __init__(self, targets, rotate_bytes=100 * 1024 * 1024, rotate_seconds=24 * 3600, compress_after=0,
+                 retain_seconds=30 * 24 * 3600, level=9, seekable=False, compress_workers=1, max_backlog=4,
+                 io_rate=None, interval=60):
+        self.targets = [(directory, pattern) for directory, pattern in targets]
+        self.rotate_bytes = rotate_bytes
+        self.rotate_seconds = rotate_seconds
+        self.compress_after = compress_after
+        self.retain_seconds = retain_seconds
+        self.level = level
+        self.seekable = seekable
+        self.max_backlog = max_backlog
+        self.interval = interval
+        self.limiter = RateLimiter(io_rate)
+        self._pool = ThreadPoolExecutor(max_workers=compress_workers, thread_name_prefix='log-compress',
+                                        initializer=_lower_thread_priority)
+        self._pending = set()
+        self._lock = threading.Lock()
+        # Time each active log last rotated, and when it was first seen
+        self._rotated_at = {}
+        self._first_seen = {}
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    # --- one cycle ----------------------------------------------------
+
+    @telemetry.staged('log_cycle')
+    def run_cycle(self, now=None):
+        """
+        Runs one rotate/compress/prune pass over every target directory.
+        Returns counts of the rotated, queued, deferred (backlog full) and
+        pruned segments.
+        """
+        now = time.time() if now is None else now
+        stats = {'rotated': 0, 'queued': 0, 'deferred': 0, 'pruned': 0}
+        for directory, patterns in self._by_directory().items():
+            try:
+                with os.scandir(directory) as it:
+                    entries = list(it)
+            except FileNotFoundError:
+                continue
+            active, segments = self._split(entries, patterns)
+            newest = {}
+            for path, log, stamp, compressed in segments:
+                newest[log] = max(newest.get(log, 0), stamp)
+
+            for entry in active:
+                rotated = self._maybe_rotate(entry, newest.get(entry.path), now)
+                if rotated:
+                    stats['rotated'] += 1
+                    segments.append((rotated[0], entry.path, rotated[1], False))
+
+            for path, log, stamp, compressed in segments:
+                age = now - stamp
+                if age > self.retain_seconds:
+                    self._prune(path, compressed)
+                    stats['pruned'] += 1
+                elif not compressed and age >= self.compress_after:
+                    outcome = self._submit(path)
+                    if outcome:
+                        stats[outcome] += 1
+        for outcome, n in stats.items():
+            telemetry.count('log_segments_total', n, outcome=outcome)
+        telemetry.gauge('log_compress_backlog', self.backlog)
+        return stats
+
+    def _by_directory(self):
+        directories = {}
+        for directory, pattern in self.targets:
+            directories.setdefault(directory, []).append(pattern)
+        return directories
+
+    def _split(self, entries, patterns):
+        """Active logs (DirEntry) and rotated segments (path, log path, stamp, compressed) of one listing."""
+        active, segments = [], []
+        for entry in entries:
+            name = entry.name
+            if name.endswith(('.tmp', '.idx', journal.PART_SUFFIX)) or not entry.is_file(follow_symlinks=False):
+                continue
+            m = _SEGMENT.match(name)
+            if m:
+                stamp = datetime.strptime(m.group('stamp'), STAMP_FORMAT).timestamp()
+                log = os.path.join(os.path.dirname(entry.path), m.group('log'))
+                segments.append((entry.path, log, stamp, bool(m.group('gz'))))
+            elif any(fnmatch.fnmatch(name, pattern) for pattern in patterns):
+                active.append(entry)
+        return active, segments
+
+    def _maybe_rotate(self, entry, last_segment, now):
+        st = entry.stat()
+        if not st.st_size:
+            return None
+        # The segment started at our last rotation, else when the previous
+        # segment stopped being written; with neither, when we first saw the
+        # log (or its last write, so an idle log is rotated by a one-shot run)
+        started = (self._rotated_at.get(entry.path) or last_segment
+                   or min(self._first_seen.setdefault(entry.path, now), st.st_mtime))
+        if st.st_size < self.rotate_bytes and now - started < self.rotate_seconds:
+            return None
+
+        base = f"{entry.path}.{datetime.fromtimestamp(st.st_mtime).strftime(STAMP_FORMAT)}"
+        segment, n = base, 0
+        while os.path.exists(segment) or os.path.exists(segment + '.gz'):
+            n += 1
+            segment = f"{base}-{n}"
+        os.rename(entry.path, segment)
+        self._rotated_at[entry.path] = now
+        print(f"Rotated {entry.path} → {segment}")
+        return segment, st.st_mtime
+
+    def _prune(self, path, compressed):
+        with self._lock:
+            if path in self._pending:
+                return
+        os.remove(path)
+        if compressed and os.path.exists(seekable_gzip.index_path(path)):
+            os.remove(seekable_gzip.index_path(path))
+        print(f"Pruned old log file: {path}")
+
+    # --- background compression -------------------------------------
+
+    def _submit(self, path):
+        """Queues a segment for compression: 'queued', 'deferred' if the backlog is full, None if already queued."""
+        with self._lock:
+            if path in self._pending:
+                return None
+            if len(self._pending) >= self.max_backlog:
+                return 'deferred'
+            self._pending.add(path)
+        self._pool.submit(self._compress, path)
+        return 'queued'
+
+    @telemetry.staged('log_compress')
+    def _compress(self, path):
+        gz_path = path + '.gz'
+        idx_path = seekable_gzip.index_path(gz_path)
+        tmp_path, idx_tmp_path = journal.part_path(gz_path), journal.part_path(idx_path)
+        try:
+            with open(path, 'rb') as f, open(tmp_path, 'wb') as f_out:
+                f_in = _ThrottledReader(f, self.limiter)
+                if self.seekable:
+                    seekable_gzip.write_seekable_gzip(f_in, f_out, idx_tmp_path, level=self.level)
+                else:
+                    compression.write_gzip_blocks(f_in, f_out, level=self.level, workers=1)
+            # The index first: a .gz is never in place without its complete index
+            if self.seekable:
+                journal.publish(idx_tmp_path, idx_path)
+            journal.publish(tmp_path, gz_path)
+            telemetry.count('bytes_in_total', os.path.getsize(path), stage='log_compress')
+            telemetry.count('bytes_out_total', os.path.getsize(gz_path), stage='log_compress')
+            os.remove(path)
+            print(f"Compressed: {path} → {gz_path}")
+        except Exception as e:
+            print(f"Error compressing {path}: {e}")
+            for part in (tmp_path, idx_tmp_path):
+                if os.path.exists(part):
+                    os.remove(part)
+        finally:
+            with self._lock:
+                self._pending.discard(path)
+
+    @property
+    def backlog(self):
+        """Segments queued or being compressed."""
+        with self._lock:
+            return len(self._pending)
+
+    def drain(self):
+        """Waits until every queued segment is compressed."""
+        while self.backlog:
+            time.sleep(0.05)
+
+    # --- service loop -------------------------------------------------
+
+    def start(self):
+        """Runs a cycle every interval seconds on a background thread and returns immediately."""
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name='log-lifecycle', daemon=True)
+            self._thread.start()
+        return self
+
+    def _loop(self):
+        while not self._stop.is_set():
+            try:
+                self.run_cycle()
+            except Exception as e:
+                print(f"Log lifecycle cycle failed: {e}")
+            self._stop.wait(self.interval)
+
+    def stop(self):
+        """Stops the cycle thread; queued compressions keep running until close()."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def close(self):
+        """Stops the service and waits for queued compressions to finish."""
+        self.stop()
+        self._pool.shutdown(wait=True)
+
 
 def manage_logs(log_dir, rotation_days=1, compression_days=7, retention_days=30):
     """
     Rotates, compresses, and prunes log files in a directory.
+
+    One-shot run of LogLifecycleService over app.log, waiting for the
+    compression to finish.
     """
-    # Rotate active log file if it's older than rotation_days
-    active_log = os.path.join(log_dir, 'app.log')
-    if os.path.exists(active_log):
-        mod_time = os.path.getmtime(active_log)
-        if (time.time() - mod_time) / (24 * 3600) > rotation_days:
-            timestamp = datetime.fromtimestamp(mod_time).strftime('%Y-%m-%d_%H%M%S')
-            rotated_log_path = os.path.join(log_dir, f'app.log.{timestamp}')
-            os.rename(active_log, rotated_log_path)
-            print(f"Rotated {active_log} → {rotated_log_path}")
-
-    # Compress old, uncompressed logs (but not already compressed ones)
-    for log_file in glob.glob(os.path.join(log_dir, 'app.log.*')):
-        if not log_file.endswith('.gz'):
-            mod_time = os.path.getmtime(log_file)
-            if (time.time() - mod_time) / (24 * 3600) > compression_days:
-                compress_file(log_file, level=9)
-
-    # Prune logs older than retention_days
-    for log_file in glob.glob(os.path.join(log_dir, 'app.log.*.gz')):
-        mod_time = os.path.getmtime(log_file)
-        if (time.time() - mod_time) / (24 * 3600) > retention_days:
-            os.remove(log_file)
-            print(f"Pruned old log file: {log_file}")
+    with LogLifecycleService([(log_dir, 'app.log')], rotate_bytes=float('inf'),
+                             rotate_seconds=rotation_days * 24 * 3600,
+                             compress_after=compression_days * 24 * 3600,
+                             retain_seconds=retention_days * 24 * 3600) as service:
+        service.max_backlog = float('inf')
+        service.run_cycle()
+
+
+def _parse_target(value):
+    directory, _, pattern = value.partition(':')
+    return directory, pattern or '*.log'
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Rotate, compress and prune log files in the background")
+    parser.add_argument("targets", nargs="+", type=_parse_target, metavar="DIR[:PATTERN]",
+                        help="log directory and file pattern (default pattern: *.log)")
+    parser.add_argument("--rotate-mb", type=float, default=100, help="rotate logs at this size (default: 100)")
+    parser.add_argument("--rotate-hours", type=float, default=24,
+                        help="rotate logs this long after their last rotation (default: 24)")
+    parser.add_argument("--compress-after-hours", type=float, default=0,
+                        help="compress rotated segments this long after rotation (default: 0)")
+    parser.add_argument("--retention-days", type=float, default=30, help="delete segments after (default: 30)")
+    parser.add_argument("--seekable", action="store_true", help="write seekable gzip (see seekable_gzip.py)")
+    parser.add_argument("--compress-workers", type=int, default=1, help="compression threads (default: 1)")
+    parser.add_argument("--max-backlog", type=int, default=4,
+                        help="segments queued for compression at once (default: 4)")
+    parser.add_argument("--io-mb-per-s", type=float, default=None,
+                        help="limit compression reads to this rate (default: unlimited)")
+    parser.add_argument("--interval", type=float, default=60, help="seconds between cycles (default: 60)")
+    parser.add_argument("--metrics", metavar="PATH", default=None,
+                        help="record telemetry and rewrite PATH in Prometheus text format every interval")
+    args = parser.parse_args()
+    if args.metrics:
+        telemetry.enable()
+
+    service = LogLifecycleService(
+        args.targets, rotate_bytes=args.rotate_mb * 1024 * 1024, rotate_seconds=args.rotate_hours * 3600,
+        compress_after=args.compress_after_hours * 3600, retain_seconds=args.retention_days * 24 * 3600,
+        seekable=args.seekable, compress_workers=args.compress_workers, max_backlog=args.max_backlog,
+        io_rate=args.io_mb_per_s and args.io_mb_per_s * 1024 * 1024, interval=args.interval,
+    ).start()
+    try:
+        while True:
+            time.sleep(args.interval if args.metrics else 3600)
+            if args.metrics:
+                telemetry.write_prometheus(args.metrics)
+    except KeyboardInterrupt:
+        service.close()
@@ -1,32 +1,64 @@
 import os
+import re
 import time
+import argparse
+import contextlib
+import fnmatch
 from retention_policy_file import PolicyEngine
 import compression
 import Deduplication
 import Aggregation
 import log_rotation # This isn't strictly needed for the table, but good to have
-import pandas as pd
+from pipeline_executor import PipelineExecutor
+from catalog import FileCatalog
+import archive_store
+import journal
+import planner
+import seekable_gzip
+import telemetry
 
 # Track file size changes
 report = []
 
+# Write-ahead log of the jobs handed to workers (see journal.py)
+JOURNAL_PATH = "pipeline.journal"
+# Measured cost and savings per data type and action, used to plan runs (see planner.py)
+COST_MODEL_PATH = "cost_model.json"
+
+# Rollup outputs: sensor_1h_agg.csv, sensor_agg.col, ...
+AGG_OUTPUT = re.compile(r'(_\d+[a-z]+)?_agg\.(csv|col)$')
+
+def source_path(path):
+    """
+    The file an output of a warm-tier action (.gz, .meta, rollup) was made
+    from, or path itself. Outputs keep their source's mtime and are
+    classified under its path, so they reach its cold and expired tiers.
+    """
+    if path.endswith((".gz", ".bz2", ".xz", ".meta")):
+        return os.path.splitext(path)[0]
+    m = AGG_OUTPUT.search(path)
+    if m:
+        return path[:m.start()] + ".csv"
+    return path
+
 def get_size(path):
     return os.path.getsize(path) if os.path.exists(path) else 0
 
 # Store per-data-type stats
 summary_stats = {
-    "Raw Data": {"technique": "None", "orig": 0, "final": 0, "cpu_times": [], "latencies": []},
-    "Redundant Data": {"technique": "Deduplication", "orig": 0, "final": 0, "cpu_times": [], "latencies": []},
-    "Log Data": {"technique": "Gzip (level 9)", "orig": 0, "final": 0, "cpu_times": [], "latencies": []},
-    "Time-Series Data": {"technique": "Hourly Aggregation", "orig": 0, "final": 0, "cpu_times": [], "latencies": []},
+    "Raw Data": {"technique": "None", "orig": 0, "final": 0, "cpu": 0.0, "wall": 0.0, "latencies": []},
+    "Redundant Data": {"technique": "Deduplication", "orig": 0, "final": 0, "cpu": 0.0, "wall": 0.0, "latencies": []},
+    "Log Data": {"technique": "Adaptive Compression", "orig": 0, "final": 0, "cpu": 0.0, "wall": 0.0, "latencies": []},
+    "Time-Series Data": {"technique": "Rollup Aggregation", "orig": 0, "final": 0, "cpu": 0.0, "wall": 0.0,
+                         "latencies": []},
 }
 
 def classify_file(file):
-    if file.endswith(".log") or file.endswith(".gz"):
+    if file.endswith((".log", ".gz", ".bz2", ".xz")):
         return "Log Data"
     elif file.endswith(".bin") or file.endswith(".meta"):
         return "Redundant Data"
-    elif file.endswith(".csv") or file.endswith("_agg.csv"):
+    elif file.endswith(".csv") or file.endswith("_agg.col"):
         return "Time-Series Data"
     elif file.endswith(".dat"):
         return "Raw Data"
@@ -38,109 +70,415 @@ def measure_raw_latency(file_path):
     if not file_path or not os.path.exists(file_path):
         return 0.0
     try:
-        start = time.time()
+        start = time.perf_counter()
         with open(file_path, "rb") as f:
             f.read(4096)  # read first 4KB
-        end = time.time()
+        end = time.perf_counter()
         return (end - start) * 1000  # ms
     except Exception as e:
         print(f"Error measuring raw latency: {e}")
         return 0.0
 
-def run_pipeline():
+def process_file(path, action, options=None):
+    """
+    Applies a single policy action to a file.
+    options carries per-job settings (compress_threads, the rule's chunking
+    and compression settings, the rollup resolutions it keeps for the
+    file's tier, and whether to record telemetry or profile this file).
+    Runs inside a pipeline worker, so it only returns its results; merging
+    into `report` and `summary_stats` is done by the caller. With telemetry
+    on, the metrics the job recorded come back as result["metrics"].
+    Compression, deduplication and aggregation checkpoint every
+    options["checkpoint_seconds"] and resume from an earlier run's
+    checkpoint; options["interrupted"] says the journal saw that run cut short.
+    """
+    options = options or {}
+    if options.get("telemetry") and not telemetry.enabled:
+        # Spawned worker processes don't inherit the switch
+        telemetry.enable()
+    profile = options.get("profile")
+    scope = telemetry.profile(path, profile["dir"], profile["mode"]) if profile else contextlib.nullcontext()
+    with scope, telemetry.stage("job", action=action):
+        result = _apply_action(path, action, options)
+    if telemetry.enabled:
+        result["metrics"] = telemetry.drain()
+    return result
+
+def _apply_action(path, action, options):
+    original_size = get_size(path)
+    # process_time counts the whole worker process, including helper
+    # threads (block-parallel gzip); with the thread executor it also
+    # counts other jobs running at the same time
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    final_size = original_size
+    final_path = path
+    latency = 0.0
+    details = None
+    error = None
+    checkpoint = None
+
+    try:
+        if action in ("compress", "deduplicate", "aggregate"):
+            checkpoint = journal.Checkpoint(path, options.get("checkpoint_seconds", journal.CHECKPOINT_SECONDS),
+                                            interrupted=options.get("interrupted", False))
+
+        if action == "compress":
+            settings = options.get("compression") or {}
+            if settings.get("mode") == "adaptive":
+                final_path, final_size, details = compression.compress_adaptive(
+                    path, settings, workers=options.get("compress_threads", 1), checkpoint=checkpoint)
+            else:
+                final_path, final_size = compression.compress_file(
+                    path, level=settings.get("level", 9), workers=options.get("compress_threads", 1),
+                    codec=settings.get("codec", "gzip"), seekable=settings.get("seekable", False),
+                    checkpoint=checkpoint)
+            latency = compression.measure_decompression_latency(final_path)
+
+        elif action == "deduplicate":
+            # Returns the path to the .meta file and the true final size
+            final_path, final_size = Deduplication.deduplicate_file(path, chunking=options.get("chunking"),
+                                                                    checkpoint=checkpoint)
+            latency = Deduplication.measure_read_latency(final_path)
+
+        elif action == "aggregate":
+            if path.endswith(".csv") and options.get("rollups"):
+                # One pass builds every resolution the rule keeps for this tier;
+                # all of them count towards the final size
+                rollups = Aggregation.build_rollups(path, options["rollups"],
+                                                    output_format=options.get("aggregate_format", "csv"),
+                                                    checkpoint=checkpoint)
+                final_path = rollups[0][0]
+                final_size = sum(size for _, size in rollups)
+                latency = measure_raw_latency(final_path)
+            elif path.endswith(".csv"):
+                output_format = options.get("aggregate_format", "csv")
+                final_path = path[:-len(".csv")] + "_agg." + Aggregation.OUTPUT_FORMATS[output_format][0]
+                # aggregate_timeseries_data returns the final path and final_size
+                final_path, final_size = Aggregation.aggregate_timeseries_data(path, final_path,
+                                                                               output_format=output_format,
+                                                                               checkpoint=checkpoint)
+                latency = measure_raw_latency(final_path) # Aggregated file is raw, so this is fine
+
+        elif action == "delete":
+            if path.endswith(".meta"):
+                # Releases the file's chunks in the store as well
+                Deduplication.delete_file(path)
+            else:
+                os.remove(path)
+                if os.path.exists(seekable_gzip.index_path(path)):
+                    os.remove(seekable_gzip.index_path(path))
+                print(f"Deleted {path}")
+            final_size = 0
+
+        elif action == "none":
+            # This is our baseline
+            latency = measure_raw_latency(path)
+
+    except Exception as e:
+        print(f"[ERROR] Failed to process {path}: {e}")
+        error = str(e)
+        # A failure, unlike a crash, would fail again; nothing is kept to resume
+        if checkpoint is not None:
+            checkpoint.discard()
+
+    return {
+        "final_path": final_path,
+        "final_size": final_size,
+        "elapsed": time.perf_counter() - start_wall,
+        "cpu": time.process_time() - start_cpu,
+        "latency": latency,
+        "details": details,
+        "error": error,
+    }
+
+def archive_files(jobs):
+    """
+    Packs the files of all archive jobs into the archive store in one batch.
+    A deduplicated file is restored from its recipe (.meta) and archived
+    under its original path, then the recipe is deleted, releasing its
+    chunks; a seekable .gz drops its frame index. Returns one
+    process_file-style result per job, with the size of the file as archived
+    (for a recipe, the restored file) as its "original_size"; the batch's
+    time is split between the files by that size.
+    """
+    start_wall, start_cpu = time.perf_counter(), time.process_time()
+    store = archive_store.ArchiveStore()
+    recipes = [job["path"] for job in jobs if job["path"].endswith(".meta")]
+    restored = []
+    try:
+        if recipes:
+            # With process workers this process's copy of the chunk store is stale
+            Deduplication.reload_store()
+        paths, sizes = [], []
+        for job in jobs:
+            path, size = job["path"], job["size"]
+            if path.endswith(".meta"):
+                path = Deduplication.restore_file(job["path"])
+                restored.append(path)
+                st = os.stat(job["path"])
+                os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+                size = get_size(path)
+            paths.append(os.path.normpath(path))
+            sizes.append(size)
+        stored = store.archive(paths)
+    except Exception as e:
+        print(f"[ERROR] Failed to archive {len(jobs)} files: {e}")
+        for path in restored:
+            if os.path.exists(path):
+                os.remove(path)
+        return [{"final_path": job["path"], "final_size": job["size"], "elapsed": 0.0, "cpu": 0.0,
+                 "latency": 0.0, "details": None, "error": str(e)} for job in jobs]
+    for recipe_path in recipes:
+        Deduplication.delete_file(recipe_path)
+    for path in paths:
+        if os.path.exists(seekable_gzip.index_path(path)):
+            os.remove(seekable_gzip.index_path(path))
+    elapsed, cpu = time.perf_counter() - start_wall, time.process_time() - start_cpu
+    total_size = sum(sizes) or 1
+
+    results = []
+    for path, size in zip(paths, sizes):
+        volume = store.volume_of(path)
+        results.append({
+            "final_path": volume,
+            "original_size": size,
+            "final_size": round(stored[path]),
+            "elapsed": elapsed * size / total_size,
+            "cpu": cpu * size / total_size,
+            "latency": archive_store.measure_read_latency(store, path),
+            "details": {"volume": volume},
+        })
+    return results
+
+def run_pipeline(workers=None, executor_kind="process", compress_threads=1, clean_store=False,
+                 full_scan=False, gc_seconds=10.0, telemetry_dir=None, profile_pattern=None,
+                 profile_mode="cprofile", checkpoint_seconds=journal.CHECKPOINT_SECONDS, cpu_budget=None,
+                 io_budget=None, deadline=None, plan_only=False):
+    """
+    Runs one pass of the policy over test_data.
+    With a cpu_budget (CPU seconds), io_budget (bytes read and written) or
+    deadline (seconds from now), the due jobs are ranked by predicted bytes
+    saved per unit of budget and only those that fit are run, best first;
+    the rest stay due for the next run. No job starts after the deadline.
+    plan_only prints the predicted schedule and changes no file.
+    Jobs are logged to a journal before they start, and long jobs
+    checkpoint every checkpoint_seconds, so a run that was killed can be
+    restarted: jobs it left unfinished are scheduled again and resume from
+    their last checkpoint.
+    With telemetry_dir, per-stage metrics are recorded and written there as
+    metrics.jsonl (appended per run) and metrics.prom (Prometheus text
+    format). Files whose name matches profile_pattern are profiled one by
+    one into telemetry_dir/profiles (or ./profiles).
+    """
     global report
+    run_deadline = None if deadline is None else time.time() + deadline
+    if telemetry_dir:
+        telemetry.enable()
     engine = PolicyEngine("policy.json")
     print("\n=== Starting Hybrid Data Reduction Pipeline ===\n")
 
-    # Clear dedupe store for a clean run
-    if os.path.exists(Deduplication.chunk_store_dir):
-        import shutil
-        shutil.rmtree(Deduplication.chunk_store_dir)
-        os.makedirs(Deduplication.chunk_store_dir, exist_ok=True)
-        Deduplication.hash_index = {}
+    # The chunk store persists across runs so new files dedup against old ones;
+    # only clear it when a clean experiment run is requested
+    if clean_store and plan_only:
+        print("Plan only: the chunk store is not cleared.")
+    elif clean_store and os.path.exists(Deduplication.chunk_store_dir):
+        Deduplication.reset_store()
         print("Cleared deduplication chunk store for clean test run.")
 
-    for file in os.listdir("test_data"):
-        path = os.path.join("test_data", file)
-        if not os.path.isfile(path):
-            continue
+    # Only files that are new, changed, or due to cross a tier boundary since
+    # the last run are classified and processed; the catalog remembers the rest
+    catalog = FileCatalog("test_data", dry_run=plan_only)
+    now = time.time()
+    changed = catalog.scan(full=full_scan)
+    due = catalog.due(now, exclude=[path for path, _ in changed])
+    # Jobs a killed run left unfinished; the catalog may see nothing new in their files
+    job_journal = journal.Journal(JOURNAL_PATH, dry_run=plan_only)
+    listed = {path for path, _ in changed + due}
+    resumed = []
+    for path in list(job_journal.interrupted):
+        if not os.path.exists(path):
+            job_journal.finish(path)  # finished; only its "done" record was lost
+        elif path not in listed:
+            resumed.append((path, os.stat(path)))
+    if job_journal.interrupted:
+        print(f"Journal: {len(job_journal.interrupted)} jobs interrupted by the last run will be retried.")
+    print(f"Catalog: {len(changed)} new or changed, {len(due)} due for a tier transition, "
+          f"{len(catalog)} files tracked.")
 
-        original_size = get_size(path)
-        data_type = classify_file(file)
-        
-        # Skip files that are products of other files for this test
-        if file.endswith(".gz") or file.endswith(".meta") or file.endswith("_agg.csv"):
-            continue
-
-        summary_stats[data_type]["orig"] += original_size
+    # Sidecars and in-progress files go with the file they belong to
+    sidecars = (".gz.idx", journal.PART_SUFFIX, journal.CHECKPOINT_SUFFIX)
+    entries = [(path, st) for path, st in changed + due + resumed if not path.endswith(sidecars)]
+    statuses = engine.classify_many([(source_path(path), st) for path, st in entries], now)
+    catalog.update_status([(path, status) for (path, _), status in zip(entries, statuses) if status])
 
-        status = engine.get_file_status(path)
+    jobs = []
+    for (path, st), status in zip(entries, statuses):
         if not status:
             continue
-
         action = status["action"]
+        rule = engine.get_rule(status["rule"]) or {}
+        rollups = rule.get("rollup_resolutions", {}).get(status["tier"])
+        # A tier that lists rollup resolutions keeps those rollups in place
+        # and drops the finer ones, so less detail is kept as data ages
+        rollup = AGG_OUTPUT.search(path)
+        if rollup and rollup.group(1) and rollups is not None and action != "delete":
+            if rollup.group(1)[1:] in [freq.lower() for freq in rollups]:
+                continue
+            action = "delete"
+        # An output already had its warm-tier action; only archiving or deleting it is left
+        if source_path(path) != path and action not in ("archive", "delete"):
+            continue
+        file = os.path.basename(path)
+        original_size = st.st_size
+        data_type = classify_file(file)
+
         print(f"[POLICY] {path} (Age: {status['age_days']:.1f}d) → Tier: {status['tier']}, Action: {action}")
 
-        start_cpu = time.time()
-        final_size = original_size
-        final_path = path
-        latency = 0.0
-
-        try:
-            if action == "compress":
-                final_path, final_size = compression.compress_file(path, level=9)
-                latency = compression.measure_decompression_latency(final_path)
-
-            elif action == "deduplicate":
-                # Returns the path to the .meta file and the true final size
-                final_path, final_size = Deduplication.deduplicate_file(path)
-                latency = Deduplication.measure_read_latency(final_path)
-            
-            elif action == "aggregate":
-                if path.endswith(".csv"):
-                    final_path = path.replace(".csv", "_agg.csv")
-                    # aggregate_timeseries_data returns the final path and final_size
-                    final_path, final_size = Aggregation.aggregate_timeseries_data(path, final_path)
-                    latency = measure_raw_latency(final_path) # Aggregated file is raw, so this is fine
-
-            elif action == "delete":
-                os.remove(path)
-                print(f"Deleted {path}")
-                final_size = 0
-            
-            elif action == "none":
-                # This is our baseline
-                latency = measure_raw_latency(path)
+        options = {
+            "compress_threads": compress_threads,
+            "chunking": rule.get("chunking"),
+            "compression": rule.get("compression"),
+            "rollups": rollups,
+            "aggregate_format": rule.get("aggregate_format", "csv"),
+            "telemetry": telemetry.enabled,
+            "checkpoint_seconds": checkpoint_seconds,
+            "interrupted": path in job_journal.interrupted,
+        }
+        if profile_pattern and fnmatch.fnmatch(file, profile_pattern):
+            options["profile"] = {"dir": os.path.join(telemetry_dir or ".", "profiles"), "mode": profile_mode}
+
+        jobs.append({
+            "file": file,
+            "path": path,
+            "data_type": data_type,
+            "size": original_size,
+            "action": action,
+            "status": status,
+            "args": (path, action, options),
+            # All dedup jobs append to the one chunk store, so they run
+            # serially on one worker instead of racing on its pack files
+            # (deleting a recipe releases its chunks, so it joins them)
+            "lane": "deduplicate" if action == "deduplicate" or path.endswith(".meta") else None,
+        })
+
+    executor = PipelineExecutor(workers=workers, kind=executor_kind)
+
+    def defer(deferred):
+        # Due again at once, so the next run picks them up first thing
+        catalog.update_status([(job["path"], dict(job["status"], next_transition=now)) for job in deferred])
 
-        except Exception as e:
-            print(f"[ERROR] Failed to process {path}: {e}")
+    # With a budget, spend it where the predicted savings per unit of cost are highest
+    cost_model = planner.CostModel(COST_MODEL_PATH)
+    budgeted = any(limit is not None for limit in (cpu_budget, io_budget, deadline))
+    deferred = []
+    if budgeted or plan_only:
+        estimates = [cost_model.estimate(job) for job in jobs]
+        remaining = None if run_deadline is None else max(0.0, run_deadline - time.time())
+        selected, deferred = planner.plan(jobs, estimates, cpu_budget=cpu_budget, io_budget=io_budget,
+                                          deadline=remaining, workers=executor.workers)
+        if plan_only:
+            print("\n=== Plan (dry run, no file is changed) ===")
+            planner.print_plan(selected, deferred, executor.workers)
+            catalog.close()
+            return
+        jobs = [job for job, _ in selected]
+        deferred = [job for job, _ in deferred]
+        defer(deferred)
+        print(f"Plan: running {len(jobs)} jobs within budget, "
+              f"{sum(e['saved'] for _, e in selected) / 1e6:.1f} MB of predicted savings; "
+              f"{len(deferred)} deferred.")
 
-        end_cpu = time.time()
-        elapsed_cpu = end_cpu - start_cpu
+    # An interrupted job the policy no longer schedules is dropped
+    scheduled = {job["path"] for job in jobs + deferred}
+    for path in [path for path in job_journal.interrupted if path not in scheduled]:
+        job_journal.finish(path)
+
+    # Cold files are archived together in one batch after the other jobs,
+    # so they go into a few large sequential volume writes
+    archive_jobs = [job for job in jobs if job["action"] == "archive"]
+    jobs = [job for job in jobs if job["action"] != "archive"]
+
+    def on_result(seq, total, job, result):
+        # An archived recipe is measured against the file restored from it
+        original_size = result.get("original_size", job["size"])
+        job_journal.finish(job["path"], ok=not result.get("error"))
+        if not result.get("error"):
+            cost_model.record(job["data_type"], job["action"], original_size, result["final_size"],
+                              result["cpu"], result["elapsed"])
+        telemetry.merge(result.get("metrics"))
+        telemetry.count("pipeline_jobs_total", action=job["action"])
+        # Jobs not finished yet, sampled each time one finishes
+        telemetry.observe("pipeline_queue_depth", total - seq, buckets=telemetry.COUNT_BUCKETS)
+        if result.get("error"):
+            # Left due, so the next run retries it rather than waiting for its next tier boundary
+            defer([job])
+        elif job["action"] != "none":
+            catalog.record_action(job["path"], job["action"], details=result["details"])
 
         report.append({
-            "file": file,
+            "file": job["file"],
             "original_size": original_size,
-            "final_size": final_size,
-            "action": action
+            "final_size": result["final_size"],
+            "action": job["action"]
         })
 
-        summary_stats[data_type]["final"] += final_size
-        
-        size_gb = (original_size / 1e9) if original_size > 0 else 1
-        cpu_per_gb = elapsed_cpu / size_gb
-        summary_stats[data_type]["cpu_times"].append(cpu_per_gb)
+        stats = summary_stats[job["data_type"]]
+        stats["orig"] += original_size
+        stats["final"] += result["final_size"]
+
+        stats["cpu"] += result["cpu"]
+        stats["wall"] += result["elapsed"]
+
+        if result["latency"] > 0:
+            stats["latencies"].append(result["latency"])
 
-        if latency > 0:
-            summary_stats[data_type]["latencies"].append(latency)
+        print(f"[{seq:>{len(str(total))}}/{total}] {job['file']}: {job['action']} "
+              f"{original_size} → {result['final_size']} bytes in {result['elapsed']:.2f}s")
+
+    order = "best savings per cost first" if budgeted else "largest first"
+    print(f"Processing {len(jobs)} files on {executor.workers} {executor.kind} worker(s), {order}.")
+    job_journal.begin([(job["path"], job["action"]) for job in jobs])
+    skipped = executor.run(jobs, process_file, on_result, ordered=budgeted, deadline=run_deadline)
+    if run_deadline is not None and archive_jobs and time.time() >= run_deadline:
+        skipped += archive_jobs
+        archive_jobs = []
+    if skipped:
+        print(f"Deadline reached: {len(skipped)} jobs not started, deferred to the next run.")
+        for job in skipped:
+            job_journal.finish(job["path"])
+        defer(skipped)
+    if archive_jobs:
+        print(f"Archiving {len(archive_jobs)} cold files in one batch.")
+        job_journal.begin([(job["path"], job["action"]) for job in archive_jobs])
+        with telemetry.stage("job", action="archive"):
+            results = archive_files(archive_jobs)
+        for seq, (job, result) in enumerate(zip(archive_jobs, results), 1):
+            on_result(seq, len(archive_jobs), job, result)
+    catalog.close()
+    job_journal.close()
+
+    # Reclaim the chunks of deleted files; with process workers this
+    # process's copy of the chunk store is stale, so it is re-read first
+    if run_deadline is not None:
+        gc_seconds = min(gc_seconds, run_deadline - time.time())
+    if gc_seconds > 0 and os.path.exists(Deduplication.chunk_store_dir):
+        Deduplication.reload_store()
+        Deduplication.collect_garbage(time_budget=gc_seconds)
+    cost_model.save()
 
     print("\n=== Pipeline Complete ===")
     generate_summary_table()
+    if telemetry_dir:
+        os.makedirs(telemetry_dir, exist_ok=True)
+        telemetry.write_jsonl(os.path.join(telemetry_dir, "metrics.jsonl"), run=time.strftime("%Y%m%dT%H%M%S"))
+        telemetry.write_prometheus(os.path.join(telemetry_dir, "metrics.prom"))
+        print(f"Telemetry written to {telemetry_dir}")
 
 def generate_summary_table():
     print("\n=== CORRECTED Paper-Style Summary Table ===\n")
-    print(f"{'Data Type':<20} {'Technique Applied':<20} {'Reduction Ratio':<15} {'CPU Time (s/GB)':<20} {'Avg. Read Latency (ms)':<23}")
-    print("-" * 98)
+    print(f"{'Data Type':<20} {'Technique Applied':<20} {'Reduction Ratio':<15} {'CPU Time (s/GB)':<16} "
+          f"{'Wall Time (s/GB)':<17} {'Avg. Read Latency (ms)':<23}")
+    print("-" * 114)
 
     for dtype, stats in summary_stats.items():
         orig = stats["orig"]
@@ -153,47 +491,56 @@ def generate_summary_table():
         else:
             ratio = 1.0 # Baseline or no data
 
-        avg_cpu = sum(stats["cpu_times"]) / len(stats["cpu_times"]) if stats["cpu_times"] else 0
+        # Weighted by bytes: total seconds over total GB, not a mean of per-file rates
+        size_gb = orig / 1e9
+        cpu_per_gb = stats["cpu"] / size_gb if size_gb else 0
+        wall_per_gb = stats["wall"] / size_gb if size_gb else 0
         avg_lat = sum(stats["latencies"]) / len(stats["latencies"]) if stats["latencies"] else 0
 
-        print(f"{dtype:<20} {stats['technique']:<20} {ratio:<15.1f} {avg_cpu:<20.2f} {avg_lat:<23.2f}")
+        print(f"{dtype:<20} {stats['technique']:<20} {ratio:<15.1f} {cpu_per_gb:<16.2f} {wall_per_gb:<17.2f} "
+              f"{avg_lat:<23.2f}")
+    print("\nRead latency is one warm-cache 4KB read per file; see benchmarks/bench_pipeline.py "
+          "for percentiles and cold-cache reads.")
 
 if __name__ == "__main__":
-    # Need to update Aggregation.py to return final_size
-    # Quick patch here to modify the Aggregation.py function
-    
-    original_agg = Aggregation.aggregate_timeseries_data
-    
-    def patched_agg(csv_path, output_path, resample_freq='1H'):
-        """Patched version to return path and size"""
-        print(f"Starting aggregation of {csv_path} to {resample_freq} frequency...")
-        chunk_iterator = pd.read_csv(
-            csv_path,
-            parse_dates=['timestamp'],
-            index_col='timestamp',
-            chunksize=100000
-        )
-        aggregated_chunks = []
-        for chunk in chunk_iterator:
-            agg_rules = {'temperature': 'mean', 'pressure': 'mean', 'event_count': 'sum'}
-            resampled_chunk = chunk.resample(resample_freq).agg(agg_rules)
-            aggregated_chunks.append(resampled_chunk)
-        
-        full_aggregated_df = pd.concat(aggregated_chunks)
-        final_df = full_aggregated_df.groupby(full_aggregated_df.index).agg({
-            'temperature': 'mean',
-            'pressure': 'mean',
-            'event_count': 'sum'
-        })
-        
-        original_size = os.path.getsize(csv_path)
-        final_df.to_csv(output_path)
-        final_size = os.path.getsize(output_path)
-        
-        print(f"Aggregation complete. Original: {original_size} | Final: {final_size}")
-        return output_path, final_size
+    parser = argparse.ArgumentParser(description="Hybrid data reduction pipeline")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(),
+                        help="number of parallel workers (default: CPU count)")
+    parser.add_argument("--executor", choices=["process", "thread"], default="process",
+                        help="worker pool type (default: process)")
+    parser.add_argument("--compress-threads", type=int, default=1,
+                        help="threads per file for block-parallel gzip (default: 1, single stream)")
+    parser.add_argument("--clean-store", action="store_true",
+                        help="empty the deduplication chunk store before running")
+    parser.add_argument("--gc-seconds", type=float, default=10.0,
+                        help="time budget for chunk store garbage collection after the run; "
+                             "an unfinished cycle restarts next run (default: 10, 0 disables)")
+    parser.add_argument("--checkpoint-seconds", type=float, default=journal.CHECKPOINT_SECONDS,
+                        help="seconds between checkpoints of a long compression, deduplication or "
+                             "aggregation job (default: %(default)s, 0 disables)")
+    parser.add_argument("--cpu-budget", type=float, default=None, metavar="SECONDS",
+                        help="run only the jobs with the best predicted savings that fit in this many CPU seconds")
+    parser.add_argument("--io-budget", type=float, default=None, metavar="MB",
+                        help="likewise for megabytes read and written")
+    parser.add_argument("--deadline", type=float, default=None, metavar="SECONDS",
+                        help="likewise for wall time; no job starts after this many seconds")
+    parser.add_argument("--plan", action="store_true",
+                        help="print the predicted schedule and savings without changing any file")
+    parser.add_argument("--telemetry", metavar="DIR", default=None,
+                        help="record per-stage metrics and write them to DIR/metrics.jsonl and DIR/metrics.prom")
+    parser.add_argument("--profile", metavar="PATTERN", default=None,
+                        help="profile the processing of files whose name matches PATTERN (e.g. 'app.log')")
+    parser.add_argument("--profile-mode", choices=telemetry.PROFILE_MODES, default="cprofile",
+                        help="cprofile (deterministic, .prof) or sample (stack sampling, .folded)")
+    parser.add_argument("--full-scan", action="store_true",
+                        help="re-list every directory and re-stat every file instead of "
+                             "skipping directories unchanged since the last run")
+    args = parser.parse_args()
 
-    # Overwrite the old function with our patched one
-    Aggregation.aggregate_timeseries_data = patched_agg
-    
-    run_pipeline()
\ No newline at end of file
+    run_pipeline(workers=args.workers, executor_kind=args.executor,
+                 compress_threads=args.compress_threads, clean_store=args.clean_store,
+                 full_scan=args.full_scan, gc_seconds=args.gc_seconds, telemetry_dir=args.telemetry,
+                 profile_pattern=args.profile, profile_mode=args.profile_mode,
+                 checkpoint_seconds=args.checkpoint_seconds, cpu_budget=args.cpu_budget,
+                 io_budget=None if args.io_budget is None else args.io_budget * 1e6, deadline=args.deadline,
+                 plan_only=args.plan)
\ No newline at end of file
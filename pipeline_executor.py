@@ -0,0 +1,118 @@
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+
+def _run_lane(func, arg_list, deadline=None):
+    """
+    Runs a lane's jobs back to back inside a single worker; none is started
+    after deadline (time.time()), so the results may be fewer than the jobs.
+    """
+    results = []
+    for args in arg_list:
+        if deadline is not None and time.time() >= deadline:
+            break
+        results.append(func(*args))
+    return results
+
+
+class PipelineExecutor:
+    """
+    Runs pipeline jobs on a pool of workers, largest job first.
+
+    All jobs go into one shared queue sorted by size, so whichever worker
+    goes idle next takes the largest job still waiting (longest-processing-
+    time-first scheduling). A 4 GB gzip therefore starts early and the small
+    files are spread over the remaining workers instead of queuing behind it.
+
+    Jobs that share mutable module state (e.g. the deduplication index) can be
+    put on the same ``lane``; a lane is executed serially by one worker and is
+    scheduled by its total size.
+
+    With ordered=True jobs run in the order given instead (e.g. a planner's
+    best savings per cost first), a lane at the position of its first job.
+    """
+
+    def __init__(self, workers=None, kind='process'):
+        if kind not in ('process', 'thread'):
+            raise ValueError(f"Unknown executor kind: {kind}")
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.kind = kind
+
+    def _make_pool(self):
+        if self.kind == 'thread':
+            return ThreadPoolExecutor(max_workers=self.workers)
+        return ProcessPoolExecutor(max_workers=self.workers)
+
+    def run(self, jobs, func, on_result, ordered=False, deadline=None):
+        """
+        Executes ``func(*job['args'])`` for every job and reports each result.
+
+        Each job is a dict with ``size``, ``args`` and an optional ``lane``.
+        ``on_result(seq, total, job, result)`` is always called on the
+        calling thread, one job at a time, so callers can merge results into
+        shared structures without locking and get a single ordered log.
+
+        No job is started after deadline (a time.time() value); jobs in
+        progress finish. Returns the jobs that were not run.
+        """
+        units = []
+        lanes = {}
+        for job in jobs:
+            lane = job.get('lane')
+            if lane is None:
+                units.append({'size': job['size'], 'jobs': [job]})
+            else:
+                lanes.setdefault(lane, {'size': 0, 'jobs': []})
+                lanes[lane]['size'] += job['size']
+                lanes[lane]['jobs'].append(job)
+        if ordered:
+            first = {id(job): i for i, job in enumerate(jobs)}
+            units += lanes.values()
+            units.sort(key=lambda u: first[id(u['jobs'][0])])
+        else:
+            for unit in lanes.values():
+                unit['jobs'].sort(key=lambda j: j['size'], reverse=True)
+                units.append(unit)
+            units.sort(key=lambda u: u['size'], reverse=True)
+
+        total = len(jobs)
+        seq = 0
+        skipped = []
+
+        if self.workers == 1:
+            # No pool: keeps tracebacks and profiling simple for single-core runs
+            for unit in units:
+                for job in unit['jobs']:
+                    if deadline is not None and time.time() >= deadline:
+                        skipped.append(job)
+                        continue
+                    result = func(*job['args'])
+                    seq += 1
+                    on_result(seq, total, job, result)
+            return skipped
+
+        with self._make_pool() as pool:
+            # Units are handed out as workers free up, so the ones not
+            # started by the deadline can be held back
+            queue = list(reversed(units))
+            pending = {}
+            while queue or pending:
+                while queue and len(pending) < self.workers:
+                    unit = queue.pop()
+                    if deadline is not None and time.time() >= deadline:
+                        skipped += unit['jobs']
+                        continue
+                    arg_list = [job['args'] for job in unit['jobs']]
+                    pending[pool.submit(_run_lane, func, arg_list, deadline)] = unit
+                if not pending:
+                    break
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    unit = pending.pop(future)
+                    results = future.result()
+                    for job, result in zip(unit['jobs'], results):
+                        seq += 1
+                        on_result(seq, total, job, result)
+                    skipped += unit['jobs'][len(results):]
+        return skipped
@@ -0,0 +1,191 @@
+import json
+import os
+
+import compression
+import telemetry
+
+# What each action is expected to cost before any run has measured it:
+# (share of the input left afterwards, CPU seconds per GB)
+PRIORS = {
+    'compress': (0.25, 40.0),
+    'deduplicate': (0.6, 8.0),
+    'aggregate': (0.05, 30.0),
+    'archive': (0.3, 20.0),
+    'delete': (0.0, 0.01),
+    'none': (1.0, 0.0),
+}
+# Past measurements of a data type and action count this much less with
+# every run that measures it again, so the model follows changes in the
+# data and the hardware
+DECAY = 0.8
+# Measurements below this many input bytes are too noisy to replace the prior
+MIN_HISTORY_BYTES = 1024 * 1024
+
+
+def io_bytes(action, size, final_size):
+    """Bytes an action reads and writes: the whole input and its output, nothing for a delete."""
+    if action in ('delete', 'none'):
+        return 0
+    return size + final_size
+
+
+class CostModel:
+    """
+    Bytes saved, CPU seconds, wall seconds and I/O bytes per input byte of
+    every (data type, action) pair, learned from past runs.
+
+    record() adds a finished job to the current run's totals and save()
+    folds them into the totals of earlier runs, which are decayed first.
+    estimate() predicts a pending job from them, falling back on PRIORS
+    until enough bytes have been measured. Compression instead samples the
+    file and trials the codec the job would use, since both the ratio and
+    the codec (so the CPU cost) differ widely between files.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.history = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.history = json.load(f)['actions']
+        self._run = {}
+
+    @staticmethod
+    def _key(data_type, action):
+        return f"{data_type}|{action}"
+
+    def _rates(self, data_type, action):
+        """(share left, CPU s/byte, wall s/byte) from history, else the prior."""
+        totals = self.history.get(self._key(data_type, action))
+        if totals and totals['bytes_in'] >= MIN_HISTORY_BYTES:
+            bytes_in = totals['bytes_in']
+            return totals['bytes_out'] / bytes_in, totals['cpu'] / bytes_in, totals['wall'] / bytes_in
+        left, cpu_per_gb = PRIORS.get(action, (1.0, 0.0))
+        return left, cpu_per_gb / 1e9, cpu_per_gb / 1e9
+
+    def estimate(self, job, sample=True):
+        """Predicted {'saved', 'cpu', 'wall', 'io'} of a pipeline job (main.py's job dict)."""
+        action, size = job['action'], job['size']
+        left, cpu_rate, wall_rate = self._rates(job['data_type'], action)
+        if action == 'compress' and sample and size:
+            trial = self._trial(job['path'], job['args'][2].get('compression') or {})
+            if trial is None:
+                left = 1.0
+            elif trial is not False:
+                left = 1 / trial['ratio']
+                # Compressing, then timing a full decompression (see main.process_file)
+                sampled_rate = (trial['compress_s_per_mb'] + trial['decompress_ms_per_mb'] / 1000) / 1e6
+                if cpu_rate > 0:
+                    wall_rate *= sampled_rate / cpu_rate
+                cpu_rate = sampled_rate
+        saved = size * (1 - left)
+        return {'saved': saved, 'cpu': size * cpu_rate, 'wall': size * wall_rate,
+                'io': io_bytes(action, size, size - saved)}
+
+    @staticmethod
+    def _trial(path, settings):
+        """Sample trial of the codec a compress job would use; None if stored as-is, False if unreadable."""
+        try:
+            if settings.get('mode') == 'adaptive':
+                return compression.choose_for_file(path, settings)[0]
+            codec = (settings.get('codec', 'gzip'), settings.get('level', 9))
+            return compression.trial_compress(compression.sample_file(path), [codec])[0]
+        except OSError:
+            return False
+
+    def record(self, data_type, action, size, final_size, cpu, wall):
+        """Adds a finished job's measurements to this run's totals."""
+        totals = self._run.setdefault(self._key(data_type, action),
+                                      {'bytes_in': 0, 'bytes_out': 0, 'cpu': 0.0, 'wall': 0.0, 'io': 0, 'jobs': 0})
+        totals['bytes_in'] += size
+        totals['bytes_out'] += final_size
+        totals['cpu'] += cpu
+        totals['wall'] += wall
+        totals['io'] += io_bytes(action, size, final_size)
+        totals['jobs'] += 1
+
+    def save(self):
+        """Folds this run's measurements into the history and writes it out."""
+        for key, new in self._run.items():
+            old = self.history.get(key, {})
+            self.history[key] = {name: old.get(name, 0) * DECAY + new.get(name, 0)
+                                 for name in ('bytes_in', 'bytes_out', 'cpu', 'wall', 'io', 'jobs')}
+        self._run = {}
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump({'version': 1, 'actions': self.history}, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+def plan(jobs, estimates, cpu_budget=None, io_budget=None, deadline=None, workers=1):
+    """
+    Orders jobs by bytes saved per unit of budget and keeps those that fit.
+
+    estimates holds CostModel.estimate() of each job. A job's cost is the
+    share of every given budget it would use (CPU seconds, I/O bytes, and
+    wall seconds against the deadline, which `workers` jobs share), summed,
+    so the budget closest to running out weighs most. Jobs are taken
+    greedily by saved bytes per cost, skipping any that would overrun a
+    budget. Jobs on a lane run one after another, so a lane's wall time
+    must fit the deadline by itself. Without any budget jobs are ranked by
+    bytes saved per CPU second and all are kept.
+
+    Returns (selected, deferred): lists of (job, estimate), selected in
+    the order to run them.
+    """
+    limits = [(name, limit) for name, limit in (('cpu', cpu_budget), ('io', io_budget), ('wall', deadline))
+              if limit is not None]
+
+    def cost(estimate):
+        if not limits:
+            return estimate['cpu']
+        return sum(estimate[name] / (workers if name == 'wall' else 1) / max(limit, 1e-9) for name, limit in limits)
+
+    ranked = sorted(zip(jobs, estimates),
+                    key=lambda pair: (-pair[1]['saved'] / max(cost(pair[1]), 1e-12), -pair[1]['saved']))
+    used = {'cpu': 0.0, 'io': 0.0, 'wall': 0.0}
+    lanes = {}
+    selected, deferred = [], []
+    for job, estimate in ranked:
+        lane_wall = lanes.get(job.get('lane'), 0.0) + estimate['wall']
+        fits = all(used[name] + estimate[name] / (workers if name == 'wall' else 1) <= limit
+                   for name, limit in limits)
+        if deadline is not None and job.get('lane') is not None:
+            fits = fits and lane_wall <= deadline
+        if not fits:
+            deferred.append((job, estimate))
+            continue
+        selected.append((job, estimate))
+        used['cpu'] += estimate['cpu']
+        used['io'] += estimate['io']
+        used['wall'] += estimate['wall'] / workers
+        if job.get('lane') is not None:
+            lanes[job['lane']] = lane_wall
+    telemetry.gauge('plan_saved_bytes_estimate', sum(e['saved'] for _, e in selected))
+    telemetry.gauge('plan_deferred_jobs', len(deferred))
+    return selected, deferred
+
+
+def print_plan(selected, deferred, workers=1):
+    """Prints a plan's schedule and predicted totals."""
+    print(f"\n{'#':>4} {'File':<28} {'Action':<12} {'Size (MB)':>10} {'Saved (MB)':>11} {'CPU (s)':>8} "
+          f"{'I/O (MB)':>9} {'Saved MB/CPU-s':>15}")
+    for i, (job, estimate) in enumerate(selected, 1):
+        rate = f"{estimate['saved'] / 1e6 / estimate['cpu']:.1f}" if estimate['cpu'] > 0 else '-'
+        print(f"{i:>4} {job['file'][:28]:<28} {job['action']:<12} {job['size'] / 1e6:>10.1f} "
+              f"{estimate['saved'] / 1e6:>11.1f} {estimate['cpu']:>8.2f} {estimate['io'] / 1e6:>9.1f} {rate:>15}")
+    saved = sum(e['saved'] for _, e in selected)
+    cpu = sum(e['cpu'] for _, e in selected)
+    io = sum(e['io'] for _, e in selected)
+    # The dedup lane runs serially, so it can outlast the shared pool
+    lanes = {}
+    for job, estimate in selected:
+        if job.get('lane') is not None:
+            lanes[job['lane']] = lanes.get(job['lane'], 0.0) + estimate['wall']
+    wall = max([sum(e['wall'] for _, e in selected) / workers] + list(lanes.values()))
+    print(f"\nPredicted: {saved / 1e6:.1f} MB saved, {cpu:.1f} CPU-s, {io / 1e6:.1f} MB I/O, "
+          f"~{wall:.1f}s on {workers} worker(s) for {len(selected)} job(s).")
+    if deferred:
+        print(f"Deferred to a later run ({len(deferred)} job(s), "
+              f"{sum(e['saved'] for _, e in deferred) / 1e6:.1f} MB of savings): "
+              + ", ".join(job['file'] for job, _ in deferred))
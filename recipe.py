@@ -0,0 +1,244 @@
+import mmap
+import struct
+
+# Binary recipe (.meta) layout, all little-endian:
+#
+#   header    magic, version, hash algorithm, flags, file size, chunk count,
+#             segment count, entry count
+#   segments  one record per run: first chunk index, first byte offset,
+#             first entry, entry count, repeat count
+#   entries   one record per chunk of a segment's pattern: raw digest and
+#             end offset of the chunk within the pattern
+#
+# A segment is a pattern of entries repeated `repeat` times, so a file made of
+# one block written N times is stored as the block's chunk list once plus a
+# single segment. Segments are sorted by chunk index and byte offset, so
+# locating chunk k or byte offset x is a binary search over the mmap'd
+# segment table plus arithmetic, without reading the rest of the file.
+#
+# Since version 2 a segment runs up to the next segment's first chunk (the
+# end of the file for the last segment), so it can end with part of a
+# repetition after its `repeat` whole ones.
+MAGIC = b'DREC'
+VERSION = 2
+# Versions Recipe reads; version 1 segments always end on a whole repetition
+READ_VERSIONS = (1, 2)
+HEADER = struct.Struct('<4sHBBQQIQ')
+SEGMENT = struct.Struct('<QQQII')
+ENTRY = struct.Struct('<32sQ')
+
+# Chunk fingerprints; both are 32-byte digests
+HASH_ALGORITHMS = {'sha256': 0, 'blake2b': 1}
+HASH_NAMES = {v: k for k, v in HASH_ALGORITHMS.items()}
+
+
+class RecipeWriter:
+    """
+    Builds a recipe from a stream of (digest, length) chunks.
+
+    Repeated chunk sequences are detected online: once the next chunk equals
+    the start of the current pattern the writer checks whether the pattern
+    repeats, and counts repetitions instead of storing the chunks again.
+    """
+
+    def __init__(self, hash_name='sha256'):
+        self.hash_id = HASH_ALGORITHMS[hash_name]
+        self.file_size = 0
+        self.chunk_count = 0
+        self._segments = bytearray()
+        self._entries = bytearray()
+        self._segment_count = 0
+        self._entry_count = 0
+        self._seg_first_chunk = 0
+        self._seg_first_byte = 0
+        self._pattern = []
+        self._repeats = 1
+        self._partial = 0  # chunks of the next repetition matched so far
+
+    def add(self, digest, length):
+        self.file_size += length
+        self.chunk_count += 1
+        self._feed((digest, length))
+
+    def _feed(self, chunk):
+        pattern = self._pattern
+        if pattern and chunk == pattern[self._partial]:
+            self._partial += 1
+            if self._partial == len(pattern):
+                self._repeats += 1
+                self._partial = 0
+            return
+
+        matched = pattern[:self._partial]
+        self._partial = 0
+        if self._repeats == 1:
+            # The match attempt failed before a full repeat: it was just more pattern
+            pattern.extend(matched)
+            if pattern and chunk == pattern[0]:
+                self._partial = 1
+                if len(pattern) == 1:
+                    self._repeats += 1
+                    self._partial = 0
+            else:
+                pattern.append(chunk)
+        else:
+            # The repetition broke partway through: the segment ends where it did
+            self._close_segment(tail=len(matched))
+            self._feed(chunk)
+
+    def _close_segment(self, tail=0):
+        # tail: chunks of a partial repetition after the whole ones
+        pattern = self._pattern
+        if not pattern:
+            return
+        end = tail_bytes = 0
+        for i, (digest, length) in enumerate(pattern):
+            end += length
+            if i < tail:
+                tail_bytes = end
+            self._entries += ENTRY.pack(digest, end)
+        self._segments += SEGMENT.pack(self._seg_first_chunk, self._seg_first_byte,
+                                       self._entry_count, len(pattern), self._repeats)
+        self._segment_count += 1
+        self._entry_count += len(pattern)
+        self._seg_first_chunk += len(pattern) * self._repeats + tail
+        self._seg_first_byte += end * self._repeats + tail_bytes
+        self._pattern = []
+        self._repeats = 1
+
+    def _finish(self):
+        matched = self._pattern[:self._partial]
+        self._partial = 0
+        if self._repeats == 1:
+            self._pattern.extend(matched)
+            self._close_segment()
+        else:
+            # The file ends partway through a repetition: the segment ends there too
+            self._close_segment(tail=len(matched))
+
+    @property
+    def segment_count(self):
+        return self._segment_count
+
+    def write(self, path):
+        """Writes the recipe to path and returns its size in bytes."""
+        self._finish()
+        with open(path, 'wb') as f:
+            f.write(HEADER.pack(MAGIC, VERSION, self.hash_id, 0, self.file_size, self.chunk_count,
+                                self._segment_count, self._entry_count))
+            f.write(self._segments)
+            f.write(self._entries)
+        return HEADER.size + len(self._segments) + len(self._entries)
+
+
+class Recipe:
+    """
+    Memory-mapped, read-only view of a recipe file.
+
+    Opening reads only the header; chunk(k) and locate(offset) touch a
+    handful of segment and entry records.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        (magic, version, hash_id, _, self.file_size, self.chunk_count,
+         self.segment_count, self.entry_count) = HEADER.unpack_from(self._mm, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a recipe file: {path}")
+        if version not in READ_VERSIONS:
+            raise ValueError(f"Unsupported recipe version {version}: {path}")
+        self.hash_name = HASH_NAMES[hash_id]
+        self._entries_base = HEADER.size + self.segment_count * SEGMENT.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._mm.close()
+
+    def __len__(self):
+        return self.chunk_count
+
+    def _segment(self, i):
+        return SEGMENT.unpack_from(self._mm, HEADER.size + i * SEGMENT.size)
+
+    def _entry(self, i):
+        return ENTRY.unpack_from(self._mm, self._entries_base + i * ENTRY.size)
+
+    def _find_segment(self, field, value):
+        # Index of the last segment whose first chunk index / byte offset is <= value
+        lo, hi = 0, self.segment_count
+        while hi - lo > 1:
+            mid = (lo + hi) // 2
+            if self._segment(mid)[field] <= value:
+                lo = mid
+            else:
+                hi = mid
+        return lo
+
+    def _pattern_chunk(self, first_entry, index):
+        digest, end = self._entry(first_entry + index)
+        start = self._entry(first_entry + index - 1)[1] if index else 0
+        return digest, start, end - start
+
+    def chunk(self, k):
+        """Returns (digest, byte offset, length) of chunk k."""
+        if not 0 <= k < self.chunk_count:
+            raise IndexError(k)
+        first_chunk, first_byte, first_entry, count, _ = self._segment(self._find_segment(0, k))
+        repeat, index = divmod(k - first_chunk, count)
+        pattern_len = self._entry(first_entry + count - 1)[1]
+        digest, start, length = self._pattern_chunk(first_entry, index)
+        return digest, first_byte + repeat * pattern_len + start, length
+
+    def locate(self, offset):
+        """Returns the index of the chunk containing byte offset."""
+        if not 0 <= offset < self.file_size:
+            raise IndexError(offset)
+        first_chunk, first_byte, first_entry, count, _ = self._segment(self._find_segment(1, offset))
+        pattern_len = self._entry(first_entry + count - 1)[1]
+        repeat, inner = divmod(offset - first_byte, pattern_len)
+        lo, hi = 0, count - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if self._entry(first_entry + mid)[1] <= inner:
+                lo = mid + 1
+            else:
+                hi = mid
+        return first_chunk + repeat * count + lo
+
+    def __iter__(self):
+        """Yields (digest, byte offset, length) for every chunk in order."""
+        return self.iter_from(0)
+
+    def iter_from(self, k):
+        """Yields (digest, byte offset, length) for chunk k and every chunk after it."""
+        if not 0 <= k < self.chunk_count:
+            return
+        first = self._find_segment(0, k)
+        for s in range(first, self.segment_count):
+            first_chunk, offset, first_entry, count, _ = self._segment(s)
+            end_chunk = self._segment(s + 1)[0] if s + 1 < self.segment_count else self.chunk_count
+            pattern_len = self._entry(first_entry + count - 1)[1]
+            k = max(k, first_chunk)
+            r, i = divmod(k - first_chunk, count)
+            while k < end_chunk:
+                base = offset + r * pattern_len
+                start = self._entry(first_entry + i - 1)[1] if i else 0
+                stop = min(count, i + end_chunk - k)
+                for e in range(first_entry + i, first_entry + stop):
+                    digest, end = self._entry(e)
+                    yield digest, base + start, end - start
+                    start = end
+                k += stop - i
+                r += 1
+                i = 0
+
+    def unique_digests(self):
+        """Set of distinct chunk digests the file references."""
+        return {self._entry(i)[0] for i in range(self.entry_count)}
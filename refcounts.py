@@ -0,0 +1,218 @@
+import os
+import struct
+
+# refcounts.snap: header (magic, version, log generation, entry count), then
+# one (digest, count) record per tracked chunk. refcounts-<generation>.log
+# holds the (digest, delta) changes made since that snapshot; a checkpoint
+# writes the next snapshot and starts the next generation's log, so a log
+# is never replayed on top of a snapshot that already contains it.
+SNAPSHOT_MAGIC = b'RCNT'
+SNAPSHOT_HEADER = struct.Struct('<4sIQQ')
+SNAPSHOT_RECORD = struct.Struct('<32sI')
+LOG_RECORD = struct.Struct('<32si')
+# Delta that removes a digest's entry (its chunk was swept)
+DISCARD = -2 ** 31
+
+# Fold the log into a new snapshot once it holds this many records
+CHECKPOINT_RECORDS = 1 << 20
+
+
+class RefCounts:
+    """
+    Persistent per-chunk reference counts, plus the set of recipes that
+    hold references.
+
+    A chunk's count is the number of recipes (.meta files) that use it,
+    each recipe counting a chunk once however often it repeats. Counts are
+    kept in a dict; changes are appended to a log on flush() and folded
+    into a snapshot every CHECKPOINT_RECORDS changes.
+
+    A count of 0 marks the chunk dead: nothing references it and the
+    garbage collector may sweep it. Chunks stored before reference counting
+    existed have no entry at all and are never swept.
+
+    suspect is set (and kept on disk) when counts may be too high, e.g.
+    after a deduplication was killed before it could drop its references;
+    the garbage collector then recounts them.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self._snap_path = os.path.join(root, 'refcounts.snap')
+        self._recipes_path = os.path.join(root, 'recipes.log')
+        self._suspect_path = os.path.join(root, 'refcounts.suspect')
+
+        self.counts = {}
+        self.zero = set()  # digests whose count is 0
+        self.recipes = set()  # absolute paths of recipes holding references
+        self.generation = 0
+        self._load_snapshot()
+        self._log_path = self._generation_log(self.generation)
+        self._log_records = self._replay_log()
+        self._load_recipes()
+        self.suspect = os.path.exists(self._suspect_path)
+        self._pending = bytearray()
+        self._pending_recipes = []
+        self._log = open(self._log_path, 'ab')
+        self._recipe_log = open(self._recipes_path, 'a')
+
+    def _generation_log(self, generation):
+        return os.path.join(self.root, f'refcounts-{generation}.log')
+
+    def _load_snapshot(self):
+        if not os.path.exists(self._snap_path):
+            return
+        with open(self._snap_path, 'rb') as f:
+            magic, _, self.generation, count = SNAPSHOT_HEADER.unpack(f.read(SNAPSHOT_HEADER.size))
+            if magic != SNAPSHOT_MAGIC:
+                raise ValueError(f"Not a reference count snapshot: {self._snap_path}")
+            data = f.read(count * SNAPSHOT_RECORD.size)
+        for digest, n in SNAPSHOT_RECORD.iter_unpack(data):
+            self.counts[digest] = n
+            if not n:
+                self.zero.add(digest)
+
+    def _replay_log(self):
+        # Logs of older generations are leftovers of an interrupted checkpoint
+        for name in os.listdir(self.root):
+            if name.startswith('refcounts-') and name.endswith('.log') and \
+                    os.path.join(self.root, name) != self._log_path:
+                os.remove(os.path.join(self.root, name))
+        if not os.path.exists(self._log_path):
+            return 0
+        with open(self._log_path, 'rb') as f:
+            data = f.read()
+        usable = len(data) - len(data) % LOG_RECORD.size
+        if usable != len(data):
+            # Torn trailing record from an interrupted flush
+            with open(self._log_path, 'r+b') as f:
+                f.truncate(usable)
+        for digest, delta in LOG_RECORD.iter_unpack(data[:usable]):
+            self._apply(digest, delta)
+        return usable // LOG_RECORD.size
+
+    def _load_recipes(self):
+        if not os.path.exists(self._recipes_path):
+            return
+        with open(self._recipes_path) as f:
+            for line in f:
+                if not line.endswith('\n'):
+                    break  # torn last line
+                if line[0] == '+':
+                    self.recipes.add(line[1:-1])
+                else:
+                    self.recipes.discard(line[1:-1])
+
+    def _apply(self, digest, delta):
+        if delta == DISCARD:
+            self.counts.pop(digest, None)
+            self.zero.discard(digest)
+            return
+        n = self.counts.get(digest, 0) + delta
+        self.counts[digest] = n
+        if n:
+            self.zero.discard(digest)
+        else:
+            self.zero.add(digest)
+
+    def __len__(self):
+        return len(self.counts)
+
+    def get(self, digest):
+        """Reference count of a digest; None if it isn't tracked."""
+        return self.counts.get(digest)
+
+    def add(self, digests, delta=1):
+        """
+        Adds delta to the count of every digest. Releases (delta < 0) skip
+        untracked digests, so releasing a recipe written before reference
+        counting existed leaves its chunks alone.
+        """
+        counts = self.counts
+        for digest in digests:
+            if delta < 0 and digest not in counts:
+                continue
+            self._apply(digest, delta)
+            self._pending += LOG_RECORD.pack(digest, delta)
+
+    def set(self, digest, count):
+        """Sets a digest's count (used by a mark pass that recounted it)."""
+        delta = count - self.counts.get(digest, 0)
+        if delta or digest not in self.counts:
+            self._apply(digest, delta)
+            self._pending += LOG_RECORD.pack(digest, delta)
+
+    def discard(self, digests):
+        """Stops tracking digests whose chunks were swept."""
+        for digest in digests:
+            self._apply(digest, DISCARD)
+            self._pending += LOG_RECORD.pack(digest, DISCARD)
+
+    def add_recipe(self, path):
+        self.recipes.add(path)
+        self._pending_recipes.append('+' + path)
+
+    def remove_recipe(self, path):
+        self.recipes.discard(path)
+        self._pending_recipes.append('-' + path)
+
+    def set_suspect(self, suspect=True):
+        """Durably records whether the counts need a recount."""
+        if suspect == self.suspect:
+            return
+        if suspect:
+            with open(self._suspect_path, 'w') as f:
+                os.fsync(f.fileno())
+        else:
+            os.remove(self._suspect_path)
+        self.suspect = suspect
+
+    def flush(self):
+        """Makes all changes durable, checkpointing once the log is long."""
+        if self._pending:
+            self._log.write(self._pending)
+            self._log.flush()
+            os.fsync(self._log.fileno())
+            self._log_records += len(self._pending) // LOG_RECORD.size
+            self._pending = bytearray()
+        if self._pending_recipes:
+            self._recipe_log.write(''.join(line + '\n' for line in self._pending_recipes))
+            self._recipe_log.flush()
+            os.fsync(self._recipe_log.fileno())
+            self._pending_recipes = []
+        if self._log_records >= CHECKPOINT_RECORDS:
+            self.checkpoint()
+
+    def checkpoint(self):
+        """Writes a snapshot of all counts and recipes and starts a new, empty log."""
+        # The snapshot includes every change made so far, logged or not
+        self._pending = bytearray()
+        self._pending_recipes = []
+        generation = self.generation + 1
+        tmp_path = self._snap_path + '.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(SNAPSHOT_HEADER.pack(SNAPSHOT_MAGIC, 1, generation, len(self.counts)))
+            f.write(b''.join(SNAPSHOT_RECORD.pack(digest, n) for digest, n in self.counts.items()))
+            f.flush()
+            os.fsync(f.fileno())
+        new_log = open(self._generation_log(generation), 'ab')
+        os.replace(tmp_path, self._snap_path)
+        self._log.close()
+        os.remove(self._log_path)
+        self._log, self._log_path = new_log, self._generation_log(generation)
+        self.generation = generation
+        self._log_records = 0
+
+        tmp_path = self._recipes_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.write(''.join('+' + path + '\n' for path in sorted(self.recipes)))
+            f.flush()
+            os.fsync(f.fileno())
+        self._recipe_log.close()
+        os.replace(tmp_path, self._recipes_path)
+        self._recipe_log = open(self._recipes_path, 'a')
+
+    def close(self):
+        self.flush()
+        self._log.close()
+        self._recipe_log.close()
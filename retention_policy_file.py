@@ -1,12 +1,29 @@
 import json
 import os
+import re
+import time
 import logging
-from datetime import datetime
-from fnmatch import fnmatch
+from fnmatch import translate
+
+import numpy as np
+
+import telemetry
 
 # Configure logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
+# Tier codes used by classify_many, in order of precedence
+TIERS = ('unmatched', 'expired', 'cold', 'warm', 'hot')
+
+
+def _literal_extension(pattern):
+    """'.log' for 'logs/*.log'; None if the pattern's last name has no wildcard-free extension."""
+    name = pattern.replace('\\', '/').rsplit('/', 1)[-1]
+    dot = name.rfind('.')
+    if dot < 0 or any(c in name[dot:] for c in '*?[]'):
+        return None
+    return name[dot:]
+
 
 class PolicyEngine:
     def __init__(self, policy_file):
@@ -15,6 +32,7 @@ class PolicyEngine:
             with open(policy_file, 'r') as f:
                 self.policy = json.load(f)
             self._validate_policy()
+            self._compile_rules()
             logging.info("Policy engine initialized with policy: %s", policy_file)
         except FileNotFoundError:
             logging.error("Policy file not found: %s", policy_file)
@@ -50,53 +68,171 @@ class PolicyEngine:
             if rule['warm_tier_days'] < 0:
                 raise ValueError(f"Rule '{rule['name']}': warm_tier_days ({rule['warm_tier_days']}) cannot be negative")
 
+            chunking = rule.get('chunking')
+            if chunking is not None:
+                method = chunking.get('method', 'fixed')
+                if method not in ('fixed', 'cdc'):
+                    raise ValueError(f"Rule '{rule['name']}': unknown chunking method '{method}'")
+                if chunking.get('fingerprint', 'sha256') not in ('sha256', 'blake2b'):
+                    raise ValueError(f"Rule '{rule['name']}': unknown fingerprint '{chunking['fingerprint']}'")
+                if method == 'cdc':
+                    sizes = [chunking.get(k) for k in ('min_size', 'avg_size', 'max_size')]
+                    if None not in sizes and not sizes[0] <= sizes[1] <= sizes[2]:
+                        raise ValueError(
+                            f"Rule '{rule['name']}': chunking sizes must satisfy min_size <= avg_size <= max_size"
+                        )
+
+            rollups = rule.get('rollup_resolutions')
+            if rollups is not None:
+                if not isinstance(rollups, dict):
+                    raise ValueError(f"Rule '{rule['name']}': rollup_resolutions must map tiers to resolution lists")
+                for tier, resolutions in rollups.items():
+                    if tier not in ('hot', 'warm', 'cold'):
+                        raise ValueError(f"Rule '{rule['name']}': unknown tier '{tier}' in rollup_resolutions")
+                    if not resolutions or not all(isinstance(r, str) for r in resolutions):
+                        raise ValueError(
+                            f"Rule '{rule['name']}': rollup_resolutions['{tier}'] must be a non-empty list of frequencies"
+                        )
+
+            compression = rule.get('compression')
+            if compression is not None:
+                mode = compression.get('mode', 'fixed')
+                if mode not in ('fixed', 'adaptive'):
+                    raise ValueError(f"Rule '{rule['name']}': unknown compression mode '{mode}'")
+                if compression.get('codec', 'gzip') not in ('gzip', 'bz2', 'lzma'):
+                    raise ValueError(f"Rule '{rule['name']}': unknown codec '{compression['codec']}'")
+                if compression.get('target', 'balanced') not in ('balanced', 'max_ratio', 'ratio_per_cpu'):
+                    raise ValueError(f"Rule '{rule['name']}': unknown compression target '{compression['target']}'")
+                if compression.get('seekable') and compression.get('codec', 'gzip') != 'gzip':
+                    raise ValueError(f"Rule '{rule['name']}': seekable compression requires the gzip codec")
+
+            if rule.get('aggregate_format', 'csv') not in ('csv', 'columnar'):
+                raise ValueError(f"Rule '{rule['name']}': aggregate_format must be 'csv' or 'columnar'")
+
+    def get_rule(self, name):
+        """Returns the rule dict with the given name, or None."""
+        for rule in self.policy['rules']:
+            if rule['name'] == name:
+                return rule
+        return None
+
+    def _compile_rules(self):
+        """
+        Compiles every rule's path_match once and indexes the rules by the
+        literal extension their pattern ends with ('test_data/*.log' ->
+        '.log'). A path is then only tested against the rules for its own
+        extension plus the rules without one, still in policy order, so the
+        first matching rule is the same one an fnmatch loop would find.
+        """
+        rules = self.policy['rules']
+        by_extension = {}
+        any_extension = []
+        for i, rule in enumerate(rules):
+            pattern = os.path.normcase(rule['path_match'])
+            matcher = (i, re.compile(translate(pattern)).match)
+            extension = _literal_extension(pattern)
+            if extension is None:
+                any_extension.append(matcher)
+            else:
+                by_extension.setdefault(extension, []).append(matcher)
+        self._any_extension = tuple(any_extension)
+        self._candidates = {ext: tuple(sorted(matchers + any_extension)) for ext, matchers in by_extension.items()}
+
+        # Per-rule thresholds (days) and per-rule action of every tier code
+        self._retention = np.array([r['retention_days'] for r in rules] + [np.inf], dtype=np.float64)
+        self._hot = np.array([r['hot_tier_days'] for r in rules] + [np.inf], dtype=np.float64)
+        self._warm_end = self._hot + np.array([r['warm_tier_days'] for r in rules] + [0], dtype=np.float64)
+        self._actions = [('none', 'delete', r['cold_tier_action'], r['warm_tier_action'], 'none') for r in rules]
+
+    def match_rule(self, file_path):
+        """Index of the first rule whose path_match matches file_path, or -1."""
+        file_path = os.path.normcase(file_path)
+        dot = file_path.rfind('.')
+        candidates = self._candidates.get(file_path[dot:], self._any_extension) if dot >= 0 else self._any_extension
+        for i, match in candidates:
+            if match(file_path):
+                return i
+        return -1
+
+    @telemetry.staged('policy_classify')
+    def classify_many(self, entries, now=None):
+        """
+        Determines tier and action for many files at once.
+
+        entries are os.DirEntry objects (e.g. from os.scandir) or
+        (path, os.stat_result) pairs; ages are measured against one reference
+        time, `now` (epoch seconds, default: current time). Returns a list of
+        status dicts like get_file_status, in the same order, with None for
+        entries that no longer exist. Each status also carries
+        next_transition: when the file crosses its next tier boundary (epoch
+        seconds), or None if it never will.
+        """
+        now = time.time() if now is None else now
+        paths = []
+        mtimes = []
+        missing = []
+        for i, entry in enumerate(entries):
+            if isinstance(entry, tuple):
+                path, st = entry
+            else:
+                path = entry.path
+                try:
+                    st = entry.stat()
+                except FileNotFoundError:
+                    logging.error("File not found: %s", path)
+                    missing.append(i)
+                    continue
+            paths.append(path)
+            mtimes.append(st.st_mtime)
+
+        rule_idx = np.fromiter((self.match_rule(p) for p in paths), dtype=np.intp, count=len(paths))
+        ages = (now - np.array(mtimes, dtype=np.float64)) / (24 * 3600)
+        # Unmatched paths pick the trailing sentinel thresholds (never expire)
+        tiers = np.select(
+            [rule_idx < 0, ages > self._retention[rule_idx], ages > self._warm_end[rule_idx], ages > self._hot[rule_idx]],
+            [0, 1, 2, 3], default=4,
+        )
+        # Next tier boundary still ahead of now (epoch seconds), inf if none
+        boundaries = np.stack((self._hot, self._warm_end, self._retention), axis=1)[rule_idx] * (24 * 3600)
+        boundaries += np.array(mtimes, dtype=np.float64)[:, None]
+        next_transition = np.where(boundaries >= now, boundaries, np.inf).min(axis=1, initial=np.inf)
+        if telemetry.enabled:
+            for tier, n in zip(*np.unique(tiers, return_counts=True)):
+                telemetry.count('files_classified_total', int(n), tier=TIERS[tier])
+
+        rules = self.policy['rules']
+        debug = logging.getLogger().isEnabledFor(logging.DEBUG)
+        results = []
+        for path, r, tier, age, upcoming in zip(paths, rule_idx.tolist(), tiers.tolist(), ages.tolist(),
+                                                 next_transition.tolist()):
+            if r < 0:
+                logging.warning("File %s did not match any rule", path)
+                results.append({'tier': 'unmatched', 'action': 'none', 'rule': 'none', 'age_days': age,
+                                'next_transition': None})
+                continue
+            if debug:
+                logging.debug("File %s: Age %.2f days, matched rule '%s'", path, age, rules[r]['name'])
+            results.append({'rule': rules[r]['name'], 'age_days': age,
+                            'tier': TIERS[tier], 'action': self._actions[r][tier],
+                            'next_transition': upcoming if upcoming != np.inf else None})
+
+        for i in missing:
+            results.insert(i, None)
+        return results
+
     def get_file_status(self, file_path):
         """
         Determines the current tier and required action for a given file.
         Returns None if the file doesn't exist, or a dict with tier, action, rule, and age.
         """
         try:
-            file_mod_time = datetime.fromtimestamp(os.path.getmtime(file_path))
-            file_age_days = (datetime.now() - file_mod_time).total_seconds() / (24 * 3600)
-            logging.debug("File %s: Age %.2f days", file_path, file_age_days)
-
-            for rule in self.policy['rules']:
-                if fnmatch(file_path, rule['path_match']):
-                    logging.info("File %s matched rule '%s'", file_path, rule['name'])
-                    
-                    # *** FIX ***
-                    # Create a base status dict that ALWAYS includes the age
-                    base_status = {'rule': rule['name'], 'age_days': file_age_days}
-
-                    # Expired (deletion)
-                    if file_age_days > rule['retention_days']:
-                        base_status.update({'tier': 'expired', 'action': 'delete'})
-                        return base_status
-
-                    # Cold tier
-                    if file_age_days > rule['hot_tier_days'] + rule['warm_tier_days']:
-                        base_status.update({'tier': 'cold', 'action': rule['cold_tier_action']})
-                        return base_status
-
-                    # Warm tier
-                    if file_age_days > rule['hot_tier_days']:
-                        base_status.update({'tier': 'warm', 'action': rule['warm_tier_action']})
-                        return base_status
-
-                    # Hot tier
-                    base_status.update({'tier': 'hot', 'action': 'none'})
-                    return base_status
-
-            logging.warning("File %s did not match any rule", file_path)
-            # *** FIX ***
-            return {'tier': 'unmatched', 'action': 'none', 'rule': 'none', 'age_days': file_age_days}
+            return self.classify_many([(file_path, os.stat(file_path))])[0]
 
         except FileNotFoundError:
             logging.error("File not found: %s", file_path)
             return None # main.py already checks for None
         except Exception as e:
             logging.error("Error processing file %s: %s", file_path, e)
-            # *** FIX ***
             return {'tier': 'error', 'action': 'none', 'rule': 'none', 'error': str(e), 'age_days': 0}
 
 
@@ -0,0 +1,269 @@
+import calendar
+import os
+import re
+import struct
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+
+import compression
+from columnar import to_epoch_seconds
+
+# Seekable gzip: a normal multi-member .gz (plain gzip/zcat read it as one
+# stream) where every member ("frame") holds whole lines, plus a sidecar
+# .idx file, all little-endian:
+#
+#   header  magic, version, frame count, total uncompressed size
+#   frames  per frame: uncompressed offset, compressed offset, number of the
+#           frame's first line (0-based), epoch seconds of the first
+#           timestamped line in the frame (NO_TIMESTAMP if none)
+#
+# Reading any byte, line or time range decompresses only the frames that
+# cover it.
+MAGIC = b'GZIX'
+VERSION = 1
+HEADER = struct.Struct('<4sIQQ')
+FRAME = np.dtype([('raw_offset', '<u8'), ('offset', '<u8'), ('first_line', '<u8'), ('first_ts', '<i8')])
+NO_TIMESTAMP = np.iinfo(np.int64).min
+
+# Uncompressed bytes per frame: small enough that a random read decompresses
+# little, large enough that the ratio stays within a few percent of one stream
+FRAME_SIZE = 1024 * 1024
+# Decompressed frames kept by a reader
+CACHED_FRAMES = 8
+
+# Leading 'YYYY-MM-DD HH:MM:SS' (or with 'T') of a log line
+_TIMESTAMP = re.compile(rb'(\d{4})-(\d\d)-(\d\d)[ T](\d\d):(\d\d):(\d\d)')
+
+
+def index_path(gz_path):
+    return gz_path + '.idx'
+
+
+def line_timestamp(line):
+    """Epoch seconds of a line's leading timestamp, or None."""
+    m = _TIMESTAMP.match(line)
+    return calendar.timegm(tuple(map(int, m.groups()))) if m else None
+
+
+def _line_frames(f, frame_size, meta):
+    """
+    Yields blocks of at most frame_size bytes cut at line ends (longer only
+    for a longer line); appends (lines, first_ts) per block to meta. Each
+    block is cut from the frame_size bytes after the previous cut, so the
+    frames from an offset on don't depend on where reading started.
+    """
+    carry = b''
+    while True:
+        data = f.read(frame_size - len(carry) if len(carry) < frame_size else frame_size)
+        buf = carry + data
+        if not data:
+            if buf:
+                meta.append(_frame_meta(buf))
+                yield buf
+            return
+        cut = buf.rfind(b'\n') + 1
+        if cut == 0:
+            # A single line longer than the frame size; keep reading it
+            carry = buf
+            continue
+        block, carry = buf[:cut], buf[cut:]
+        meta.append(_frame_meta(block))
+        yield block
+
+
+def _frame_meta(block):
+    first_ts = NO_TIMESTAMP
+    start = 0
+    # The first line may be a continuation (e.g. a traceback); look a few lines in
+    for _ in range(16):
+        end = block.find(b'\n', start)
+        ts = line_timestamp(block[start:end if end >= 0 else len(block)])
+        if ts is not None:
+            first_ts = ts
+            break
+        if end < 0:
+            break
+        start = end + 1
+    return block.count(b'\n'), first_ts
+
+
+def write_seekable_gzip(f_in, f_out, idx_path, level=9, workers=1, frame_size=FRAME_SIZE, members=None, meta=None,
+                        on_frame=None):
+    """
+    Compresses f_in into f_out as line-aligned gzip frames and writes the
+    frame index to idx_path. Returns the size of the index file.
+
+    To continue an interrupted file, pass the frames already in f_out as
+    members ((raw size, compressed size) each) and meta ((line count, first
+    timestamp) each), with both files positioned after them. on_frame(members,
+    meta) is called after each frame is written.
+    """
+    meta = [] if meta is None else meta
+    on_member = None if on_frame is None else lambda written: on_frame(written, meta[:len(written)])
+    members = compression.write_gzip_blocks(f_in, f_out, level=level, workers=workers,
+                                            blocks=_line_frames(f_in, frame_size, meta), members=members,
+                                            on_member=on_member)
+    frames = np.zeros(len(members), dtype=FRAME)
+    raw = np.array([m[0] for m in members], dtype=np.uint64)
+    packed = np.array([m[1] for m in members], dtype=np.uint64)
+    frames['raw_offset'][1:] = np.cumsum(raw)[:-1]
+    frames['offset'][1:] = np.cumsum(packed)[:-1]
+    if meta:
+        lines = np.array([m[0] for m in meta], dtype=np.uint64)
+        frames['first_line'][1:] = np.cumsum(lines)[:-1]
+        frames['first_ts'] = [m[1] for m in meta]
+    else:
+        frames['first_ts'] = NO_TIMESTAMP
+
+    with open(idx_path, 'wb') as f:
+        f.write(HEADER.pack(MAGIC, VERSION, len(frames), int(raw.sum())))
+        f.write(frames.tobytes())
+    return HEADER.size + frames.nbytes
+
+
+def _bisect_lines(lines, ts, default):
+    """
+    Index of the first line whose timestamp is >= ts, for time-ordered lines.
+    A line without a timestamp has the one of the closest stamped line
+    before it (default before the first one). Parses O(log n) lines.
+    """
+    lo, hi = 0, len(lines)
+    while lo < hi:
+        mid = (lo + hi) // 2
+        j = mid
+        line_ts = None
+        while j >= 0 and line_ts is None:
+            line_ts = line_timestamp(lines[j])
+            j -= 1
+        if (default if line_ts is None else line_ts) < ts:
+            lo = mid + 1
+        else:
+            hi = mid
+    return lo
+
+
+class SeekableGzipReader:
+    """
+    Random access into a seekable gzip file through its .idx sidecar.
+
+    Offsets and line numbers refer to the uncompressed data. Each call
+    decompresses only the frames it needs; recently used frames are cached.
+    """
+
+    def __init__(self, gz_path, cached_frames=CACHED_FRAMES):
+        self.path = gz_path
+        with open(index_path(gz_path), 'rb') as f:
+            data = f.read()
+        magic, version, count, self.size = HEADER.unpack_from(data, 0)
+        if magic != MAGIC:
+            raise ValueError(f"Not a seekable gzip index: {index_path(gz_path)}")
+        if version != VERSION:
+            raise ValueError(f"Unsupported seekable gzip index version {version}: {index_path(gz_path)}")
+        self.frames = np.frombuffer(data, dtype=FRAME, count=count, offset=HEADER.size)
+        self._raw_offsets = self.frames['raw_offset']
+        self._first_lines = self.frames['first_line']
+        self._file = open(gz_path, 'rb')
+        self._compressed_size = os.fstat(self._file.fileno()).st_size
+        self._cache = OrderedDict()
+        self._cached_frames = cached_frames
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._file.close()
+
+    def __len__(self):
+        return len(self.frames)
+
+    def frame(self, i):
+        """Decompressed bytes of frame i."""
+        data = self._cache.get(i)
+        if data is not None:
+            self._cache.move_to_end(i)
+            return data
+        start = int(self.frames['offset'][i])
+        end = int(self.frames['offset'][i + 1]) if i + 1 < len(self.frames) else self._compressed_size
+        data = zlib.decompress(os.pread(self._file.fileno(), end - start, start), 31)
+        self._cache[i] = data
+        if len(self._cache) > self._cached_frames:
+            self._cache.popitem(last=False)
+        return data
+
+    def read_range(self, offset, n):
+        """Up to n bytes of uncompressed data starting at offset."""
+        end = min(offset + n, self.size)
+        if offset >= end:
+            return b''
+        i = int(np.searchsorted(self._raw_offsets, offset, side='right')) - 1
+        parts = []
+        pos = offset
+        while pos < end:
+            base = int(self._raw_offsets[i])
+            data = self.frame(i)
+            parts.append(data[pos - base:end - base])
+            pos = base + len(data)
+            i += 1
+        return b''.join(parts)
+
+    def read_lines(self, first_line, count):
+        """count lines (with their newlines) starting at 0-based line number first_line."""
+        i = int(np.searchsorted(self._first_lines, first_line, side='right')) - 1
+        skip = first_line - int(self._first_lines[max(i, 0)])
+        lines = []
+        while len(lines) < count and 0 <= i < len(self.frames):
+            frame_lines = self.frame(i).splitlines(keepends=True)
+            lines.extend(frame_lines[skip:skip + count - len(lines)])
+            skip = 0
+            i += 1
+        return lines
+
+    def grep_time_window(self, start, end, pattern=None):
+        """
+        Yields the lines timestamped in [start, end), optionally only those
+        matching pattern (a regex, str or bytes).
+
+        start and end are epoch seconds, datetimes or ISO strings. Lines are
+        assumed to be in time order, as in a log; lines without a timestamp
+        (e.g. tracebacks) go with the line before them, even across frames.
+        Frames before the last one that starts before start are never
+        decompressed, and frames wholly inside the window are not parsed
+        line by line. Reading stops at the first line at or after end, so at
+        most one frame past the window is decompressed.
+        """
+        start, end = to_epoch_seconds(start), to_epoch_seconds(end)
+        if isinstance(pattern, str):
+            pattern = pattern.encode()
+        if isinstance(pattern, bytes):
+            pattern = re.compile(pattern)
+
+        first = self.frames['first_ts']
+        known = first != NO_TIMESTAMP
+        # A frame's lines are no later than the first timestamp of the next frame that has one
+        ahead = np.where(known, first, np.iinfo(np.int64).max)
+        following = np.append(np.minimum.accumulate(ahead[::-1])[::-1][1:], np.iinfo(np.int64).max)
+        # Every line before the last frame starting before the window is older than start
+        before = np.flatnonzero(known & (first < start))
+        i = int(before[-1]) if len(before) else 0
+        # Timestamp of the last stamped line read so far, which untimestamped
+        # lines at the start of the next frame go with; older than start
+        # for the first frame read
+        carried = NO_TIMESTAMP
+
+        for i in range(i, len(self.frames)):
+            lines = self.frame(i).splitlines(keepends=True)
+            if first[i] >= start and following[i] < end and line_timestamp(lines[0]) is not None:
+                lo, hi = 0, len(lines)
+            else:
+                lo, hi = _bisect_lines(lines, start, carried), _bisect_lines(lines, end, carried)
+            for line in lines[lo:hi]:
+                if pattern is None or pattern.search(line):
+                    yield line
+            if hi < len(lines):
+                return
+            carried = next((ts for ts in map(line_timestamp, reversed(lines)) if ts is not None), carried)
@@ -0,0 +1,322 @@
+import bisect
+import collections
+import contextlib
+import cProfile
+import functools
+import json
+import os
+import re
+import sys
+import threading
+import time
+
+# In-process metrics for the reduction stages: counters, gauges and
+# histograms keyed by name and labels, exported as JSON lines or in the
+# Prometheus text format. Recording is a no-op until enable() is called, so
+# instrumented code pays one global lookup and a branch when it is off.
+#
+# Names follow Prometheus conventions: counters end in _total, sizes are in
+# bytes and times in seconds. Labels should have few distinct values (a
+# stage, a codec), never a file name.
+
+# Histogram bucket upper bounds
+SECONDS_BUCKETS = (0.001, 0.005, 0.025, 0.1, 0.5, 2.5, 10, 60, 300)
+BYTES_BUCKETS = tuple(1024 * 4 ** i for i in range(11))  # 1 KB .. 1 GB
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256, 1024)
+
+PROMETHEUS_PREFIX = 'reduction_'
+
+enabled = False
+_lock = threading.Lock()
+_counters = {}  # (name, labels) -> value
+_gauges = {}  # (name, labels) -> value
+_histograms = {}  # (name, labels) -> [bounds, bucket counts (+inf last), sum, count]
+
+
+def enable(on=True):
+    """Turns recording on (or off with on=False)."""
+    global enabled
+    enabled = on
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items())) if labels else ()
+
+
+def count(name, value=1, **labels):
+    """Adds value to a counter."""
+    if not enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0) + value
+
+
+def gauge(name, value, **labels):
+    """Sets a gauge to its current value."""
+    if not enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def observe(name, value, buckets=SECONDS_BUCKETS, **labels):
+    """Records one observation in a histogram."""
+    if not enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        histogram = _histograms.get(key)
+        if histogram is None:
+            histogram = _histograms[key] = [tuple(buckets), [0] * (len(buckets) + 1), 0, 0]
+        histogram[1][bisect.bisect_left(histogram[0], value)] += 1
+        histogram[2] += value
+        histogram[3] += 1
+
+
+class _Stage:
+    __slots__ = ('name', 'labels', 'wall', 'cpu')
+
+    def __init__(self, name, labels):
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.wall, self.cpu = time.perf_counter(), time.process_time()
+        return self
+
+    def __exit__(self, *exc):
+        wall = time.perf_counter() - self.wall
+        cpu = time.process_time() - self.cpu
+        observe('stage_seconds', wall, stage=self.name, **self.labels)
+        count('stage_cpu_seconds_total', cpu, stage=self.name, **self.labels)
+
+
+_NOT_TIMED = contextlib.nullcontext()
+
+
+def stage(name, **labels):
+    """
+    Context manager timing a block as stage `name`: its wall time goes to
+    the stage_seconds histogram and its CPU time to
+    stage_cpu_seconds_total. CPU time is the whole process's, so it also
+    counts helper threads and, with a thread pool, other jobs running at the
+    same time.
+    """
+    if not enabled:
+        return _NOT_TIMED
+    return _Stage(name, labels)
+
+
+def staged(name, **labels):
+    """Decorator timing every call of a function as stage `name`."""
+    def decorate(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not enabled:
+                return func(*args, **kwargs)
+            with _Stage(name, labels):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def timed(iterable, name, **labels):
+    """Iterates over iterable, timing each next() as stage `name` (e.g. reads behind a generator)."""
+    if not enabled:
+        return iterable
+    return _timed(iter(iterable), name, labels)
+
+
+def _timed(iterator, name, labels):
+    while True:
+        with _Stage(name, labels):
+            item = next(iterator, _timed)
+        if item is _timed:
+            return
+        yield item
+
+
+# --- moving metrics between processes -----------------------------------
+
+def drain():
+    """
+    Returns every metric recorded so far and clears them. A pipeline
+    worker ships the result back with each job; the parent merge()s it.
+    """
+    global _counters, _gauges, _histograms
+    with _lock:
+        snapshot = {'counters': _counters, 'gauges': _gauges, 'histograms': _histograms}
+        _counters, _gauges, _histograms = {}, {}, {}
+    return snapshot
+
+
+def merge(snapshot):
+    """Adds a drain()ed snapshot to this process's metrics."""
+    if not snapshot:
+        return
+    with _lock:
+        for key, value in snapshot['counters'].items():
+            _counters[key] = _counters.get(key, 0) + value
+        _gauges.update(snapshot['gauges'])
+        for key, (bounds, buckets, total, n) in snapshot['histograms'].items():
+            histogram = _histograms.get(key)
+            if histogram is None or histogram[0] != bounds:
+                _histograms[key] = [bounds, list(buckets), total, n]
+                continue
+            histogram[1] = [a + b for a, b in zip(histogram[1], buckets)]
+            histogram[2] += total
+            histogram[3] += n
+
+
+def _forget():
+    global _counters, _gauges, _histograms, _lock
+    _lock = threading.Lock()
+    _counters, _gauges, _histograms = {}, {}, {}
+
+
+# A forked worker starts empty; otherwise what the parent recorded before
+# the fork would come back with the worker's first drain()
+os.register_at_fork(after_in_child=_forget)
+
+
+# --- export ---------------------------------------------------------------
+
+def _series():
+    """(type, name, labels dict, value) for every metric, sorted by name and labels."""
+    with _lock:
+        series = [('counter', name, dict(labels), value) for (name, labels), value in _counters.items()]
+        series += [('gauge', name, dict(labels), value) for (name, labels), value in _gauges.items()]
+        series += [('histogram', name, dict(labels), (bounds, list(buckets), total, n))
+                   for (name, labels), (bounds, buckets, total, n) in _histograms.items()]
+    return sorted(series, key=lambda s: (s[1], sorted(s[2].items())))
+
+
+def write_jsonl(path, **fields):
+    """
+    Appends one JSON line per metric to path, each stamped with the current
+    time and any extra fields (e.g. a run id). Histogram buckets are
+    cumulative, as in Prometheus.
+    """
+    now = time.time()
+    lines = []
+    for kind, name, labels, value in _series():
+        record = dict(fields, ts=now, type=kind, name=name, labels=labels)
+        if kind == 'histogram':
+            bounds, buckets, total, n = value
+            cumulative = 0
+            record['buckets'] = {}
+            for bound, hits in zip(list(bounds) + ['+Inf'], buckets):
+                cumulative += hits
+                record['buckets'][str(bound)] = cumulative
+            record['sum'], record['count'] = total, n
+        else:
+            record['value'] = value
+        lines.append(json.dumps(record) + '\n')
+    with open(path, 'a') as f:
+        f.writelines(lines)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels_text(labels, extra=None):
+    items = list(labels.items()) + ([extra] if extra else [])
+    if not items:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in items) + '}'
+
+
+def write_prometheus(path):
+    """
+    Writes every metric to path in the Prometheus text exposition format
+    (e.g. for node_exporter's textfile collector). The file is replaced
+    atomically, so a scrape never sees it half written.
+    """
+    lines = []
+    typed = set()
+    for kind, name, labels, value in _series():
+        full = PROMETHEUS_PREFIX + name
+        if full not in typed:
+            typed.add(full)
+            lines.append(f'# TYPE {full} {kind}\n')
+        if kind != 'histogram':
+            lines.append(f'{full}{_labels_text(labels)} {value}\n')
+            continue
+        bounds, buckets, total, n = value
+        cumulative = 0
+        for bound, hits in zip(list(bounds) + ['+Inf'], buckets):
+            cumulative += hits
+            lines.append(f'{full}_bucket{_labels_text(labels, ("le", bound))} {cumulative}\n')
+        lines.append(f'{full}_sum{_labels_text(labels)} {total}\n')
+        lines.append(f'{full}_count{_labels_text(labels)} {n}\n')
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'w') as f:
+        f.writelines(lines)
+    os.replace(tmp_path, path)
+
+
+# --- profiling --------------------------------------------------------------
+
+PROFILE_MODES = ('cprofile', 'sample')
+# Seconds between stack samples in 'sample' mode
+SAMPLE_INTERVAL = 0.005
+
+
+def _profile_name(label):
+    return re.sub(r'[^A-Za-z0-9._-]+', '_', label).strip('_') or 'profile'
+
+
+def _sample(thread_id, stacks, stop, interval):
+    while not stop.wait(interval):
+        frame = sys._current_frames().get(thread_id)
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+            frame = frame.f_back
+        if names:
+            stacks[';'.join(reversed(names))] += 1
+
+
+@contextlib.contextmanager
+def profile(label, output_dir, mode='cprofile', interval=SAMPLE_INTERVAL):
+    """
+    Profiles the calling thread for the duration of the block, e.g. one
+    file's processing, and writes the result to output_dir under a name
+    derived from label:
+
+      cprofile  <label>.prof, deterministic; read with pstats or snakeviz
+      sample    <label>.folded, stacks sampled every `interval` seconds in
+                collapsed form for flamegraph.pl / speedscope; far lower
+                overhead on hot loops
+
+    Only the calling thread is profiled, not helper threads it starts.
+    """
+    if mode not in PROFILE_MODES:
+        raise ValueError(f"Unknown profile mode: {mode}")
+    os.makedirs(output_dir, exist_ok=True)
+    base = os.path.join(output_dir, _profile_name(label))
+    if mode == 'cprofile':
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            profiler.dump_stats(base + '.prof')
+        return
+
+    stacks = collections.Counter()
+    stop = threading.Event()
+    sampler = threading.Thread(target=_sample, args=(threading.get_ident(), stacks, stop, interval),
+                               name='telemetry-sampler', daemon=True)
+    sampler.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        sampler.join()
+        with open(base + '.folded', 'w') as f:
+            f.writelines(f'{stack} {n}\n' for stack, n in stacks.most_common())
@@ -0,0 +1,19 @@
+import os
+import sys
+
+import pytest
+
+# The pipeline modules live at the repository root
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import Deduplication  # noqa: E402
+
+
+@pytest.fixture
+def dedup(tmp_path, monkeypatch):
+    """Deduplication with a fresh chunk store, working in a temporary directory."""
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Deduplication, 'store', None)
+    yield Deduplication
+    if Deduplication.store is not None:
+        Deduplication.store.close()
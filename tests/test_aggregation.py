@@ -0,0 +1,81 @@
+import os
+import random
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import Aggregation
+import columnar
+import generate_test_data_10gb
+import journal
+
+ROWS = 20000
+RESOLUTIONS = ['1min', '1h']
+# Small blocks, so a file takes many of them
+BLOCK_SIZE = 64 * 1024
+
+
+def write_rows(path, order, seed=0):
+    """A seeded one-row-per-second CSV with its rows sorted, shuffled locally or shuffled."""
+    generate_test_data_10gb.write_time_series(path, ROWS, seed=seed, index=0)
+    with open(path, 'rb') as f:
+        header, *lines = f.readlines()
+    rng = random.Random(seed)
+    if order == 'local':
+        # Rows at most a few seconds out of place stay within the open buckets
+        lines = [line for _, line in sorted((i + rng.uniform(0, 5), line) for i, line in enumerate(lines))]
+    elif order == 'shuffled':
+        rng.shuffle(lines)
+    with open(path, 'wb') as f:
+        f.write(header + b''.join(lines))
+
+
+def expected(path, freq):
+    df = pd.read_csv(path, parse_dates=['timestamp'])
+    return df.groupby(df['timestamp'].dt.floor(freq)).agg(Aggregation.DEFAULT_AGG_RULES)
+
+
+def read_output(path):
+    if path.endswith('.col'):
+        data = columnar.ColumnarFile(path)
+        df = pd.DataFrame({name: np.asarray(data.column(name)) for name in data.columns})
+        df['timestamp'] = pd.to_datetime(df['timestamp'], unit='s')
+    else:
+        df = pd.read_csv(path, parse_dates=['timestamp'])
+    return df.set_index('timestamp')
+
+
+def assert_matches_pandas(csv_path, results):
+    for freq, (path, size) in zip(RESOLUTIONS, results):
+        assert size == os.path.getsize(path)
+        out, want = read_output(path), expected(csv_path, freq)
+        assert list(out.index) == list(want.index), freq
+        for col in want:
+            np.testing.assert_allclose(out[col], want[col], rtol=1e-12, err_msg=f"{freq} {col}")
+
+
+@pytest.mark.parametrize('output_format', ['csv', 'columnar'])
+@pytest.mark.parametrize('order', ['sorted', 'local', 'shuffled'])
+def test_rollups_match_pandas_in_any_row_order(tmp_path, monkeypatch, capsys, order, output_format):
+    monkeypatch.chdir(tmp_path)
+    write_rows('sensor.csv', order)
+
+    results = Aggregation.build_rollups('sensor.csv', RESOLUTIONS, block_size=BLOCK_SIZE,
+                                        output_format=output_format)
+
+    assert_matches_pandas('sensor.csv', results)
+    assert ('out of time order' in capsys.readouterr().out) == (order == 'shuffled')
+    assert sorted(os.listdir('.')) == sorted(['sensor.csv'] + [path for path, _ in results])
+
+
+def test_shuffled_rows_leave_no_checkpoint_or_parts(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    write_rows('sensor.csv', 'shuffled')
+    # Due after every block, so the first pass has saved state and parts when it gives up
+    checkpoint = journal.Checkpoint('sensor.csv', interval=1e-9)
+
+    results = Aggregation.build_rollups('sensor.csv', RESOLUTIONS, block_size=BLOCK_SIZE, checkpoint=checkpoint)
+
+    assert_matches_pandas('sensor.csv', results)
+    assert sorted(os.listdir('.')) == sorted(['sensor.csv'] + [path for path, _ in results])
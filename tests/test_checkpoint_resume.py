@@ -0,0 +1,129 @@
+import functools
+import gzip
+import os
+import shutil
+
+import pytest
+
+import chunking
+import compression
+import generate_test_data_10gb
+import journal
+import seekable_gzip
+from recipe import Recipe
+
+
+class Killed(BaseException):
+    """Stands in for the process being killed."""
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def kill_after(checkpoint, saves):
+    """Makes the job die right after its saves-th checkpoint."""
+    save = checkpoint.save
+    done = []
+
+    def save_and_die(state):
+        save(state)
+        done.append(state)
+        if len(done) == saves:
+            raise Killed
+
+    checkpoint.save = save_and_die
+
+
+def live_counts(store):
+    return {digest: count for digest, count in store.refs.counts.items() if count}
+
+
+def checkpoint(path, **kwargs):
+    # Due after every buffer, member or frame
+    return journal.Checkpoint(path, interval=1e-9, **kwargs)
+
+
+@pytest.mark.parametrize('chunking_rule, recount', [(None, False), ({'method': 'cdc'}, False), (None, True)])
+def test_deduplicate_resumes_after_kill(dedup, monkeypatch, capsys, chunking_rule, recount):
+    # Small buffers, so the file takes many checkpoints
+    monkeypatch.setattr(dedup, 'iter_chunk_batches',
+                        functools.partial(chunking.iter_chunk_batches, buffer_size=256 * 1024))
+    generate_test_data_10gb.write_redundant('source.bin', 4 * 1024 * 1024, seed=0, index=1, duplicate_ratio=0.5,
+                                            pool_blocks=2)
+    shutil.copyfile('source.bin', 'a.bin')
+    dedup.deduplicate_file('a.bin', chunking_rule)
+    expected_recipe = read('a.bin.meta')
+    os.remove('a.bin.meta')
+    dedup.reset_store()
+
+    shutil.copyfile('source.bin', 'b.bin')
+    job = checkpoint('b.bin')
+    kill_after(job, 3)
+    with pytest.raises(Killed):
+        dedup.deduplicate_file('b.bin', chunking_rule, checkpoint=job)
+    # The killed process's unflushed state is lost with it
+    dedup.reload_store()
+    if recount:
+        # A GC cycle in between recounts the references, dropping the killed
+        # run's, but compacts no pack (none is more than 100% dead)
+        dedup.get_store().suspect_refs()
+        dedup.collect_garbage(min_dead_ratio=1.01)
+
+    resumed = checkpoint('b.bin', interrupted=True)
+    assert resumed.state
+    capsys.readouterr()
+    dedup.deduplicate_file('b.bin', chunking_rule, checkpoint=resumed)
+    assert 'Resuming deduplication' in capsys.readouterr().out
+
+    assert read('b.bin.meta') == expected_recipe
+    assert sorted(os.listdir('.')) == ['b.bin.meta', 'chunk_store', 'source.bin']
+    dedup.restore_file('b.bin.meta', 'restored.bin')
+    assert read('restored.bin') == read('source.bin')
+
+    store = dedup.get_store()
+    digests = Recipe('b.bin.meta').unique_digests()
+    if recount:
+        # The resumed run referenced again the chunks the killed one had stored
+        assert live_counts(store) == dict.fromkeys(digests, 1)
+    # Any references the killed run leaked are recounted before anything is swept
+    assert store.refs.suspect
+    dedup.collect_garbage(min_dead_ratio=0)
+    assert not store.refs.suspect
+    assert live_counts(store) == dict.fromkeys(digests, 1)
+    dedup.restore_file('b.bin.meta', 'restored.bin')
+    assert read('restored.bin') == read('source.bin')
+
+
+@pytest.mark.parametrize('seekable, workers', [(True, 1), (False, 2), (True, 2)])
+def test_compress_resumes_after_kill(tmp_path, monkeypatch, capsys, seekable, workers):
+    monkeypatch.chdir(tmp_path)
+    generate_test_data_10gb.write_log('source.log', 6 * 1024 * 1024, seed=1, index=0, randomness=0.3)
+    options = {'level': 1, 'workers': workers, 'block_size': 512 * 1024, 'seekable': seekable}
+    shutil.copyfile('source.log', 'a.log')
+    compression.compress_file('a.log', **options)
+
+    shutil.copyfile('source.log', 'b.log')
+    job = checkpoint('b.log')
+    kill_after(job, 2)
+    with pytest.raises(Killed):
+        compression.compress_file('b.log', checkpoint=job, **options)
+    # A killed run can leave output past its last checkpoint, here more than the rest of the file
+    with open(journal.part_path('b.log.gz'), 'ab') as f:
+        f.write(b'\0' * os.path.getsize('a.log.gz'))
+
+    resumed = checkpoint('b.log', interrupted=True)
+    assert resumed.state
+    capsys.readouterr()
+    compression.compress_file('b.log', checkpoint=resumed, **options)
+    assert 'Resuming compression' in capsys.readouterr().out
+
+    assert read('b.log.gz') == read('a.log.gz')
+    assert gzip.decompress(read('b.log.gz')) == read('source.log')
+    outputs = ['a.log.gz', 'b.log.gz', 'source.log']
+    if seekable:
+        index = seekable_gzip.index_path('b.log.gz')
+        assert read(index) == read(seekable_gzip.index_path('a.log.gz'))
+        outputs += [seekable_gzip.index_path('a.log.gz'), index]
+    assert sorted(os.listdir('.')) == sorted(outputs)
@@ -0,0 +1,170 @@
+import hashlib
+import os
+import random
+
+import pytest
+
+import chunk_gc
+from chunk_gc import GarbageCollector
+
+CHUNK = 4096
+# Small packs, so a few files span several of them and compaction has work to do
+PACK_SIZE = 256 * 1024
+
+
+def blocks(count, size=64 * CHUNK, seed=0):
+    """count distinct blocks of random bytes, each a whole number of chunks."""
+    rng = random.Random(seed)
+    return [rng.randbytes(size) for _ in range(count)]
+
+
+def interleave(a, b):
+    """The chunks of a and b alternating, so their chunks share packs."""
+    return b''.join(a[i:i + CHUNK] + b[i:i + CHUNK] for i in range(0, len(a), CHUNK))
+
+
+def digests(data):
+    return {hashlib.sha256(data[i:i + CHUNK]).digest() for i in range(0, len(data), CHUNK)}
+
+
+def read(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def ingest(dedup, contents):
+    """Writes and deduplicates {path: bytes}; returns {recipe path: bytes}."""
+    files = {}
+    for path, data in contents.items():
+        with open(path, 'wb') as f:
+            f.write(data)
+        meta, _ = dedup.deduplicate_file(path)
+        files[meta] = data
+    return files
+
+
+def assert_restorable(dedup, files):
+    for meta, data in files.items():
+        dedup.restore_file(meta, 'restored')
+        assert read('restored') == data, meta
+    os.remove('restored')
+
+
+def live_counts(store):
+    return {digest: count for digest, count in store.refs.counts.items() if count}
+
+
+def test_referenced_chunks_survive_gc(dedup):
+    dedup.get_store().pack_size = PACK_SIZE
+    shared, only_a, only_b = blocks(3)
+    ingest(dedup, {'a.bin': shared + only_a})
+    kept = ingest(dedup, {'b.bin': shared + only_b})
+
+    dedup.delete_file('a.bin.meta')
+    stats = dedup.collect_garbage(min_dead_ratio=0)
+
+    assert stats['complete'] and stats['packs_compacted']
+    assert stats['dead_chunks'] == len(digests(only_a))
+    store = dedup.get_store()
+    assert live_counts(store) == dict.fromkeys(digests(shared + only_b), 1)
+    assert not any(digest in store for digest in digests(only_a))
+    assert_restorable(dedup, kept)
+    # Also as the next run sees the store
+    dedup.reload_store()
+    assert live_counts(dedup.get_store()) == dict.fromkeys(digests(shared + only_b), 1)
+    assert_restorable(dedup, kept)
+
+
+def test_overwritten_recipe_releases_its_references(dedup):
+    shared, old, new = blocks(3)
+    ingest(dedup, {'a.bin': shared + old})
+    files = ingest(dedup, {'a.bin': shared + new})
+
+    for reopen in (False, True):
+        if reopen:
+            dedup.reload_store()
+        store = dedup.get_store()
+        assert live_counts(store) == dict.fromkeys(digests(shared + new), 1)
+        assert all(store.refs.get(digest) == 0 for digest in digests(old))
+
+    dedup.collect_garbage(min_dead_ratio=0)
+    assert not any(digest in dedup.get_store() for digest in digests(old))
+    assert_restorable(dedup, files)
+
+
+def test_recipe_removed_behind_the_stores_back_is_recounted(dedup):
+    shared, only_a, only_b = blocks(3)
+    ingest(dedup, {'a.bin': shared + only_a})
+    kept = ingest(dedup, {'b.bin': shared + only_b})
+
+    os.remove('a.bin.meta')
+    stats = dedup.collect_garbage(min_dead_ratio=0)
+
+    assert stats['recipes_missing'] == 1
+    store = dedup.get_store()
+    assert live_counts(store) == dict.fromkeys(digests(shared + only_b), 1)
+    assert not any(digest in store for digest in digests(only_a))
+    assert_restorable(dedup, kept)
+
+
+def test_suspect_counts_are_recounted(dedup):
+    shared, only_a = blocks(2)
+    kept = ingest(dedup, {'a.bin': shared + only_a})
+    # As a killed deduplication leaves it: stored chunks with references no recipe owns
+    store = dedup.get_store()
+    leaked = digests(blocks(1, seed=1)[0])
+    store.put_many([(digest, b'x') for digest in leaked], store.open_refs())
+    store.suspect_refs()
+    store.flush()
+    dedup.reload_store()
+
+    dedup.collect_garbage(min_dead_ratio=0)
+
+    store = dedup.get_store()
+    assert not store.refs.suspect
+    assert live_counts(store) == dict.fromkeys(digests(shared + only_a), 1)
+    assert not any(digest in store for digest in leaked)
+    assert_restorable(dedup, kept)
+
+
+def run_unit(collector):
+    """Runs one unit of a cycle's work, as if it were a time slice of its own."""
+    if not collector.done:
+        getattr(collector, f'_{collector.phase}_step')()
+
+
+# Units after which the cycle below is in check, mark, select, scan, copy
+# (before and during) and sweep (before and during)
+@pytest.mark.parametrize('units', [2, 5, 10, 30, 49, 51, 53, 55])
+def test_cycle_cut_short_leaves_live_files_restorable(dedup, monkeypatch, units):
+    # Small units of work, so the cycle can be cut short in every phase
+    monkeypatch.setattr(chunk_gc, 'CHECK_BATCH', 1)
+    monkeypatch.setattr(chunk_gc, 'LOCATE_BATCH', 16)
+    monkeypatch.setattr(chunk_gc, 'SCAN_BATCH', 16)
+    monkeypatch.setattr(chunk_gc, 'COPY_BYTES', 16 * CHUNK)
+    dedup.get_store().pack_size = PACK_SIZE
+    shared, *own = blocks(7)
+    files = ingest(dedup, {f'f{i}.bin': interleave(shared, data) for i, data in enumerate(own)})
+    dedup.delete_file('f0.bin.meta')
+    dedup.delete_file('f1.bin.meta')
+    os.remove('f2.bin.meta')  # also recounts
+    live = {meta: data for meta, data in files.items() if os.path.exists(meta)}
+
+    store = dedup.get_store()
+    collector = GarbageCollector(store, min_dead_ratio=0)
+    for _ in range(units):
+        run_unit(collector)
+        assert_restorable(dedup, live)
+    assert not collector.done
+    store.flush()
+
+    # The next run starts a new cycle on what the cut-short one left behind
+    dedup.reload_store()
+    assert_restorable(dedup, live)
+    assert dedup.collect_garbage(min_dead_ratio=0)['complete']
+    assert_restorable(dedup, live)
+    dead = digests(b''.join(own[:3]))
+    assert not any(digest in dedup.get_store() for digest in dead)
+    expected = {digest: 1 for data in own[3:] for digest in digests(data)}
+    expected.update(dict.fromkeys(digests(shared), len(live)))
+    assert live_counts(dedup.get_store()) == expected
@@ -0,0 +1,139 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import columnar
+from columnar import ColumnarFile, ColumnarWriter
+
+# Small blocks, so queries start and end on many block edges
+BLOCK_ROWS = 16
+START = int(np.datetime64('2024-03-01T00:00:00', 's').astype(np.int64))
+
+
+def frame(rows=120, seed=0):
+    """Rows a few seconds apart, some sharing a timestamp, with int and float columns."""
+    rng = np.random.default_rng(seed)
+    return pd.DataFrame({
+        'timestamp': START + np.cumsum(rng.integers(0, 4, rows)),
+        'temperature': rng.random(rows) * 30,
+        'event_count': rng.integers(0, 100, rows),
+    })
+
+
+def write(path, df, batches=3):
+    with ColumnarWriter(path, ['temperature', 'event_count'], block_rows=BLOCK_ROWS) as writer:
+        for rows in np.array_split(np.arange(len(df)), batches):
+            part = df.iloc[rows]
+            writer.append(part['timestamp'].to_numpy(), {name: part[name].to_numpy() for name in part})
+    return ColumnarFile(path)
+
+
+def pandas_filter(df, start, end):
+    keep = np.ones(len(df), dtype=bool)
+    if start is not None:
+        keep &= df['timestamp'] >= start
+    if end is not None:
+        keep &= df['timestamp'] < end
+    return df[keep]
+
+
+def assert_query_matches(data, df, start, end):
+    result = data.query(start, end)
+    want = pandas_filter(df, start, end)
+    assert list(result) == ['timestamp', 'temperature', 'event_count']
+    for name, values in result.items():
+        np.testing.assert_array_equal(values, want[name].to_numpy(), err_msg=f"{start} {end} {name}")
+        assert values.dtype == data.column(name).dtype
+    return result
+
+
+def edges(df):
+    """Bounds on, just before and just after the first and last timestamp of every block."""
+    ts = df['timestamp'].to_numpy()
+    bounds = {None, int(ts[0]) - 10, int(ts[-1]) + 10}
+    for lo in range(0, len(ts), BLOCK_ROWS):
+        for t in (ts[lo], ts[min(lo + BLOCK_ROWS, len(ts)) - 1]):
+            bounds.update((int(t) - 1, int(t), int(t) + 1))
+    return sorted(bounds, key=lambda b: -np.inf if b is None else b)
+
+
+def test_sorted_query_at_block_edges_matches_pandas(tmp_path):
+    df = frame()
+    data = write(str(tmp_path / 'sensor.col'), df)
+    assert data.sorted and len(data.block_index) > 3
+
+    bounds = edges(df)
+    for start in bounds:
+        for end in bounds:
+            result = assert_query_matches(data, df, start, end)
+            # Slices of the map, not copies
+            for name, values in result.items():
+                assert not values.flags.owndata
+                assert not len(values) or np.shares_memory(values, data.column(name))
+
+
+def test_unsorted_query_at_block_edges_matches_pandas(tmp_path):
+    df = frame().sample(frac=1, random_state=0).reset_index(drop=True)
+    data = write(str(tmp_path / 'sensor.col'), df)
+    assert not data.sorted
+
+    bounds = edges(df.sort_values('timestamp', kind='stable'))
+    for start in bounds:
+        for end in bounds:
+            assert_query_matches(data, df, start, end)
+
+
+@pytest.mark.parametrize('start, end', [
+    (START + 50, START + 50),            # empty range
+    (START + 60, START + 40),            # end before start
+    (START - 100, START),                # before the first row
+    ('2030-01-01', None),                # after the last row
+])
+def test_empty_range_returns_empty_views(tmp_path, start, end):
+    df = frame()
+    data = write(str(tmp_path / 'sensor.col'), df)
+
+    result = data.query(start, end)
+
+    for name, values in result.items():
+        assert len(values) == 0
+        assert values.dtype == data.column(name).dtype
+        assert not values.flags.owndata
+
+
+def test_query_between_rows_returns_empty_views(tmp_path):
+    df = frame()
+    ts = df['timestamp'].to_numpy()
+    # A one-second range inside a gap between two rows
+    gap = int(np.flatnonzero(np.diff(ts) > 1)[0])
+    data = write(str(tmp_path / 'sensor.col'), df)
+
+    result = data.query(int(ts[gap]) + 1, int(ts[gap + 1]))
+
+    assert all(len(values) == 0 and not values.flags.owndata for values in result.values())
+    assert_query_matches(data, df, int(ts[gap]) + 1, int(ts[gap + 1]))
+
+
+def test_query_of_an_empty_file(tmp_path):
+    path = str(tmp_path / 'empty.col')
+    with ColumnarWriter(path, ['temperature']):
+        pass
+
+    result = columnar.query(path, '2024-03-01', '2024-03-02')
+
+    assert list(result) == ['timestamp', 'temperature']
+    assert all(len(values) == 0 for values in result.values())
+
+
+def test_module_query_accepts_iso_strings_and_columns(tmp_path):
+    df = frame()
+    path = str(tmp_path / 'sensor.col')
+    write(path, df)
+
+    result = columnar.query(path, '2024-03-01T00:01:00', np.datetime64('2024-03-01T00:05:00'),
+                            columns=['event_count'])
+
+    want = pandas_filter(df, START + 60, START + 300)
+    assert list(result) == ['timestamp', 'event_count']
+    np.testing.assert_array_equal(result['timestamp'], want['timestamp'])
+    np.testing.assert_array_equal(result['event_count'], want['event_count'])
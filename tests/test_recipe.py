@@ -0,0 +1,130 @@
+import hashlib
+import random
+
+import pytest
+
+from recipe import ENTRY, HEADER, SEGMENT, Recipe, RecipeWriter
+
+
+def chunk_of(symbol):
+    """A distinct digest per symbol, and a length that differs between symbols."""
+    return hashlib.sha256(symbol.encode()).digest(), 100 + 37 * (ord(symbol) - ord('A'))
+
+
+def expected(symbols):
+    """(digest, byte offset, length) of every chunk of a symbol sequence."""
+    chunks, offset = [], 0
+    for symbol in symbols:
+        digest, length = chunk_of(symbol)
+        chunks.append((digest, offset, length))
+        offset += length
+    return chunks
+
+
+def write(tmp_path, symbols):
+    writer = RecipeWriter()
+    for symbol in symbols:
+        writer.add(*chunk_of(symbol))
+    path = str(tmp_path / 'file.meta')
+    size = writer.write(path)
+    recipe = Recipe(path)
+    assert size == HEADER.size + recipe.segment_count * SEGMENT.size + recipe.entry_count * ENTRY.size
+    return recipe
+
+
+def assert_round_trip(recipe, symbols):
+    chunks = expected(symbols)
+    assert len(recipe) == len(chunks)
+    assert recipe.file_size == sum(length for _, _, length in chunks)
+    assert list(recipe) == chunks
+    for k, (digest, offset, length) in enumerate(chunks):
+        assert recipe.chunk(k) == (digest, offset, length), k
+        assert recipe.locate(offset) == k
+        assert recipe.locate(offset + length - 1) == k
+        assert list(recipe.iter_from(k)) == chunks[k:], k
+    assert recipe.unique_digests() == {digest for digest, _, _ in chunks}
+    with pytest.raises(IndexError):
+        recipe.locate(recipe.file_size)
+    with pytest.raises(IndexError):
+        recipe.chunk(len(chunks))
+
+
+def segment_starts(recipe):
+    return [recipe._segment(s)[0] for s in range(recipe.segment_count)]
+
+
+@pytest.mark.parametrize('tail', ['', 'A', 'AB', 'ABCD'])
+def test_repeated_pattern_with_partial_final_repetition(tmp_path, tail):
+    symbols = 'ABCDE' * 4 + tail
+    with write(tmp_path, symbols) as recipe:
+        assert_round_trip(recipe, symbols)
+        # The pattern is stored once, however the file ends
+        assert recipe.segment_count == 1
+        assert recipe.entry_count == 5
+
+
+@pytest.mark.parametrize('symbols', [
+    'ABCABD',           # matched AB, then the next chunk breaks the repetition
+    'ABAABAB',          # the breaking chunk starts the match again
+    'AAB',              # a one-chunk pattern that stops repeating
+    'ABCABCABDABDABD',  # a repeated pattern cut short by another one
+    'ABABABACABABAB',   # a repeated pattern broken mid-repetition, then repeating again
+])
+def test_abandoned_match_restarts_mid_pattern(tmp_path, symbols):
+    with write(tmp_path, symbols) as recipe:
+        assert_round_trip(recipe, symbols)
+
+
+def test_locate_and_iter_from_at_segment_edges(tmp_path):
+    symbols = 'ABC' * 3 + 'AB' + 'DE' * 3 + 'G' * 3 + 'DE'
+    with write(tmp_path, symbols) as recipe:
+        assert_round_trip(recipe, symbols)
+        chunks = expected(symbols)
+        starts = segment_starts(recipe)
+        assert len(starts) == 4
+        for k in starts[1:]:
+            before, first = chunks[k - 1], chunks[k]
+            assert recipe.locate(first[1] - 1) == k - 1
+            assert recipe.locate(first[1]) == k
+            assert list(recipe.iter_from(k - 1)) == chunks[k - 1:]
+            assert list(recipe.iter_from(k)) == chunks[k:]
+            assert recipe.chunk(k - 1) == before
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_random_sequences_round_trip(tmp_path, seed):
+    rng = random.Random(seed)
+    # Runs of a few short patterns, so repetitions start, break and end anywhere
+    patterns = [''.join(rng.choice('ABCD') for _ in range(rng.randint(1, 5))) for _ in range(4)]
+    symbols = ''.join(rng.choice(patterns)[:rng.randint(1, 5)] * rng.randint(1, 4) for _ in range(30))
+    with write(tmp_path, symbols) as recipe:
+        assert_round_trip(recipe, symbols)
+
+
+def test_deduplicated_file_ending_partway_through_a_repetition(dedup):
+    block = random.Random(0).randbytes(8 * 4096)
+    data = block * 3 + block[:3 * 4096 + 100]
+    with open('a.bin', 'wb') as f:
+        f.write(data)
+
+    meta, _ = dedup.deduplicate_file('a.bin')
+
+    with Recipe(meta) as recipe:
+        # The block's chunks and the short last one, each stored once
+        assert recipe.segment_count == 2
+        assert recipe.entry_count == 8 + 1
+    dedup.restore_file(meta, 'restored.bin')
+    with open('restored.bin', 'rb') as f:
+        assert f.read() == data
+
+
+def test_version_1_recipe_is_still_read(tmp_path):
+    # As version 1 wrote ABAB + C: a segment per run, each ending on a whole repetition
+    (a, a_len), (b, b_len), (c, c_len) = (chunk_of(symbol) for symbol in 'ABC')
+    path = str(tmp_path / 'old.meta')
+    with open(path, 'wb') as f:
+        f.write(HEADER.pack(b'DREC', 1, 0, 0, 2 * (a_len + b_len) + c_len, 5, 2, 3))
+        f.write(SEGMENT.pack(0, 0, 0, 2, 2) + SEGMENT.pack(4, 2 * (a_len + b_len), 2, 1, 1))
+        f.write(ENTRY.pack(a, a_len) + ENTRY.pack(b, a_len + b_len) + ENTRY.pack(c, c_len))
+    with Recipe(path) as recipe:
+        assert_round_trip(recipe, 'ABABC')
@@ -0,0 +1,150 @@
+import gzip
+import random
+import re
+import shutil
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+import compression
+import seekable_gzip
+from seekable_gzip import SeekableGzipReader
+
+# Small frames, so a few hundred KB of log spans many of them
+FRAME_SIZE = 4096
+FIRST_LINE = datetime(2025, 9, 2, 12, 0, 0, tzinfo=timezone.utc)
+
+
+def write_log(path, lines=6000, seed=0):
+    """
+    A time-ordered log, a second per line, with some multi-line tracebacks,
+    one traceback spanning whole frames and one line longer than a frame.
+    Returns each line's timestamp (that of the line before it for
+    traceback lines).
+    """
+    rng = random.Random(seed)
+    stamps = []
+    with open(path, 'wb') as f:
+        for i in range(lines):
+            when = FIRST_LINE + timedelta(seconds=i)
+            level = rng.choice(['INFO', 'WARN', 'ERROR'])
+            message = 'x' * (3 * FRAME_SIZE) if i == lines // 2 else f'request {rng.getrandbits(32):08x}'
+            f.write(f'{when:%Y-%m-%d %H:%M:%S},{i % 1000:03d} - {level} - {message}\n'.encode())
+            stamps.append(int(when.timestamp()))
+            if i == lines // 3:
+                depth = 3 * FRAME_SIZE // 40
+            else:
+                depth = rng.randint(1, 4) if level == 'ERROR' and rng.random() < 0.3 else 0
+            for frame in range(depth):
+                f.write(f'  File "app.py", line {frame}, in handler\n'.encode())
+                stamps.append(stamps[-1])
+    return stamps
+
+
+def write_seekable(path, workers=1):
+    gz_path = path + '.gz'
+    with open(path, 'rb') as f_in, open(gz_path, 'wb') as f_out:
+        seekable_gzip.write_seekable_gzip(f_in, f_out, seekable_gzip.index_path(gz_path), level=6,
+                                          workers=workers, frame_size=FRAME_SIZE)
+    return gz_path
+
+
+@pytest.fixture
+def log(tmp_path):
+    path = str(tmp_path / 'app.log')
+    stamps = write_log(path)
+    gz_path = write_seekable(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    with SeekableGzipReader(gz_path) as reader:
+        assert len(reader) > 50
+        assert (reader.frames['first_ts'] == seekable_gzip.NO_TIMESTAMP).any()
+        yield reader, data, stamps
+
+
+def gzip_read(path, offset, n):
+    with gzip.open(path, 'rb') as f:
+        f.seek(offset)
+        return f.read(n)
+
+
+def gzip_lines(path, first_line, count):
+    with gzip.open(path, 'rb') as f:
+        return f.readlines()[first_line:first_line + count]
+
+
+def test_read_range_matches_gzip_across_frame_boundaries(log):
+    reader, data, _ = log
+    assert reader.size == len(data)
+    frame_starts = [int(offset) for offset in reader.frames['raw_offset']]
+    for boundary in frame_starts[1:8] + frame_starts[len(frame_starts) // 2 - 2:len(frame_starts) // 2 + 2] \
+            + frame_starts[-2:]:
+        for offset in (boundary - 1, boundary, boundary + 1):
+            for n in (1, 2, 100, FRAME_SIZE, 3 * FRAME_SIZE + 7):
+                assert reader.read_range(offset, n) == gzip_read(reader.path, offset, n), (offset, n)
+    assert reader.read_range(0, len(data)) == data
+    assert reader.read_range(len(data) - 5, 100) == data[-5:]
+    assert reader.read_range(len(data), 10) == b''
+
+
+def test_read_lines_matches_gzip_across_frame_boundaries(log):
+    reader, data, _ = log
+    lines = data.splitlines(keepends=True)
+    frame_lines = [int(line) for line in reader.frames['first_line']]
+    for boundary in frame_lines[1:8] + frame_lines[-2:]:
+        for first in (boundary - 1, boundary, boundary + 1):
+            for count in (1, 2, 50, 400):
+                assert reader.read_lines(first, count) == lines[first:first + count], (first, count)
+    assert reader.read_lines(0, len(lines)) == lines
+    assert reader.read_lines(len(lines) - 3, 10) == lines[-3:]
+    assert reader.read_lines(len(lines), 10) == []
+    assert reader.read_lines(1000, 200) == gzip_lines(reader.path, 1000, 200)
+
+
+@pytest.mark.parametrize('pattern', [None, 'ERROR', re.compile(rb'^\s+File')])
+def test_grep_time_window_matches_a_full_scan(log, pattern):
+    reader, data, stamps = log
+    lines = data.splitlines(keepends=True)
+    regex = re.compile(pattern.encode() if isinstance(pattern, str) else pattern) if pattern else None
+    first = stamps[0]
+    for start, end in [(first - 60, first + 30), (first + 1999, first + 2001), (first + 2000, first + 2003), (first + 2001, first + 2005), (first + 1000, first + 1001), (first + 2990, first + 3012),
+                       (first + 5990, first + 7000), (first + 100, first + 100)]:
+        want = [line for line, ts in zip(lines, stamps)
+                if start <= ts < end and (regex is None or regex.search(line))]
+        assert list(reader.grep_time_window(start, end, pattern)) == want, (start, end)
+    iso = [line for line, ts in zip(lines, stamps) if first + 60 <= ts < first + 120]
+    assert list(reader.grep_time_window('2025-09-02T12:01:00', '2025-09-02T12:02:00')) == iso
+
+
+@pytest.mark.parametrize('workers', [1, 2])
+def test_seekable_gz_decompresses_byte_identically(tmp_path, workers):
+    path = str(tmp_path / 'app.log')
+    write_log(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    shutil.copyfile(path, str(tmp_path / 'copy.log'))
+
+    gz_path = write_seekable(path, workers)
+    # As the pipeline writes it, with the default frame size
+    compressed_path, _ = compression.compress_file(str(tmp_path / 'copy.log'), level=6, workers=workers,
+                                                   seekable=True)
+
+    for candidate in (gz_path, compressed_path):
+        with open(candidate, 'rb') as f:
+            assert gzip.decompress(f.read()) == data
+        with gzip.open(candidate, 'rb') as f:
+            assert f.read() == data
+        with SeekableGzipReader(candidate) as reader:
+            assert reader.read_range(0, reader.size) == data
+
+
+def test_grep_time_window_decompresses_only_the_frames_it_needs(log, monkeypatch):
+    reader, data, stamps = log
+    decompressed = []
+    frame = reader.frame
+    monkeypatch.setattr(reader, 'frame', lambda i: decompressed.append(i) or frame(i))
+
+    lines = list(reader.grep_time_window(stamps[0] + 3000, stamps[0] + 3005))
+
+    assert len(lines) >= 5
+    assert len(decompressed) <= 2